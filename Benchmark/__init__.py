@@ -0,0 +1,6 @@
+#!/usr/bin/env python
+# encoding:utf8
+
+"""
+Watch_Dogs-Client 性能测试
+"""
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+Watch_Dogs-Client 性能测试 - 采集项及接口
+
+在合成的 /proc 及 /sys 数据目录上(见 proc_fixture.py)测试 SysMonitor, ProcMonitor, ProcManager 各采集函数,
+完整采样周期及 /metrics 渲染的吞吐量(ops/s)及单次耗时分布, 结果输出为JSON;
+指定上次的结果(--baseline)时比较吞吐量, 下降超过阈值的项目使进程以非0状态退出, 可以直接用于回归检查;
+任何项目调用出错(出错的调用通常更快, 不能计入吞吐量)时同样以非0状态退出
+
+用法
+    python Benchmark/bench_collectors.py --pids 1000 --threads 8 --output bench.json
+    python Benchmark/bench_collectors.py --baseline bench.json --max-regression 0.2
+    python Benchmark/bench_collectors.py --routes   (同时通过Flask测试客户端请求HTTP接口, 会按setting.json启动客户端)
+"""
+
+import os
+import sys
+import imp
+import json
+import platform
+import argparse
+import itertools
+from timeit import default_timer
+
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_path)
+
+from Benchmark.proc_fixture import build_proc_tree, remove_proc_tree, FIXTURE_DEFAULTS
+from Core.path_resolver import path_resolver
+from Core.mount_monitor import MountTable
+from Core.sys_monitor import SysMonitor
+from Core.process_monitor import ProcMonitor
+from Core.process_manage import ProcManager
+from Core.sampler import Sampler
+
+BENCH_MIN_TIME = 0.5  # 每个项目的最短测试时间(秒)
+BENCH_MIN_CALLS = 20  # 每个项目的最少调用次数
+BENCH_WARMUP = 3  # 预热调用次数 (初始化基准值, 打开描述符缓存)
+WATCHED_PIDS = 32  # 采样周期测试中被监测的进程数
+ROUTES = ("/sys/cpu/percent", "/sys/cpu/percents", "/sys/mem/percent", "/sys/loadavg", "/sys/net/devices/speed",
+          "/sys/io/devices", "/sys/disk/stat", "/proc/all_pid/", "/proc/{pid}/", "/proc/{pid}/mem/detail",
+          "/proc/{pid}/threads", "/metrics")
+
+
+def bench(func, min_time=BENCH_MIN_TIME, min_calls=BENCH_MIN_CALLS):
+    """
+    重复调用直到同时满足最短时间及最少次数
+    :return: {"calls", "errors", "error"(第一次出错的异常), "ops_per_sec", "mean_us", "p50_us", "p95_us", "p99_us",
+              "max_us"}
+    """
+    latencies, failures = [], {"errors": 0, "error": None}
+
+    def call():
+        try:
+            func()
+        except Exception as err:  # 预热时的出错同样计入
+            failures["errors"] += 1
+            failures["error"] = failures["error"] or repr(err)
+
+    for _ in range(BENCH_WARMUP):
+        call()
+    start = default_timer()
+    while len(latencies) < min_calls or default_timer() - start < min_time:
+        t = default_timer()
+        call()
+        latencies.append(default_timer() - t)
+    total = default_timer() - start
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1e6, 2)
+
+    return {
+        "calls": len(latencies),
+        "errors": failures["errors"],
+        "error": failures["error"],
+        "ops_per_sec": round(len(latencies) / total, 2),
+        "mean_us": round(sum(latencies) / len(latencies) * 1e6, 2),
+        "p50_us": percentile(0.5),
+        "p95_us": percentile(0.95),
+        "p99_us": percentile(0.99),
+        "max_us": round(latencies[-1] * 1e6, 2),
+    }
+
+
+def per_pid(func, pids):
+    """每次调用轮流使用下一个进程号"""
+    cycle = itertools.cycle(pids)
+    return lambda: func(next(cycle))
+
+
+def collector_benchmarks(pids):
+    """各采集项 : {名称: 无参数的调用}"""
+    sm = SysMonitor()
+    sm.mount_table = MountTable()  # 单例中已打开的挂载表属于原来的根目录
+    pm = ProcMonitor()
+    manager = ProcManager()
+    for pid in pids:
+        pm.watch_process(pid)
+    sampler = Sampler(sm, pm)
+    return [
+        ("sys.cpu_percent", sm.calc_cpu_percent),
+        ("sys.cpu_percents", sm.calc_cpu_percent_by_cores),
+        ("sys.mem_percent", sm.calc_mem_percent),
+        ("sys.loadavg", sm.get_sys_loadavg_values),
+        ("sys.pressure", sm.calc_pressure),
+        ("sys.vmstat", sm.calc_vmstat_rates),
+        ("sys.uptime", sm.get_sys_uptime),
+        ("sys.cpu_info", sm.get_cpu_info),
+        ("sys.net", sm.calc_net_speed),
+        ("sys.net_devices", sm.calc_net_speed_by_devices),
+        ("sys.io_devices", sm.calc_io_speed_by_devices),
+        ("sys.disk_stat", sm.get_disk_stat),
+        ("proc.all_pid", pm.get_all_pid),
+        ("proc.stat", per_pid(pm.get_process_stat, pids)),
+        ("proc.info", per_pid(pm.get_process_info, pids)),
+        ("proc.cpu_percent", per_pid(pm.calc_process_cpu_percent, pids)),
+        ("proc.mem", per_pid(pm.get_process_mem, pids)),
+        ("proc.io_speed", per_pid(pm.calc_process_io_speed, pids)),
+        ("proc.mem_detail", per_pid(pm.get_process_mem_detail, pids)),
+        ("proc.threads", per_pid(pm.calc_process_thread_cpu_percent, pids)),
+        ("manage.all_pid_name", manager.get_all_pid_name),
+        ("manage.child_process", lambda: manager.get_all_child_process(1)),
+        ("manage.execute_path", per_pid(manager.get_process_execute_path, pids)),
+        ("sampler.sample_once", sampler.sample_once),
+        ("sampler.metrics_text", sampler.get_metrics_text),
+    ]
+
+
+def route_benchmarks(pids):
+    """HTTP接口 (通过Flask测试客户端请求, 客户端按setting.json初始化)"""
+    os.chdir(root_path)
+    roots = path_resolver.proc_root, path_resolver.sys_root
+    client = imp.load_source("watch_dogs_client", os.path.join(root_path, "Watch_Dogs-Client.py"))
+    path_resolver.set_root(*roots)  # 客户端按setting.json设置了根目录, 恢复为合成数据目录
+    client.sampler.stop()
+    client.system_monitor.mount_table = MountTable()
+    test_client = client.app.test_client()
+    for pid in pids:  # 客户端重新初始化了ProcMonitor单例, 恢复各采集项使用的被监测进程
+        test_client.get("/proc/watch/add/{}".format(pid))
+    client.sampler.sample_once()
+
+    def request(url):
+        def get():
+            response = test_client.get(url)
+            if response.status_code != 200:
+                raise ValueError("{} {}".format(url, response.status_code))
+        return get
+
+    return [("route " + url, request(url.format(pid=pids[0]))) for url in ROUTES]
+
+
+def check_errors(results):
+    """调用出错的项目 [(名称, 出错次数, 第一次出错的异常)]"""
+    return [(name, result["errors"], result.get("error")) for name, result in sorted(results.items())
+            if result["errors"]]
+
+
+def compare(results, baseline, max_regression):
+    """与上次的结果比较, 返回吞吐量下降超过阈值的项目 [(名称, 上次ops/s, 本次ops/s)]"""
+    regressions = []
+    for name, result in sorted(results.items()):
+        prev = baseline.get("results", {}).get(name)
+        if prev and prev["ops_per_sec"] and result["ops_per_sec"] < prev["ops_per_sec"] * (1 - max_regression):
+            regressions.append((name, prev["ops_per_sec"], result["ops_per_sec"]))
+    return regressions
+
+
+def run(fixture, routes=False, only=None, min_time=BENCH_MIN_TIME, min_calls=BENCH_MIN_CALLS, root=None):
+    """
+    生成合成数据目录并运行所有测试
+    :param fixture: 规模配置, 见 FIXTURE_DEFAULTS
+    :param only: 只运行名称以此开头的项目
+    :return: 测试结果 (可直接输出为JSON)
+    """
+    fixture_root, pids = build_proc_tree(root, **fixture)
+    old_roots = path_resolver.proc_root, path_resolver.sys_root
+    path_resolver.set_root(os.path.join(fixture_root, "proc"), os.path.join(fixture_root, "sys"))
+    try:
+        watched = pids[:WATCHED_PIDS]
+        benchmarks = collector_benchmarks(watched)
+        if routes:
+            benchmarks += route_benchmarks(watched)
+        results = {}
+        for name, func in benchmarks:
+            if only and not name.startswith(only):
+                continue
+            results[name] = bench(func, min_time, min_calls)
+    finally:
+        path_resolver.set_root(*old_roots)
+        if root is None:
+            remove_proc_tree(fixture_root)
+    return {
+        "fixture": dict(fixture, watched_pids=len(watched)),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "min_time": min_time,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch_Dogs-Client collector benchmark")
+    for key, value in sorted(FIXTURE_DEFAULTS.items()):
+        parser.add_argument("--" + key, type=int, default=value)
+    parser.add_argument("--routes", action="store_true", help="benchmark HTTP routes through the flask test client")
+    parser.add_argument("--only", help="run benchmarks whose name starts with this prefix")
+    parser.add_argument("--min-time", type=float, default=BENCH_MIN_TIME)
+    parser.add_argument("--root", help="keep the generated fixture tree in this directory")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", help="previous JSON results to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed ops/sec drop against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    fixture = dict((key, getattr(args, key)) for key in FIXTURE_DEFAULTS)
+    result = run(fixture, args.routes, args.only, args.min_time, root=args.root)
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print text
+
+    failures = check_errors(result["results"])
+    for name, errors, error in failures:
+        sys.stderr.write("error : %s failed %d times (%s)\n" % (name, errors, error))
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result["results"], json.load(f), args.max_regression)
+        for name, prev, current in regressions:
+            sys.stderr.write("regression : %s %.2f -> %.2f ops/s\n" % (name, prev, current))
+        failures += regressions
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+Watch_Dogs-Client 性能测试 - 合成 /proc 及 /sys 数据目录
+
+按配置的规模(进程数, 每个进程的线程数, 挂载点数, 网卡数, 分区数, CPU核数)生成与内核格式一致的
+/proc 及 /sys 文件, 采集项通过 Core.path_resolver 修改根目录后即可读取, 测试结果不受本机负载影响且可以复现
+
+目录结构
+    <root>/proc     :   stat, meminfo, net/dev, diskstats, partitions, mounts, [pid]/{stat,statm,io,status,...}
+                        1/{net,mounts,root} 为符号链接 (分别指向 net, mounts 及 /)
+    <root>/sys      :   block/[disk]/queue/hw_sector_size
+    <root>/mnt      :   挂载表中的挂载点 (真实目录, statvfs可以正常返回)
+"""
+
+import os
+import random
+import shutil
+import tempfile
+
+FIXTURE_DEFAULTS = {
+    "pids": 200,  # 进程数
+    "threads": 4,  # 每个进程的线程数
+    "mounts": 8,  # 挂载点数 (另有 proc, sysfs, tmpfs 三个特殊挂载点)
+    "interfaces": 4,  # 网卡数 (另有 lo)
+    "partitions": 8,  # 分区数 (平均分布在各磁盘上)
+    "cores": 8,  # CPU核数
+    "seed": 13,  # 随机数种子
+}
+FIXTURE_FIRST_PID = 1000  # 第一个普通进程的进程号 (进程号1为init)
+FIXTURE_DISKS = 4  # 磁盘数上限
+
+
+def write_file(path, content):
+    """写入文件, 自动创建上级目录"""
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def cpu_line(name, rnd):
+    """/proc/stat 中的一行cpu时间 (10个字段)"""
+    return name + " " + " ".join(str(rnd.randint(1000, 10 ** 7)) for _ in range(8)) + " 0 0"
+
+
+def build_sys_files(proc, sys_root, mnt, config, rnd):
+    """生成系统级文件"""
+    cores = config["cores"]
+    write_file(os.path.join(proc, "stat"), "\n".join(
+        ["cpu  " + cpu_line("", rnd).strip()] +
+        [cpu_line("cpu" + str(i), rnd) for i in range(cores)] +
+        ["intr 123456789 0", "ctxt 987654321", "btime 1560000000", "processes 65536",
+         "procs_running 2", "procs_blocked 0", "softirq 1234 0"]) + "\n")
+    write_file(os.path.join(proc, "meminfo"), "".join("%-16s%8d kB\n" % (key + ":", value) for key, value in (
+        ("MemTotal", 16303488), ("MemFree", 8123456), ("MemAvailable", 12345678), ("Buffers", 234567),
+        ("Cached", 3456789), ("SwapCached", 0), ("Active", 4567890), ("Inactive", 2345678),
+        ("SwapTotal", 2097148), ("SwapFree", 2097148), ("Shmem", 123456), ("Slab", 345678))))
+    write_file(os.path.join(proc, "loadavg"), "0.52 0.58 0.59 3/%d 65535\n" % (config["pids"] + 1))
+    write_file(os.path.join(proc, "uptime"), "123456.78 876543.21\n")
+    write_file(os.path.join(proc, "version"), "Linux version 5.10.0-fixture (builder@fixture) "
+                                              "(gcc version 10.2.1 (Debian 10.2.1-6)) #1 SMP Debian 5.10.0\n")
+    write_file(os.path.join(proc, "cpuinfo"), "".join(
+        "processor\t: %d\nmodel name\t: Fixture CPU @ 2.40GHz\ncpu MHz\t\t: 2400.000\nsiblings\t: %d\n"
+        "power management:\n\n" % (i, cores) for i in range(cores)))
+    write_file(os.path.join(proc, "vmstat"), "".join("%s %d\n" % (key, rnd.randint(0, 10 ** 6)) for key in (
+        "nr_free_pages", "nr_inactive_anon", "pgpgin", "pgpgout", "pswpin", "pswpout", "pgfault", "pgmajfault",
+        "oom_kill", "pgsteal_kswapd")))
+    for resource in ("cpu", "memory", "io"):
+        write_file(os.path.join(proc, "pressure", resource),
+                   "some avg10=0.12 avg60=0.34 avg300=0.56 total=%d\n"
+                   "full avg10=0.00 avg60=0.01 avg300=0.02 total=%d\n" % (rnd.randint(0, 10 ** 9),
+                                                                          rnd.randint(0, 10 ** 8)))
+    # 网卡
+    lines = ["Inter-|   Receive                                                |  Transmit",
+             " face |bytes    packets errs drop fifo frame compressed multicast|"
+             "bytes    packets errs drop fifo colls carrier compressed"]
+    for device in ["lo"] + ["eth" + str(i) for i in range(config["interfaces"])]:
+        lines.append("%6s: " % device + " ".join(str(rnd.randint(0, 10 ** 9)) for _ in range(16)))
+    write_file(os.path.join(proc, "net", "dev"), "\n".join(lines) + "\n")
+    # 磁盘及分区 : sda, sda1, sda2, sdb, sdb1...
+    disks = ["sd" + chr(ord("a") + i) for i in range(max(min(FIXTURE_DISKS, config["partitions"]), 1))]
+    devices = []
+    for i, disk in enumerate(disks):
+        devices.append((8, i * 16, disk))
+        count = config["partitions"] // len(disks) + (1 if i < config["partitions"] % len(disks) else 0)
+        devices.extend((8, i * 16 + j, disk + str(j)) for j in range(1, count + 1))
+        write_file(os.path.join(sys_root, "block", disk, "queue", "hw_sector_size"), "512\n")
+    write_file(os.path.join(proc, "partitions"), "major minor  #blocks  name\n\n" + "".join(
+        "%4d %7d %10d %s\n" % (major, minor, rnd.randint(10 ** 6, 10 ** 9), name) for major, minor, name in devices))
+    write_file(os.path.join(proc, "diskstats"), "".join(
+        "%4d %7d %s " % (major, minor, name) + " ".join(str(rnd.randint(0, 10 ** 7)) for _ in range(17)) + "\n"
+        for major, minor, name in devices))
+    # 挂载表 (挂载点为真实目录)
+    lines = ["proc /proc proc rw,nosuid,nodev,noexec,relatime 0 0",
+             "sysfs /sys sysfs rw,nosuid,nodev,noexec,relatime 0 0",
+             "tmpfs /run tmpfs rw,nosuid,nodev,mode=755 0 0"]
+    for i in range(config["mounts"]):
+        mount_point = os.path.join(mnt, "disk" + str(i))
+        os.makedirs(mount_point)
+        lines.append("/dev/%s %s ext4 rw,relatime 0 0" % (devices[i % len(devices)][2], mount_point))
+    write_file(os.path.join(proc, "mounts"), "\n".join(lines) + "\n")
+
+
+def build_process_files(proc, pid, ppid, tids, root, rnd):
+    """生成进程级文件 /proc/[pid]/..."""
+    pid_dir = os.path.join(proc, str(pid))
+    comm = "init" if pid == 1 else "fixture-%d (worker)" % pid  # 进程名中含有空格及括号
+    utime, stime = rnd.randint(0, 10 ** 6), rnd.randint(0, 10 ** 5)
+    rss, vsize = rnd.randint(1000, 10 ** 5), rnd.randint(10 ** 7, 10 ** 9)
+    write_file(os.path.join(pid_dir, "stat"),
+               "%d (%s) S %d %d %d 0 -1 4194560 %d 0 %d 0 %d %d 0 0 20 0 %d 0 %d %d %d 18446744073709551615 "
+               "1 1 0 0 0 0 0 0 0 0 0 0 17 0 0 0 0 0 0 0 0 0 0 0 0 0\n"
+               % (pid, comm, ppid, pid, pid, rnd.randint(0, 10 ** 6), rnd.randint(0, 1000), utime, stime,
+                  len(tids), rnd.randint(0, 10 ** 6), vsize, rss))
+    write_file(os.path.join(pid_dir, "statm"), "%d %d %d 1 0 %d 0\n" % (vsize // 4096, rss, rss // 4, rss // 2))
+    write_file(os.path.join(pid_dir, "io"), "".join("%s: %d\n" % (key, rnd.randint(0, 10 ** 9)) for key in (
+        "rchar", "wchar", "syscr", "syscw", "read_bytes", "write_bytes", "cancelled_write_bytes")))
+    write_file(os.path.join(pid_dir, "status"),
+               "Name:\t%s\nState:\tS (sleeping)\nTgid:\t%d\nPid:\t%d\nPPid:\t%d\nNSpid:\t%d\n"
+               "VmRSS:\t%8d kB\nVmSwap:\t%8d kB\nThreads:\t%d\n" % (comm[:15], pid, pid, ppid, pid, rss * 4, 0,
+                                                                   len(tids)))
+    write_file(os.path.join(pid_dir, "cmdline"), "/usr/bin/fixture\0--worker\0%d\0" % pid)
+    write_file(os.path.join(pid_dir, "comm"), comm[:15] + "\n")
+    write_file(os.path.join(pid_dir, "smaps_rollup"),
+               "00400000-7fff00000000 ---p 00000000 00:00 0                      [rollup]\n" + "".join(
+                   "%-16s%8d kB\n" % (key + ":", value) for key, value in (
+                       ("Rss", rss * 4), ("Pss", rss * 3), ("Shared_Clean", rss), ("Shared_Dirty", 0),
+                       ("Private_Clean", rss), ("Private_Dirty", rss * 2), ("Swap", 0))))
+    os.symlink(root, os.path.join(pid_dir, "cwd"))
+    for tid in tids:
+        write_file(os.path.join(pid_dir, "task", str(tid), "stat"),
+                   "%d (%s) S %d %d %d 0 -1 4194560 0 0 0 0 %d %d 0 0 20 0 %d 0 0 0 0\n"
+                   % (tid, comm, ppid, pid, pid, rnd.randint(0, utime), rnd.randint(0, stime), len(tids)))
+        write_file(os.path.join(pid_dir, "task", str(tid), "comm"), "worker-%d\n" % tid)
+
+
+def build_proc_tree(root=None, **config):
+    """
+    生成合成数据目录
+    :param root: 目录位置, 为None时创建临时目录
+    :param config: 规模配置, 见 FIXTURE_DEFAULTS
+    :return: (目录位置, 普通进程号列表)
+    """
+    options = dict(FIXTURE_DEFAULTS)
+    options.update(config)
+    root = os.path.abspath(root or tempfile.mkdtemp(prefix="watch_dogs_fixture_"))
+    rnd = random.Random(options["seed"])
+    proc, sys_root, mnt = os.path.join(root, "proc"), os.path.join(root, "sys"), os.path.join(root, "mnt")
+    build_sys_files(proc, sys_root, mnt, options, rnd)
+
+    pids = [FIXTURE_FIRST_PID + i for i in range(options["pids"])]
+    next_tid = FIXTURE_FIRST_PID + len(pids)
+    build_process_files(proc, 1, 0, [1], root, rnd)
+    # 与内核一致, 命名空间相关的文件也可以通过1号进程访问; 主机上的路径通过 /proc/1/root 访问
+    os.symlink("../net", os.path.join(proc, "1", "net"))
+    os.symlink("../mounts", os.path.join(proc, "1", "mounts"))
+    os.symlink("/", os.path.join(proc, "1", "root"))
+    for index, pid in enumerate(pids):
+        ppid = 1 if index < 8 else pids[rnd.randint(0, index - 1)]  # 构成一棵进程树
+        tids = [pid] + range(next_tid, next_tid + options["threads"] - 1)
+        next_tid += options["threads"] - 1
+        build_process_files(proc, pid, ppid, tids, root, rnd)
+    return root, pids
+
+
+def remove_proc_tree(root):
+    """删除合成数据目录"""
+    shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 请求来源地址过滤
+
+主要包括
+- 配置中的允许地址(allowed_request_addr)支持单个地址及CIDR网段(IPv4/IPv6), 启动时预先解析, 格式错误时立即报错
+- 单个地址放入集合, 网段按前缀长度分组 {前缀长度: (掩码, 网络地址集合)}; 每次请求的检查为一次集合查找加上
+  每种前缀长度一次掩码及集合查找, 与配置的地址数量无关
+- "0.0.0.0" 沿用原有含义, 表示允许所有地址
+- IPv4映射的IPv6地址(::ffff:a.b.c.d)按IPv4地址检查
+
+参考资料
+reference   :   https://tools.ietf.org/html/rfc4632
+reference   :   https://docs.python.org/2/library/socket.html#socket.inet_pton
+"""
+
+import socket
+import struct
+
+ALLOW_ALL = "0.0.0.0"  # 允许所有地址
+IPV4_MAPPED_PREFIX = "\0" * 10 + "\xff\xff"
+
+
+def parse_address(address):
+    """
+    解析IP地址 (python2 没有ipaddress模块, 使用inet_pton)
+    :return: (地址族, 整数地址, 地址位数), IPv4映射的IPv6地址返回IPv4; 格式错误时抛出ValueError
+    """
+    try:
+        packed = socket.inet_pton(socket.AF_INET, address)
+        return socket.AF_INET, struct.unpack("!I", packed)[0], 32
+    except (socket.error, UnicodeError, TypeError):
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, address.split("%")[0])  # 去掉链路本地地址的网卡后缀
+    except (socket.error, UnicodeError, TypeError, AttributeError):
+        raise ValueError("invalid ip address : {!r}".format(address))
+    if packed.startswith(IPV4_MAPPED_PREFIX):
+        return socket.AF_INET, struct.unpack("!I", packed[12:])[0], 32
+    high, low = struct.unpack("!QQ", packed)
+    return socket.AF_INET6, (high << 64) | low, 128
+
+
+class AddressFilter(object):
+    """请求来源地址过滤类"""
+
+    def __init__(self, allowed):
+        self.allowed = list(allowed)
+        self.allow_all = False
+        self.addresses = set()  # 单个地址 (原始字符串, 最常见的情况不需要解析)
+        self.networks = {socket.AF_INET: {}, socket.AF_INET6: {}}  # {地址族: {前缀长度: (掩码, {网络地址})}}
+        for item in self.allowed:
+            self.add(item)
+
+    def add(self, item):
+        """添加允许的地址或网段 (如 10.0.0.0/8, fd00::/8), 格式错误时抛出ValueError"""
+        item = item.strip()
+        if item == ALLOW_ALL:
+            self.allow_all = True
+            return
+        address, _, prefix = item.partition("/")
+        family, value, bits = parse_address(address)
+        if not prefix:
+            self.addresses.add(address)
+            prefix = bits
+        try:
+            prefix = int(prefix)
+        except ValueError:
+            raise ValueError("invalid network prefix : {!r}".format(item))
+        if ":" in address and family == socket.AF_INET and prefix >= 96:  # IPv4映射的IPv6网段
+            prefix -= 96
+        if not 0 <= prefix <= bits:
+            raise ValueError("invalid network prefix : {!r}".format(item))
+        mask = ((1 << prefix) - 1) << (bits - prefix)
+        self.networks[family].setdefault(prefix, (mask, set()))[1].add(value & mask)
+
+    def is_allowed(self, address):
+        """请求来源地址是否允许"""
+        if self.allow_all or address in self.addresses:
+            return True
+        try:
+            family, value, _ = parse_address(address)
+        except ValueError:
+            return False
+        for mask, networks in self.networks[family].itervalues():
+            if (value & mask) in networks:
+                return True
+        return False
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - cgroup监测
+
+按cgroup(容器, systemd unit)统计资源占用, 读取一个cgroup文件比累加容器内成百上千个进程的stat文件开销小得多
+- 支持 cgroup v1, v2 及混合模式 (每个控制器分别判断版本, 同时挂载时优先使用v1)
+- CPU : cpu.stat(v2) / cpuacct.usage + cpu.stat(v1), 计算CPU占用率及被限流次数
+- 内存 : memory.current + memory.stat(v2) / memory.usage_in_bytes + memory.stat(v1)
+- 磁盘IO : io.stat(v2) / blkio.throttle.io_service_bytes + blkio.throttle.io_serviced(v1), 计算读写速度及IOPS
+- 进程数 : pids.current
+- 进程号 -> cgroup 映射 : /proc/[pid]/cgroup
+
+参考资料
+reference   :   https://www.kernel.org/doc/Documentation/cgroup-v2.txt
+reference   :   https://www.kernel.org/doc/Documentation/cgroup-v1/
+"""
+
+import os
+import threading
+from time import time
+
+from path_resolver import path_resolver, proc_path, proc_ns_path
+
+CGROUP_MAX_DEPTH = 3  # 最大遍历深度(相对于监测的子树)
+CGROUP_MAX = 256  # 最多监测的cgroup数
+CONTROLLERS = ("cpu", "cpuacct", "memory", "io", "blkio", "pids")
+
+
+def discover_cgroup_mounts(mounts_path=None):
+    """
+    获取各控制器的挂载点 - /proc/mounts
+    :param mounts_path: 挂载表路径, 为None时使用根目录下的 /proc/mounts
+    :return: {控制器: (版本, 挂载点)}, v1中 cpu 与 cpuacct 可能分别挂载 (挂载点为本进程中的访问路径)
+    """
+    v1, v2 = {}, None
+    with open(mounts_path or proc_ns_path("mounts"), "r") as mounts:
+        for line in mounts:
+            spl = line.split()
+            if len(spl) < 4:
+                continue
+            mount_point, fs_type, opts = path_resolver.host_path(spl[1]), spl[2], spl[3].split(",")
+            if fs_type == "cgroup":
+                for controller in CONTROLLERS:
+                    if controller in opts:
+                        v1.setdefault(controller, (1, mount_point))
+            elif fs_type == "cgroup2" and v2 is None:
+                v2 = mount_point
+
+    controllers = dict(v1)
+    if v2 is not None:
+        try:
+            with open(os.path.join(v2, "cgroup.controllers"), "r") as f:
+                v2_controllers = f.read().split()
+        except IOError:
+            v2_controllers = []
+        # cpu.stat 在v2中总是存在(不需要开启cpu控制器)
+        for controller in set(v2_controllers + ["cpu"]):
+            if controller in ("cpu", "memory", "io", "pids") and controller not in controllers:
+                if controller == "cpu" and "cpuacct" in controllers:
+                    continue
+                controllers[controller] = (2, v2)
+    return controllers
+
+
+def read_key_values(path):
+    """读取 "键 值" 格式的文件, 文件不存在时返回None"""
+    try:
+        with open(path, "r") as f:
+            result = {}
+            for line in f:
+                spl = line.split()
+                if len(spl) == 2:
+                    result[spl[0]] = int(spl[1])
+            return result
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def read_int(path):
+    """读取只有一个整数的文件, 文件不存在或值为max时返回None"""
+    try:
+        with open(path, "r") as f:
+            return int(f.read().strip())
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def read_io_stat_v2(path):
+    """读取 io.stat (v2), 汇总所有设备 {rbytes, wbytes, rios, wios}"""
+    try:
+        with open(path, "r") as f:
+            lines = f.readlines()
+    except (IOError, OSError):
+        return None
+    total = {"rbytes": 0, "wbytes": 0, "rios": 0, "wios": 0}
+    for line in lines:
+        for item in line.split()[1:]:
+            key, _, value = item.partition("=")
+            if key in total:
+                total[key] += int(value)
+    return total
+
+
+def read_blkio_v1(path):
+    """读取 blkio.throttle.io_service_bytes / io_serviced (v1), 汇总所有设备 (Read, Write)"""
+    try:
+        with open(path, "r") as f:
+            lines = f.readlines()
+    except (IOError, OSError):
+        return None
+    read, write = 0, 0
+    for line in lines:
+        spl = line.split()
+        if len(spl) != 3:
+            continue
+        if spl[1] == "Read":
+            read += int(spl[2])
+        elif spl[1] == "Write":
+            write += int(spl[2])
+    return read, write
+
+
+def parse_pid_cgroup(content):
+    """
+    解析 /proc/[pid]/cgroup
+    :return: {控制器: cgroup路径}, v2的路径保存在键 "" 中
+    """
+    result = {}
+    for line in content.splitlines():
+        spl = line.split(":", 2)
+        if len(spl) != 3:
+            continue
+        if spl[1] == "":
+            result[""] = spl[2]
+        for controller in spl[1].split(","):
+            if controller:
+                result[controller] = spl[2]
+    return result
+
+
+class CgroupMonitor(object):
+    """cgroup监测类"""
+
+    def __init__(self, controllers=None, subtree="/", max_depth=CGROUP_MAX_DEPTH, max_cgroups=CGROUP_MAX):
+        """
+        :param controllers: {控制器: (版本, 挂载点)}, 为None时从/proc/mounts获取
+        :param subtree: 只监测该cgroup路径下的cgroup
+        """
+        self.controllers = controllers if controllers is not None else discover_cgroup_mounts()
+        self.subtree = "/" + subtree.strip("/")
+        self.max_depth = max_depth
+        self.max_cgroups = max_cgroups
+        self.cpu_count = os.sysconf("SC_NPROCESSORS_ONLN")
+        self.lock = threading.Lock()
+        self.prev = {}  # cgroup路径 -> (读取时间, 原始计数)
+
+    def controller_dir(self, controller, cgroup):
+        """控制器中cgroup对应的目录, 控制器未挂载时返回None"""
+        if controller not in self.controllers:
+            return None
+        return os.path.join(self.controllers[controller][1], cgroup.lstrip("/"))
+
+    def list_cgroups(self):
+        """遍历所有控制器挂载点, 获取监测子树下的cgroup路径 (按深度优先, 数量受限)"""
+        cgroups = set()
+        for _, mount_point in set(self.controllers.values()):
+            base = os.path.join(mount_point, self.subtree.lstrip("/"))
+            if not os.path.isdir(base):
+                continue
+            base_depth = base.rstrip("/").count("/")
+            for dir_path, dir_names, _ in os.walk(base):
+                depth = dir_path.rstrip("/").count("/") - base_depth
+                if depth >= self.max_depth:
+                    del dir_names[:]
+                relative_path = os.path.relpath(dir_path, mount_point)
+                cgroups.add("/" if relative_path == "." else "/" + relative_path)
+        cgroups = sorted(cgroups, key=lambda c: (c.count("/"), c))
+        return cgroups[:self.max_cgroups]
+
+    def read_raw(self, cgroup):
+        """读取cgroup原始计数, cgroup不存在时返回None"""
+        raw = {}
+        # CPU (微秒)
+        if "cpuacct" in self.controllers:
+            usage = read_int(os.path.join(self.controller_dir("cpuacct", cgroup), "cpuacct.usage"))
+            if usage is not None:
+                raw["cpu_usage_us"] = usage / 1000.
+        cpu_dir = self.controller_dir("cpu", cgroup)
+        if cpu_dir is not None:
+            cpu_stat = read_key_values(os.path.join(cpu_dir, "cpu.stat"))
+            if cpu_stat is not None:
+                if "usage_usec" in cpu_stat:
+                    raw["cpu_usage_us"] = cpu_stat["usage_usec"]
+                raw["nr_throttled"] = cpu_stat.get("nr_throttled")
+        # 内存
+        memory_dir = self.controller_dir("memory", cgroup)
+        if memory_dir is not None:
+            if self.controllers["memory"][0] == 2:
+                raw["mem_bytes"] = read_int(os.path.join(memory_dir, "memory.current"))
+                memory_stat = read_key_values(os.path.join(memory_dir, "memory.stat")) or {}
+                raw["mem_anon"], raw["mem_file"] = memory_stat.get("anon"), memory_stat.get("file")
+            else:
+                raw["mem_bytes"] = read_int(os.path.join(memory_dir, "memory.usage_in_bytes"))
+                memory_stat = read_key_values(os.path.join(memory_dir, "memory.stat")) or {}
+                raw["mem_anon"] = memory_stat.get("total_rss", memory_stat.get("rss"))
+                raw["mem_file"] = memory_stat.get("total_cache", memory_stat.get("cache"))
+        # 磁盘IO
+        if "io" in self.controllers:
+            io_stat = read_io_stat_v2(os.path.join(self.controller_dir("io", cgroup), "io.stat"))
+            if io_stat is not None:
+                raw["io"] = (io_stat["rbytes"], io_stat["wbytes"], io_stat["rios"], io_stat["wios"])
+        elif "blkio" in self.controllers:
+            blkio_dir = self.controller_dir("blkio", cgroup)
+            io_bytes = read_blkio_v1(os.path.join(blkio_dir, "blkio.throttle.io_service_bytes"))
+            io_ops = read_blkio_v1(os.path.join(blkio_dir, "blkio.throttle.io_serviced"))
+            if io_bytes is not None and io_ops is not None:
+                raw["io"] = io_bytes + io_ops
+        # 进程数
+        pids_dir = self.controller_dir("pids", cgroup)
+        if pids_dir is not None:
+            raw["pids"] = read_int(os.path.join(pids_dir, "pids.current"))
+        if all(value is None for value in raw.values()):
+            return None
+        return raw
+
+    def calc_cgroup(self, cgroup, raw, now):
+        """根据两次读取的原始计数计算cgroup数据"""
+        data = {
+            "mem_M": round(raw["mem_bytes"] / 1024. ** 2, 2) if raw.get("mem_bytes") is not None else None,
+            "mem_anon_M": round(raw["mem_anon"] / 1024. ** 2, 2) if raw.get("mem_anon") is not None else None,
+            "mem_file_M": round(raw["mem_file"] / 1024. ** 2, 2) if raw.get("mem_file") is not None else None,
+            "pids": raw.get("pids"),
+            "cpu_percent": 0., "throttled_per_s": 0.,
+            "io_read_MBs": 0., "io_write_MBs": 0., "io_read_iops": 0., "io_write_iops": 0.,
+        }
+        prev = self.prev.get(cgroup)
+        self.prev[cgroup] = (now, raw)
+        if prev is None or now <= prev[0]:
+            return data
+        interval = now - prev[0]
+        prev_raw = prev[1]
+        if raw.get("cpu_usage_us") is not None and prev_raw.get("cpu_usage_us") is not None:
+            # 与进程CPU占用率一致, 以整机CPU为100%
+            data["cpu_percent"] = round(max(raw["cpu_usage_us"] - prev_raw["cpu_usage_us"], 0) * 100. /
+                                        (interval * 1000000. * self.cpu_count), 4)
+        if raw.get("nr_throttled") is not None and prev_raw.get("nr_throttled") is not None:
+            data["throttled_per_s"] = round(max(raw["nr_throttled"] - prev_raw["nr_throttled"], 0) / interval, 2)
+        if raw.get("io") is not None and prev_raw.get("io") is not None:
+            delta = [max(c - p, 0) / interval for c, p in zip(raw["io"], prev_raw["io"])]
+            data["io_read_MBs"] = round(delta[0] / 1000. ** 2, 2)
+            data["io_write_MBs"] = round(delta[1] / 1000. ** 2, 2)
+            data["io_read_iops"] = round(delta[2], 2)
+            data["io_write_iops"] = round(delta[3], 2)
+        return data
+
+    def collect(self):
+        """计算监测子树下所有cgroup的数据 {cgroup路径: 数据}"""
+        result = {}
+        with self.lock:
+            for cgroup in self.list_cgroups():
+                raw = self.read_raw(cgroup)
+                if raw is not None:
+                    result[cgroup] = self.calc_cgroup(cgroup, raw, time())
+            # 清理已删除的cgroup
+            for cgroup in set(self.prev.keys()) - set(result.keys()):
+                self.prev.pop(cgroup)
+        return result
+
+    def get_pid_cgroups(self, pid):
+        """获取进程所属的cgroup {控制器: cgroup路径} - /proc/[pid]/cgroup, 进程不存在时返回None"""
+        try:
+            with open(proc_path(pid, "cgroup"), "r") as f:
+                return parse_pid_cgroup(f.read())
+        except (IOError, OSError):
+            return None
+
+    def get_pid_cgroup(self, pid):
+        """获取进程所属的cgroup路径 (v2路径, 或v1中cpu/cpuacct/memory控制器的路径)"""
+        cgroups = self.get_pid_cgroups(pid)
+        if not cgroups:
+            return None
+        for controller in ("cpuacct", "cpu", "memory"):
+            if controller in self.controllers and self.controllers[controller][0] == 1 and controller in cgroups:
+                return cgroups[controller]
+        return cgroups.get("", cgroups.values()[0])
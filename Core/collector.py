@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 采集项注册及调度
+
+主要包括
+- 采集项注册表 : 每个采集项声明采集间隔, 单次耗时预算及输出结构(schema)
+- 时间轮调度 : 采样线程每个周期时间轮前进一格, 只运行到期的采集项, 未到期的采集项沿用上次的结果
+- 单次耗时超出预算的采集项采集间隔加倍(不超过最大退避倍数), 耗时恢复到预算一半以内后逐步回到配置的间隔
+- 采集间隔, 预算及是否启用可以由配置文件覆盖, 不同类型的主机不需要修改代码即可调整采集开销
+- 自适应采样 : 统计采样线程自身的CPU时间, 超出CPU预算(单核占比)时按优先级从低到高依次拉长采集间隔,
+  全量扫描类的采集项(套接字表, cgroup树, 进程树等)最先被拉长, 被监测进程的数据最后; 负载恢复后按相反顺序恢复
+
+采集项函数
+    func(values, errors) -> 采集结果
+    values : 各采集项最近一次的结果 (同一周期内按注册顺序运行, 后注册的采集项可以使用先注册的采集项本周期的结果)
+    errors : 本周期的采集错误 {名称: 错误信息}, 采集项内部可以写入更细的错误; 抛出异常时记录异常并清除该采集项的结果
+"""
+
+import os
+import threading
+from time import time
+
+COLLECTOR_WHEEL_SLOTS = 64  # 时间轮格数
+COLLECTOR_MAX_BACKOFF = 8  # 超出耗时预算时的最大退避倍数
+ADAPTIVE_MAX_STRETCH = 16  # 超出CPU预算时的最大拉长倍数
+ADAPTIVE_COOLDOWN = 3  # 两次调整拉长倍数之间至少间隔的采样周期数
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+# 采集项优先级 (超出CPU预算时先拉长低优先级的采集间隔)
+PRIORITY_HIGH = 0  # 被监测进程的数据
+PRIORITY_NORMAL = 1  # 系统整体数据
+PRIORITY_LOW = 2  # 全量扫描
+PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+
+def thread_cpu_time():
+    """当前线程已使用的CPU时间(秒) - /proc/thread-self/stat (内核3.17+), 不支持时使用整个进程的CPU时间"""
+    try:
+        with open("/proc/thread-self/stat", "r") as t_stat:
+            t_data = t_stat.readline()
+    except (IOError, OSError):
+        times = os.times()
+        return times[0] + times[1]
+    fields = t_data[t_data.rfind(")") + 2:].split()
+    return (int(fields[11]) + int(fields[12])) / float(CLOCK_TICKS)
+
+
+class Collector(object):
+    """采集项"""
+
+    def __init__(self, name, func, interval=0, budget=None, schema=None, priority=PRIORITY_NORMAL):
+        self.name = name
+        self.func = func
+        self.interval = interval  # 配置的采集间隔(秒), 0表示每个采样周期都采集
+        self.budget = budget  # 单次耗时预算(秒), None表示不限制
+        self.priority = priority
+        self.schema = schema or {}  # 输出结构说明
+        self.enabled = True
+        self.order = 0  # 注册顺序
+        self.backoff = 1  # 当前退避倍数
+        self.runs = 0
+        self.skips = 0  # 未到期而沿用上次结果的周期数
+        self.last_cost = None  # 最近一次耗时(秒)
+        self.avg_cost = None  # 耗时的指数移动平均(秒)
+        self.last_run = None  # 最近一次采集时间
+
+    def interval_ticks(self, tick_seconds, stretch=1):
+        """当前生效的采集间隔(采样周期数), stretch为自适应采样的拉长倍数"""
+        ticks = int(round(float(self.interval) / tick_seconds)) if tick_seconds > 0 else 1
+        return max(ticks, 1) * self.backoff * stretch
+
+    def record_cost(self, cost):
+        """记录单次耗时, 并根据预算调整退避倍数"""
+        self.last_cost = cost
+        self.avg_cost = cost if self.avg_cost is None else self.avg_cost * 0.8 + cost * 0.2
+        if self.budget is None:
+            return
+        if cost > self.budget:
+            self.backoff = min(self.backoff * 2, COLLECTOR_MAX_BACKOFF)
+        elif cost < self.budget / 2. and self.backoff > 1:
+            self.backoff //= 2
+
+    def describe(self, tick_seconds, stretch=1):
+        """采集项状态"""
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "priority": PRIORITY_NAMES.get(self.priority, self.priority),
+            "interval": self.interval,
+            "effective_interval": self.interval_ticks(tick_seconds, stretch) * tick_seconds,
+            "budget": self.budget,
+            "backoff": self.backoff,
+            "stretch": stretch,
+            "runs": self.runs,
+            "skips": self.skips,
+            "last_cost_ms": round(self.last_cost * 1000, 3) if self.last_cost is not None else None,
+            "avg_cost_ms": round(self.avg_cost * 1000, 3) if self.avg_cost is not None else None,
+            "last_run": self.last_run,
+            "schema": self.schema,
+        }
+
+
+class CollectorRegistry(object):
+    """采集项注册表"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = {}  # 名称 -> 采集项
+        self.next_order = 0
+
+    def register(self, name, func, interval=0, budget=None, schema=None, priority=PRIORITY_NORMAL):
+        """注册采集项 (同名采集项被替换, 保留原来的运行顺序)"""
+        collector = Collector(name, func, interval, budget, schema, priority)
+        with self.lock:
+            if name in self.items:
+                collector.order = self.items[name].order
+            else:
+                collector.order = self.next_order
+                self.next_order += 1
+            self.items[name] = collector
+        return collector
+
+    def unregister(self, name):
+        """注销采集项"""
+        with self.lock:
+            return self.items.pop(name, None) is not None
+
+    def get(self, name):
+        with self.lock:
+            return self.items.get(name)
+
+    def collectors(self):
+        """按注册顺序获取所有采集项"""
+        with self.lock:
+            return sorted(self.items.values(), key=lambda c: c.order)
+
+    def configure(self, overrides):
+        """
+        按配置覆盖采集项参数, 未注册的名称忽略
+        :param overrides: {名称: {"interval", "budget", "enabled"}}
+        """
+        with self.lock:
+            for name, options in (overrides or {}).items():
+                collector = self.items.get(name)
+                if collector is None:
+                    continue
+                if "interval" in options:
+                    collector.interval = options["interval"]
+                if "budget" in options:
+                    collector.budget = options["budget"]
+                if "enabled" in options:
+                    collector.enabled = bool(options["enabled"])
+
+
+class TimerWheel(object):
+    """时间轮 - 每格对应一个采样周期, 到期时间超过一圈的项目在格内等待对应的圈数"""
+
+    def __init__(self, slots=COLLECTOR_WHEEL_SLOTS):
+        self.slots = [[] for _ in xrange(slots)]
+        self.tick = 0
+
+    def schedule(self, item, delay):
+        """在delay个周期后到期 (delay至少为1)"""
+        due = self.tick + max(int(delay), 1)
+        self.slots[due % len(self.slots)].append((due, item))
+
+    def advance(self):
+        """前进一格, 返回到期的项目"""
+        self.tick += 1
+        slot = self.slots[self.tick % len(self.slots)]
+        due = [item for due_tick, item in slot if due_tick <= self.tick]
+        if due:
+            slot[:] = [(due_tick, item) for due_tick, item in slot if due_tick > self.tick]
+        return due
+
+
+class CollectorScheduler(object):
+    """采集项调度类"""
+
+    def __init__(self, registry, tick_seconds, slots=COLLECTOR_WHEEL_SLOTS, cpu_budget=None):
+        self.registry = registry
+        self.tick_seconds = tick_seconds  # 每个采样周期的秒数
+        self.wheel = TimerWheel(slots)
+        self.scheduled = set()  # 已在时间轮中的采集项名称
+        self.values = {}  # 名称 -> 最近一次结果
+        # 自适应采样
+        self.cpu_budget = cpu_budget  # 采样线程CPU预算(单核占比, 如0.01即1%), None或0表示不限制
+        self.cpu_usage = None  # 采样线程CPU占用(单核占比)的指数移动平均
+        self.stretch = dict((priority, 1) for priority in PRIORITY_NAMES)  # 优先级 -> 拉长倍数
+        self.cooldown = 0
+
+    def run_tick(self):
+        """
+        运行一个采样周期 : 新注册的采集项立即运行, 其余只运行到期的采集项
+        :return: (各采集项的最近结果, 本周期的采集错误)
+        """
+        cpu_start = thread_cpu_time()
+        for collector in self.wheel.advance():
+            self.scheduled.discard(collector.name)
+        errors = {}
+        collectors = self.registry.collectors()
+        for name in set(self.values) - set(collector.name for collector in collectors):  # 已注销
+            self.values.pop(name)
+        for collector in collectors:
+            if not collector.enabled:
+                self.values.pop(collector.name, None)
+                continue
+            if collector.name in self.scheduled:  # 未到期
+                collector.skips += 1
+                continue
+            self.run_collector(collector, errors)
+            self.wheel.schedule(collector, collector.interval_ticks(self.tick_seconds,
+                                                                    self.stretch.get(collector.priority, 1)))
+            self.scheduled.add(collector.name)
+        self.adapt(thread_cpu_time() - cpu_start)
+        return self.values, errors
+
+    def adapt(self, cpu_cost):
+        """
+        根据本周期的CPU时间调整各优先级的拉长倍数
+        超出预算时拉长最低的尚未达到上限的优先级, 低于预算一半时恢复最高的已被拉长的优先级
+        """
+        usage = cpu_cost / self.tick_seconds if self.tick_seconds > 0 else 0.
+        self.cpu_usage = usage if self.cpu_usage is None else self.cpu_usage * 0.7 + usage * 0.3
+        if not self.cpu_budget:
+            return
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return
+        if self.cpu_usage > self.cpu_budget:
+            for priority in sorted(self.stretch, reverse=True):
+                if self.stretch[priority] < ADAPTIVE_MAX_STRETCH:
+                    self.stretch[priority] *= 2
+                    self.cooldown = ADAPTIVE_COOLDOWN
+                    return
+        elif self.cpu_usage < self.cpu_budget / 2.:
+            for priority in sorted(self.stretch):
+                if self.stretch[priority] > 1:
+                    self.stretch[priority] //= 2
+                    self.cooldown = ADAPTIVE_COOLDOWN
+                    return
+
+    def run_collector(self, collector, errors):
+        """运行单个采集项并记录耗时"""
+        start = time()
+        try:
+            self.values[collector.name] = collector.func(self.values, errors)
+        except Exception as err:
+            errors[collector.name] = str(err)
+            self.values.pop(collector.name, None)
+        collector.runs += 1
+        collector.last_run = start
+        collector.record_cost(time() - start)
+
+    def describe(self):
+        """所有采集项的配置及运行状态"""
+        return [collector.describe(self.tick_seconds, self.stretch.get(collector.priority, 1))
+                for collector in self.registry.collectors()]
+
+    def get_status(self):
+        """自适应采样状态及各采集项的生效间隔(秒)"""
+        return {
+            "tick_seconds": self.tick_seconds,
+            "cpu_budget": self.cpu_budget,
+            "cpu_usage": round(self.cpu_usage, 6) if self.cpu_usage is not None else None,
+            "stretch": dict((PRIORITY_NAMES[priority], stretch) for priority, stretch in self.stretch.items()),
+            "intervals": dict((collector.name, collector.interval_ticks(
+                self.tick_seconds, self.stretch.get(collector.priority, 1)) * self.tick_seconds)
+                for collector in self.registry.collectors() if collector.enabled),
+        }
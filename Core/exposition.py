@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 指标导出
+
+将采样快照渲染为 Prometheus 文本格式 (text exposition format 0.0.4)
+
+参考资料
+reference   :   https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+METRIC_PREFIX = "watchdogs_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape_label_value(value):
+    """转义标签值 (反斜杠, 双引号, 换行)"""
+    if isinstance(value, unicode):
+        value = value.encode("utf-8")
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_value(value):
+    """格式化样本值"""
+    if isinstance(value, (int, long)) and not isinstance(value, bool):
+        return str(value)
+    value = float(value)
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    return repr(value)
+
+
+class MetricWriter(object):
+    """按指标族(metric family)组织输出行"""
+
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self.lines = []
+
+    def family(self, name, help_text, samples, metric_type="gauge"):
+        """
+        写入一个指标族
+        :param samples: [(标签列表[(标签名, 标签值)], 值), ...]
+        """
+        samples = [s for s in samples if s[1] is not None]
+        if not samples:
+            return
+        full_name = self.prefix + name
+        self.lines.append("# HELP {} {}".format(full_name, help_text))
+        self.lines.append("# TYPE {} {}".format(full_name, metric_type))
+        for labels, value in samples:
+            if labels:
+                label_str = ",".join('{}="{}"'.format(k, escape_label_value(v)) for k, v in labels)
+                self.lines.append("{}{{{}}} {}".format(full_name, label_str, format_value(value)))
+            else:
+                self.lines.append("{} {}".format(full_name, format_value(value)))
+
+    def render(self):
+        """生成最终文本"""
+        return "\n".join(self.lines) + "\n"
+
+
+def render_snapshot(snapshot):
+    """将采样快照渲染为 Prometheus 文本"""
+    w = MetricWriter()
+    if not snapshot:
+        return w.render()
+
+    w.family("sample_seq", "Sequence number of the snapshot", [([], snapshot["seq"])], "counter")
+    w.family("sample_timestamp_seconds", "Unix time the snapshot was taken", [([], snapshot["timestamp"])])
+
+    sys_data = snapshot.get("sys", {})
+    # CPU
+    w.family("cpu_percent", "Total CPU usage percent", [([], sys_data.get("cpu_percent"))])
+    w.family("cpu_core_percent", "Per core CPU usage percent",
+             [([("core", core)], pct) for core, pct in sorted(sys_data.get("cpu_percents", {}).items())])
+    # 内存
+    mem = sys_data.get("mem", {})
+    w.family("mem_total_kilobytes", "MemTotal from /proc/meminfo", [([], mem.get("total"))])
+    w.family("mem_free_kilobytes", "MemFree from /proc/meminfo", [([], mem.get("free"))])
+    w.family("mem_available_kilobytes", "MemAvailable from /proc/meminfo", [([], mem.get("available"))])
+    w.family("mem_percent", "Memory usage percent", [([], mem.get("percent"))])
+    # 平均负载
+    la = sys_data.get("loadavg", {})
+    w.family("loadavg", "System load average",
+             [([("period", p)], la.get("lavg_" + p)) for p in ("1", "5", "15")])
+    w.family("procs_running", "Number of runnable scheduling entities", [([], la.get("running"))])
+    w.family("procs_total", "Number of existing scheduling entities", [([], la.get("total"))])
+    # 资源压力(PSI)
+    pressure = sorted(sys_data.get("pressure", {}).items())
+    w.family("pressure_avg_percent", "Pressure stall average from /proc/pressure",
+             [([("resource", resource), ("kind", kind), ("window", window)], p.get(kind + "_" + window))
+              for resource, p in pressure for kind in ("some", "full") for window in ("avg10", "avg60", "avg300")])
+    w.family("pressure_stall_percent", "Percent of time stalled since the previous sample",
+             [([("resource", resource), ("kind", kind)], p.get(kind + "_percent"))
+              for resource, p in pressure for kind in ("some", "full")])
+    # 虚拟内存事件
+    vmstat = sys_data.get("vmstat", {})
+    for name, key, help_text in (("vmstat_pgmajfault_per_second", "pgmajfault_per_s", "Major page faults per second"),
+                                 ("vmstat_pswpin_per_second", "pswpin_per_s", "Pages swapped in per second"),
+                                 ("vmstat_pswpout_per_second", "pswpout_per_s", "Pages swapped out per second"),
+                                 ("vmstat_oom_kill_per_second", "oom_kill_per_s", "OOM kills per second")):
+        w.family(name, help_text, [([], vmstat.get(key))])
+    w.family("vmstat_oom_kill_total", "OOM kills since boot", [([], vmstat.get("oom_kill"))], "counter")
+    # 套接字
+    sockets = sys_data.get("sockets", {})
+    w.family("tcp_connections", "TCP sockets by state",
+             [([("state", state)], count) for state, count in sorted(sockets.get("tcp", {}).items())])
+    w.family("udp_sockets", "Number of UDP sockets", [([], sockets.get("udp"))])
+    snmp = sockets.get("snmp", {})
+    w.family("tcp_curr_estab", "TCP connections in ESTABLISHED or CLOSE_WAIT", [([], snmp.get("tcp_curr_estab"))])
+    w.family("tcp_retrans_percent", "TCP retransmitted segments / sent segments (%)",
+             [([], snmp.get("tcp_retrans_percent"))])
+    for name in sorted(k[:-len("_per_s")] for k in snmp.keys() if k.endswith("_per_s")):
+        w.family(name + "_per_second", "/proc/net/snmp " + name + " per second", [([], snmp[name + "_per_s"])])
+    # 网络
+    net = sys_data.get("net", {})
+    if net:
+        device = [("device", net.get("device", ""))]
+        w.family("net_upload_kbps", "Network upload speed (KB/s)", [(device, net.get("upload_kbps"))])
+        w.family("net_download_kbps", "Network download speed (KB/s)", [(device, net.get("download_kbps"))])
+    net_devices = sorted(sys_data.get("net_devices", {}).items())
+    for name, key, help_text in (("net_device_receive_kbps", "download_kbps", "Interface receive speed (KB/s)"),
+                                 ("net_device_transmit_kbps", "upload_kbps", "Interface transmit speed (KB/s)"),
+                                 ("net_device_receive_packets", "rx_packets", "Interface received packets per second"),
+                                 ("net_device_transmit_packets", "tx_packets", "Interface sent packets per second"),
+                                 ("net_device_receive_errs", "rx_errs", "Interface receive errors per second"),
+                                 ("net_device_transmit_errs", "tx_errs", "Interface transmit errors per second"),
+                                 ("net_device_receive_drop", "rx_drop", "Interface receive drops per second"),
+                                 ("net_device_transmit_drop", "tx_drop", "Interface transmit drops per second")):
+        w.family(name, help_text, [([("device", device)], d.get(key)) for device, d in net_devices])
+    # 磁盘IO
+    io = sys_data.get("io", {})
+    w.family("disk_read_mbps", "Disk read speed (MB/s)", [([], io.get("read_MBs"))])
+    w.family("disk_write_mbps", "Disk write speed (MB/s)", [([], io.get("write_MBs"))])
+    io_devices = sorted(sys_data.get("io_devices", {}).items())
+    for name, key, help_text in (("disk_device_read_mbps", "read_MBs", "Device read speed (MB/s)"),
+                                 ("disk_device_write_mbps", "write_MBs", "Device write speed (MB/s)"),
+                                 ("disk_device_read_iops", "read_iops", "Device reads completed per second"),
+                                 ("disk_device_write_iops", "write_iops", "Device writes completed per second"),
+                                 ("disk_device_read_await_ms", "read_await_ms", "Device average read latency (ms)"),
+                                 ("disk_device_write_await_ms", "write_await_ms", "Device average write latency (ms)"),
+                                 ("disk_device_util_percent", "util_percent", "Device busy time percent")):
+        w.family(name, help_text, [([("device", device)], d.get(key)) for device, d in io_devices])
+    # 磁盘占用 : 设备, 文件系统, 总大小, 已用大小, 使用率, 挂载点
+    disk = sys_data.get("disk", [])
+    disk_labels = [[("device", d[0]), ("fstype", d[1]), ("mountpoint", d[5])] for d in disk]
+    w.family("disk_total_gigabytes", "Filesystem size (G)", [(l, d[2]) for l, d in zip(disk_labels, disk)])
+    w.family("disk_used_gigabytes", "Filesystem used size (G)", [(l, d[3]) for l, d in zip(disk_labels, disk)])
+    w.family("disk_used_percent", "Filesystem used percent", [(l, d[4]) for l, d in zip(disk_labels, disk)])
+    w.family("disk_stat_pending", "Mount point whose statvfs has not returned yet",
+             [([("mountpoint", m)], 1) for m in sorted(sys_data.get("disk_pending", []))])
+
+    # 被监控进程
+    procs = sorted(snapshot.get("process", {}).items(), key=lambda kv: int(kv[0]))
+    proc_labels = [[("pid", pid), ("comm", p.get("comm", ""))] for pid, p in procs]
+    for name, key, help_text in (("process_cpu_percent", "cpu_percent", "Process CPU usage percent"),
+                                 ("process_mem_megabytes", "mem_M", "Process resident memory (M)"),
+                                 ("process_io_read_mbps", "io_read_MBs", "Process read speed (MB/s)"),
+                                 ("process_io_write_mbps", "io_write_MBs", "Process write speed (MB/s)"),
+                                 ("process_threads", "threads", "Process thread count")):
+        w.family(name, help_text, [(l, p.get(key)) for l, (pid, p) in zip(proc_labels, procs)])
+    w.family("process_tcp_connections", "Process TCP sockets by state",
+             [(l + [("state", state)], count) for l, (pid, p) in zip(proc_labels, procs)
+              for state, count in sorted((p.get("sockets") or {}).get("tcp", {}).items())])
+    w.family("process_udp_sockets", "Process UDP sockets",
+             [(l, (p.get("sockets") or {}).get("udp")) for l, (pid, p) in zip(proc_labels, procs)])
+    w.family("process_tcp_retransmits", "Unacknowledged retransmits over the process TCP sockets",
+             [(l, (p.get("sockets") or {}).get("retransmits")) for l, (pid, p) in zip(proc_labels, procs)])
+    for name, key, help_text in (("process_mem_rss_kilobytes", "rss", "Process resident set size (KB)"),
+                                 ("process_mem_pss_kilobytes", "pss", "Process proportional set size (KB)"),
+                                 ("process_mem_uss_kilobytes", "uss", "Process unique set size (KB)"),
+                                 ("process_mem_swap_kilobytes", "swap", "Process swapped out memory (KB)"),
+                                 ("process_mem_shared_kilobytes", "shared", "Process shared memory (KB)")):
+        w.family(name, help_text, [(l, (p.get("mem_detail") or {}).get(key))
+                                   for l, (pid, p) in zip(proc_labels, procs)])
+    for name, key, help_text in (("process_net_sent_kbps", "sent_kbps", "Process upload speed (KB/s)"),
+                                 ("process_net_recv_kbps", "recv_kbps", "Process download speed (KB/s)")):
+        w.family(name, help_text, [(l + [("window", window)], rate[key]) for l, (pid, p) in zip(proc_labels, procs)
+                                   for window, rate in sorted((p.get("net_rates") or {}).items())])
+    w.family("process_thread_cpu_percent", "CPU usage percent of the hottest threads",
+             [(l + [("tid", t["tid"]), ("thread", t["name"])], t["cpu_percent"])
+              for l, (pid, p) in zip(proc_labels, procs) for t in p.get("top_threads", [])])
+
+    # 进程组(进程及其子孙进程)汇总
+    groups = sorted(snapshot.get("process_groups", {}).items(), key=lambda kv: int(kv[0]))
+    group_labels = [[("root_pid", pid), ("comm", g.get("comm") or "")] for pid, g in groups]
+    for name, key, help_text in (("process_group_members", "members", "Number of live processes in the group"),
+                                 ("process_group_cpu_percent", "cpu_percent", "Group CPU usage percent"),
+                                 ("process_group_rss_megabytes", "rss_M", "Group resident memory (M)"),
+                                 ("process_group_io_read_mbps", "io_read_MBs", "Group read speed (MB/s)"),
+                                 ("process_group_io_write_mbps", "io_write_MBs", "Group write speed (MB/s)"),
+                                 ("process_group_threads", "threads", "Group thread count")):
+        w.family(name, help_text, [(l, g.get(key)) for l, (pid, g) in zip(group_labels, groups)])
+
+    # cgroup
+    cgroups = sorted(snapshot.get("cgroups", {}).items())
+    for name, key, help_text in (("cgroup_cpu_percent", "cpu_percent", "Cgroup CPU usage percent"),
+                                 ("cgroup_throttled_per_second", "throttled_per_s",
+                                  "Cgroup CPU throttled periods per second"),
+                                 ("cgroup_mem_megabytes", "mem_M", "Cgroup memory usage (M)"),
+                                 ("cgroup_mem_anon_megabytes", "mem_anon_M", "Cgroup anonymous memory (M)"),
+                                 ("cgroup_mem_file_megabytes", "mem_file_M", "Cgroup page cache (M)"),
+                                 ("cgroup_io_read_mbps", "io_read_MBs", "Cgroup read speed (MB/s)"),
+                                 ("cgroup_io_write_mbps", "io_write_MBs", "Cgroup write speed (MB/s)"),
+                                 ("cgroup_io_read_iops", "io_read_iops", "Cgroup reads per second"),
+                                 ("cgroup_io_write_iops", "io_write_iops", "Cgroup writes per second"),
+                                 ("cgroup_pids", "pids", "Number of processes in the cgroup")):
+        w.family(name, help_text, [([("cgroup", path)], c.get(key)) for path, c in cgroups])
+
+    return w.render()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 本地指标持久化存储
+
+只追加写入的定长记录分段存储
+- 每个分段是一个预分配并内存映射(mmap)的文件, 按大小或时间轮转
+- 每条记录 : 序号(Q), 时间戳(d), 指标编号(I), 值(d), crc32(I), 共32字节
+- 每条记录带有crc32, 崩溃后重新打开时扫描到第一条无效记录即为写入位置(半写入的记录被丢弃)
+- 分段封存时写入一个小索引文件(首尾序号/时间, 引用的指标编号), 查询时据此跳过无关分段
+- 指标名与编号的对应关系保存在 metrics.json 中; 新指标名每批写入时追加到 metrics.journal (每行 [编号, 指标名]),
+  不再每个新指标重写整个文件
+- 分段过期删除后, 不再被任何分段引用的指标编号被回收(之后分配给新指标), metrics.json 重写为压缩后的对应关系,
+  metrics.journal 清空; 已退出进程的指标名不会无限累积
+
+存储目录结构
+    metrics.json / metrics.journal
+    00000000000000000001.seg / 00000000000000000001.idx
+    00000000000000000721.seg  (当前写入的分段, 尚无索引)
+"""
+
+import os
+import json
+import mmap
+import heapq
+import zlib
+import struct
+import threading
+
+SEGMENT_MAGIC = "WDSTORE1"
+SEGMENT_VERSION = 1
+SEGMENT_HEADER = struct.Struct("<8sIIdQ")  # magic, 版本, 记录大小, 创建时间, 首条记录序号
+SEGMENT_HEADER_SIZE = 64
+RECORD = struct.Struct("<QdIdI")  # 序号, 时间戳, 指标编号, 值, crc32
+RECORD_BODY = struct.Struct("<QdId")  # 参与crc32计算的部分
+RECORD_SIZE = RECORD.size
+
+SEGMENT_SIZE = 4 * 1024 * 1024  # 分段大小(字节)
+SEGMENT_SECONDS = 3600  # 分段最长时间跨度(秒)
+MAX_SEGMENTS = 48  # 最多保留的分段数
+
+
+class Segment(object):
+    """存储分段"""
+
+    def __init__(self, path, first_seq, created, capacity):
+        self.path = path
+        self.index_path = path[:-len(".seg")] + ".idx"
+        self.first_seq = first_seq
+        self.created = created
+        self.capacity = capacity  # 可容纳的记录数
+        self.records = 0
+        self.last_seq = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.sealed = False
+        self.metric_ids = set()  # 分段中出现过的指标编号
+        self.mm = None
+
+    @property
+    def size(self):
+        return SEGMENT_HEADER_SIZE + self.capacity * RECORD_SIZE
+
+    def index(self):
+        """分段索引"""
+        return {"first_seq": self.first_seq, "last_seq": self.last_seq, "first_ts": self.first_ts,
+                "last_ts": self.last_ts, "records": self.records, "created": self.created,
+                "metric_ids": sorted(self.metric_ids)}
+
+    @classmethod
+    def create(cls, path, first_seq, created, capacity):
+        """新建分段(预分配空间并映射到内存)"""
+        segment = cls(path, first_seq, created, capacity)
+        with open(path, "wb") as f:
+            f.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, RECORD_SIZE, created, first_seq))
+            f.truncate(segment.size)
+        segment.map()
+        return segment
+
+    @classmethod
+    def load(cls, path):
+        """加载已有分段 (有索引文件时直接读取索引, 否则扫描记录)"""
+        with open(path, "rb") as f:
+            magic, version, record_size, created, first_seq = SEGMENT_HEADER.unpack(f.read(SEGMENT_HEADER.size))
+            if magic != SEGMENT_MAGIC or record_size != RECORD_SIZE:
+                raise ValueError("not a metric store segment : " + path)
+            f.seek(0, os.SEEK_END)
+            capacity = (f.tell() - SEGMENT_HEADER_SIZE) // RECORD_SIZE
+        segment = cls(path, first_seq, created, capacity)
+        if os.path.exists(segment.index_path):
+            with open(segment.index_path, "r") as f:
+                index = json.load(f)
+            segment.records, segment.last_seq = index["records"], index["last_seq"]
+            segment.first_ts, segment.last_ts = index["first_ts"], index["last_ts"]
+            segment.sealed = True
+            if "metric_ids" in index:
+                segment.metric_ids = set(index["metric_ids"])
+            else:  # 旧版本索引没有指标编号
+                segment.metric_ids = set(metric_id for _, _, metric_id, _ in segment.scan())
+        else:
+            for seq, ts, metric_id, _ in segment.scan():
+                segment.metric_ids.add(metric_id)
+                segment.records += 1
+                segment.last_seq, segment.last_ts = seq, ts
+                if segment.first_ts is None:
+                    segment.first_ts = ts
+        return segment
+
+    def map(self):
+        """映射到内存"""
+        with open(self.path, "r+b") as f:
+            self.mm = mmap.mmap(f.fileno(), self.size)
+
+    def scan(self):
+        """按顺序遍历有效记录 [(序号, 时间戳, 指标编号, 值)], 遇到空记录/校验失败/序号回退时停止"""
+        if self.mm is not None:
+            data = self.mm[:SEGMENT_HEADER_SIZE + self.records * RECORD_SIZE]
+        else:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        prev_seq = 0
+        for offset in xrange(SEGMENT_HEADER_SIZE, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+            seq, ts, metric_id, value, crc = RECORD.unpack_from(data, offset)
+            if seq == 0 or seq < prev_seq or zlib.crc32(data[offset:offset + RECORD_BODY.size]) & 0xffffffff != crc:
+                break
+            prev_seq = seq
+            yield seq, ts, metric_id, value
+
+    def append(self, seq, timestamp, items):
+        """追加一批记录 [(指标编号, 值)]"""
+        offset = SEGMENT_HEADER_SIZE + self.records * RECORD_SIZE
+        buf = []
+        for metric_id, value in items:
+            body = RECORD_BODY.pack(seq, timestamp, metric_id, value)
+            buf.append(body + struct.pack("<I", zlib.crc32(body) & 0xffffffff))
+            self.metric_ids.add(metric_id)
+        buf = "".join(buf)
+        self.mm[offset:offset + len(buf)] = buf
+        self.records += len(items)
+        self.last_seq, self.last_ts = seq, timestamp
+        if self.first_ts is None:
+            self.first_ts = timestamp
+
+    def flush(self):
+        if self.mm is not None:
+            self.mm.flush()
+
+    def seal(self):
+        """封存分段 : 截去未使用的空间, 写入索引"""
+        if self.mm is not None:
+            self.mm.flush()
+            self.mm.close()
+            self.mm = None
+        with open(self.path, "r+b") as f:
+            f.truncate(SEGMENT_HEADER_SIZE + self.records * RECORD_SIZE)
+        self.capacity = self.records
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index(), f)
+        os.rename(tmp_path, self.index_path)
+        self.sealed = True
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.flush()
+            self.mm.close()
+            self.mm = None
+
+    def remove(self):
+        self.close()
+        for path in (self.path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class MetricStore(object):
+    """本地指标持久化存储"""
+
+    def __init__(self, path, segment_size=SEGMENT_SIZE, segment_seconds=SEGMENT_SECONDS, max_segments=MAX_SEGMENTS):
+        self.path = path
+        self.segment_capacity = max((segment_size - SEGMENT_HEADER_SIZE) // RECORD_SIZE, 1)
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        self.segments = []
+        self.names = {}  # 指标名 -> 指标编号
+        self.metric_names = []  # 指标编号 -> 指标名 (已回收的编号为None)
+        self.free_ids = []  # 已回收, 可重新分配的指标编号 (小顶堆)
+        self.new_names = []  # 本批写入中新分配的 (指标编号, 指标名), 写入记录前追加到日志
+        self.last_seq = 0
+
+    @property
+    def names_path(self):
+        return os.path.join(self.path, "metrics.json")
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.path, "metrics.journal")
+
+    def open(self):
+        """打开存储目录并恢复写入位置"""
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        if os.path.exists(self.names_path):
+            with open(self.names_path, "r") as f:
+                self.metric_names = [name.encode("utf-8") if name is not None else None for name in json.load(f)]
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    try:
+                        metric_id, name = json.loads(line)
+                    except ValueError:  # 崩溃时半写入的最后一行
+                        break
+                    self.metric_names.extend([None] * (metric_id + 1 - len(self.metric_names)))
+                    self.metric_names[metric_id] = name.encode("utf-8")
+        self.names = dict((name, i) for i, name in enumerate(self.metric_names) if name is not None)
+        self.free_ids = [i for i, name in enumerate(self.metric_names) if name is None]
+
+        segment_files = sorted(f for f in os.listdir(self.path) if f.endswith(".seg"))
+        for segment_file in segment_files:
+            try:
+                segment = Segment.load(os.path.join(self.path, segment_file))
+            except (ValueError, struct.error, IOError):
+                continue
+            if not segment.records:
+                segment.remove()
+                continue
+            self.segments.append(segment)
+        # 除最后一个分段外都应已封存(可能是封存过程中崩溃)
+        for segment in self.segments[:-1]:
+            if not segment.sealed:
+                segment.seal()
+        if self.segments and not self.segments[-1].sealed:
+            self.segments[-1].map()
+        if self.segments:
+            self.last_seq = self.segments[-1].last_seq
+        return self
+
+    def save_names(self):
+        """保存全部指标名并清空日志 (先写临时文件再重命名, 保证崩溃时文件完整)"""
+        tmp_path = self.names_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.metric_names, f)
+        os.rename(tmp_path, self.names_path)
+        with open(self.journal_path, "w"):
+            pass
+
+    def journal_names(self):
+        """将本批新分配的指标名追加到日志 (一次写入)"""
+        if not self.new_names:
+            return
+        with open(self.journal_path, "a") as f:
+            f.write("".join(json.dumps([metric_id, name]) + "\n" for metric_id, name in self.new_names))
+        self.new_names = []
+
+    def get_metric_id(self, name):
+        """获取指标编号 (新指标优先使用已回收的编号, 由 journal_names 保存)"""
+        if name not in self.names:
+            if self.free_ids:
+                metric_id = heapq.heappop(self.free_ids)
+                self.metric_names[metric_id] = name
+            else:
+                metric_id = len(self.metric_names)
+                self.metric_names.append(name)
+            self.names[name] = metric_id
+            self.new_names.append((metric_id, name))
+        return self.names[name]
+
+    def prune_names(self):
+        """回收不再被任何分段引用的指标编号, 并重写指标名文件"""
+        referenced = set()
+        for segment in self.segments:
+            referenced |= segment.metric_ids
+        pruned = False
+        for metric_id, name in enumerate(self.metric_names):
+            if name is not None and metric_id not in referenced:
+                del self.names[name]
+                self.metric_names[metric_id] = None
+                heapq.heappush(self.free_ids, metric_id)
+                pruned = True
+        if pruned:
+            self.save_names()
+
+    def active_segment(self, seq, timestamp, records):
+        """获取当前写入的分段 (空间或时间跨度超出时轮转)"""
+        segment = self.segments[-1] if self.segments else None
+        if segment is not None and not segment.sealed and \
+                segment.records + records <= segment.capacity and \
+                timestamp - segment.created < self.segment_seconds:
+            return segment
+        if segment is not None and not segment.sealed:
+            segment.seal()
+        segment = Segment.create(os.path.join(self.path, "%020d.seg" % seq), seq, timestamp,
+                                 max(self.segment_capacity, records))
+        self.segments.append(segment)
+        return segment
+
+    def append(self, seq, timestamp, samples):
+        """
+        写入一次采样的所有指标
+        :param seq: 采样序号(必须递增)
+        :param samples: {指标名: 值}
+        """
+        with self.lock:
+            if seq <= self.last_seq:
+                raise ValueError("seq must increase (last seq = {}, got {})".format(self.last_seq, seq))
+            items = [(self.get_metric_id(name), float(value)) for name, value in samples.items()
+                     if isinstance(value, (int, long, float)) and not isinstance(value, bool)]
+            if not items:
+                return
+            # 指标名先于引用它的记录落盘
+            self.journal_names()
+            segment = self.active_segment(seq, timestamp, len(items))
+            segment.append(seq, timestamp, items)
+            segment.flush()
+            self.last_seq = seq
+            # 删除过期分段 (本批记录写入之后, 本批的指标编号不会被回收)
+            if len(self.segments) > self.max_segments:
+                while len(self.segments) > self.max_segments:
+                    self.segments.pop(0).remove()
+                self.prune_names()
+
+    def query(self, since_seq=0, start_time=None, end_time=None, names=None):
+        """
+        查询记录
+        :return: [(序号, 时间戳, 指标名, 值)]
+        """
+        result = []
+        wanted = set(self.names[n] for n in names if n in self.names) if names is not None else None
+        with self.lock:
+            for segment in self.segments:
+                # 根据索引跳过无关分段
+                if segment.last_seq <= since_seq or \
+                        (start_time is not None and segment.last_ts < start_time) or \
+                        (end_time is not None and segment.first_ts > end_time):
+                    continue
+                for seq, ts, metric_id, value in segment.scan():
+                    if seq <= since_seq or (start_time is not None and ts < start_time) or \
+                            (end_time is not None and ts > end_time):
+                        continue
+                    if wanted is None or metric_id in wanted:
+                        result.append((seq, ts, self.metric_names[metric_id], value))
+        return result
+
+    def latest(self, prefix=""):
+        """
+        获取最近一次采样中以 prefix 开头的指标
+        :return: (时间戳, {指标名: 值}), 没有数据时时间戳为None
+        """
+        if not self.segments:
+            return None, {}
+        with self.lock:
+            segment = self.segments[-1]
+            records = [r for r in segment.scan() if r[0] == segment.last_seq]
+        return segment.last_ts, dict((self.metric_names[metric_id], value) for _, _, metric_id, value in records
+                                     if self.metric_names[metric_id].startswith(prefix))
+
+    def close(self):
+        with self.lock:
+            for segment in self.segments:
+                segment.close()
+
+
+def flatten_snapshot(snapshot, prefix=""):
+    """将快照展开为 {指标名: 数值}, 例如 sys.cpu_percents.cpu0"""
+    samples = {}
+    for key, value in snapshot.items():
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            samples.update(flatten_snapshot(value, name + "."))
+        elif isinstance(value, (int, long, float)) and not isinstance(value, bool):
+            samples[name] = value
+    return samples
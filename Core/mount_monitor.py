@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 挂载点监测
+
+主要包括
+- 挂载表缓存 (通过poll()监听/proc/mounts变化, 只有挂载表变化时才重新读取)
+- statvfs线程池 (并行执行, 单个挂载点设置超时, 失联的远程文件系统不会阻塞整个请求)
+
+参考资料
+reference   :   http://man7.org/linux/man-pages/man5/proc.5.html (/proc/[pid]/mounts 的poll说明)
+reference pydf - https://github.com/k4rtik/pydf/tree/c59c16df1d1086d03f8948338238bf380431deb9
+"""
+
+import os
+import Queue
+import select
+import threading
+from time import time
+
+from path_resolver import path_resolver, proc_ns_path
+
+STATVFS_TIMEOUT = 1  # 单个挂载点statvfs超时时间(秒)
+STATVFS_WORKERS = 4  # statvfs线程池初始线程数
+STATVFS_MAX_WORKERS = 16  # statvfs线程池最大线程数
+
+
+def is_remote_fs(fs):
+    """test if fs (as type) is a remote one"""
+
+    # reference pydf - https://github.com/k4rtik/pydf/tree/c59c16df1d1086d03f8948338238bf380431deb9
+
+    return fs.lower() in ["nfs", "smbfs", "cifs", "ncpfs", "afs", "coda",
+                          "ftpfs", "mfs", "sshfs", "fuse.sshfs", "nfs4"]
+
+
+def is_special_fs(fs):
+    """test if fs (as type) is a special one
+    in addition, a filesystem is special if it has number of blocks equal to 0"""
+
+    # reference pydf - https://github.com/k4rtik/pydf/tree/c59c16df1d1086d03f8948338238bf380431deb9
+
+    return fs.lower() in ["tmpfs", "devpts", "devtmpfs", "proc", "sysfs", "usbfs", "devfs", "fdescfs",
+                          "linprocfs"]
+
+
+class MountTable(object):
+    """挂载表缓存"""
+
+    def __init__(self, path=None):
+        """:param path: 挂载表路径, 为None时使用根目录下的 /proc/mounts"""
+        self.path = path
+        self.lock = threading.Lock()
+        self.mounts_file = None
+        self.poller = None
+        self.mount_points = None
+
+    def open(self):
+        """打开挂载表并注册poll (挂载表变化时内核会产生 POLLERR|POLLPRI 事件)"""
+        self.mounts_file = open(self.path or proc_ns_path("mounts"), "r")
+        try:
+            self.poller = select.poll()
+            self.poller.register(self.mounts_file.fileno(), select.POLLERR | select.POLLPRI)
+        except (AttributeError, select.error):  # 不支持poll时每次都重新读取
+            self.poller = None
+
+    def is_changed(self):
+        """挂载表是否发生变化"""
+        if self.poller is None:
+            return True
+        return bool(self.poller.poll(0))
+
+    def get_mount_points(self):
+        """获取所有挂载点 {挂载点: (设备, 文件系统, 挂载选项)} - /proc/mounts"""
+        with self.lock:
+            if self.mounts_file is None:
+                self.open()
+            elif self.mount_points is not None and not self.is_changed():
+                return self.mount_points
+
+            mount_points = {}
+            self.mounts_file.seek(0)
+            for line in self.mounts_file.read().splitlines():
+                spl = line.split()
+                if len(spl) < 4:
+                    continue
+                device, mp, typ, opts = spl[0:4]
+                opts = opts.split(',')
+                mount_points[mp] = (device, typ, opts)
+            self.mount_points = mount_points
+
+            return mount_points
+
+
+def statvfs_host(mount_point):
+    """statvfs() - 挂载点为根目录所属主机上的路径 (在容器中监测宿主机时通过 /proc/1/root 访问)"""
+    return os.statvfs(path_resolver.host_path(mount_point))
+
+
+class StatvfsPool(object):
+    """statvfs线程池"""
+
+    def __init__(self, workers=STATVFS_WORKERS, max_workers=STATVFS_MAX_WORKERS, statvfs_func=statvfs_host):
+        self.statvfs_func = statvfs_func
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.tasks = Queue.Queue()
+        self.results = {}  # 挂载点 -> (完成时间, statvfs结果)
+        self.in_flight = {}  # 挂载点 -> (提交时间, 完成事件)
+        self.workers = 0
+        self.idle_workers = 0
+        for _ in range(workers):
+            self.add_worker()
+
+    def add_worker(self):
+        """添加工作线程"""
+        self.workers += 1
+        worker = threading.Thread(target=self.run_worker_loop, name="Watch_Dogs-statvfs-" + str(self.workers))
+        worker.setDaemon(True)
+        worker.start()
+
+    def run_worker_loop(self):
+        """工作线程 - 主循环"""
+        while True:
+            with self.lock:
+                self.idle_workers += 1
+            mount_point = self.tasks.get()
+            with self.lock:
+                self.idle_workers -= 1
+            try:
+                result = self.statvfs_func(mount_point)
+            except (OSError, IOError):
+                result = None
+            with self.lock:
+                if result is not None:
+                    self.results[mount_point] = (time(), result)
+                else:
+                    self.results.pop(mount_point, None)
+                _, done = self.in_flight.pop(mount_point)
+            done.set()
+
+    def submit(self, mount_point):
+        """提交statvfs任务 (同一挂载点同时只有一个任务在执行), 返回任务完成事件"""
+        with self.lock:
+            if mount_point in self.in_flight:  # 上次的任务还未完成(可能已卡死), 不重复提交
+                return self.in_flight[mount_point][1]
+            done = threading.Event()
+            self.in_flight[mount_point] = (time(), done)
+            # 空闲线程不足时(可能都卡在失联的挂载点上)补充线程
+            if self.idle_workers <= self.tasks.qsize() and self.workers < self.max_workers:
+                self.add_worker()
+        self.tasks.put(mount_point)
+        return done
+
+    def statvfs(self, mount_points, timeout=STATVFS_TIMEOUT, wait_for=None):
+        """
+        并行获取挂载点statvfs
+        :param wait_for: 需要等待结果的挂载点, 其余挂载点只提交任务并返回上次的结果
+        :return: ({挂载点: statvfs结果}, [未完成的挂载点])
+        """
+        events = dict((mp, self.submit(mp)) for mp in mount_points)
+        deadline = time() + timeout
+        for mp in (mount_points if wait_for is None else wait_for):
+            events[mp].wait(max(deadline - time(), 0))
+
+        results, pending = {}, []
+        with self.lock:
+            for mp in mount_points:
+                if mp in self.in_flight:
+                    pending.append(mp)
+                if mp in self.results:
+                    results[mp] = self.results[mp][1]
+            # 清理已卸载的挂载点
+            for mp in set(self.results.keys()) - set(mount_points):
+                self.results.pop(mp)
+
+        return results, pending
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 进程网络速率滑动窗口计算
+
+主要包括
+- 每个进程保存一个小的环形样本队列 (时间戳, 累计发送字节数, 累计接收字节数), 样本来自nethogs的累计字节数
+- 样本间隔不小于 最大窗口/样本数, 同一间隔内只更新最新的样本, 队列始终可以覆盖最大窗口
+- 按多个窗口(默认10秒/1分钟/5分钟)计算平均速率, 速率随时间平滑变化, 不同进程之间可以直接比较
+- 计数变小(连接重置等)时清空队列重新开始
+- 明确的数据状态, 不再使用特殊数值表示无数据
+
+窗口数据结构
+    {"sent_kbps", "recv_kbps", "span", "state"}
+    state : no_data(没有样本) / warming(只有一个样本, 无法计算速率) / partial(样本不足一个窗口, 按已有区间计算) / ok
+    no_data 及 warming 时 sent_kbps, recv_kbps 为None; span 为实际参与计算的时间区间(秒)
+"""
+
+import threading
+from collections import deque
+
+NET_RATE_WINDOWS = (10, 60, 300)  # 默认计算窗口(秒)
+NET_RATE_SAMPLES = 128  # 每个进程保留的样本数
+
+
+def window_name(window):
+    """窗口名称, 例如 10s, 1m, 5m"""
+    if window >= 60 and window % 60 == 0:
+        return "{}m".format(window // 60)
+    return "{}s".format(window)
+
+
+class NetRateWindow(object):
+    """单个进程的网络样本环形队列"""
+
+    __slots__ = ("samples", "resolution")
+
+    def __init__(self, size, resolution):
+        self.samples = deque(maxlen=size)
+        self.resolution = resolution  # 样本最小间隔(秒)
+
+    def add(self, timestamp, sent_bytes, recv_bytes):
+        """添加一个样本 (时间戳不大于最新样本时忽略)"""
+        samples = self.samples
+        if samples:
+            last = samples[-1]
+            if timestamp <= last[0]:
+                return
+            if sent_bytes < last[1] or recv_bytes < last[2]:  # 计数被重置
+                samples.clear()
+            elif len(samples) >= 2 and last[0] - samples[-2][0] < self.resolution:
+                samples[-1] = (timestamp, sent_bytes, recv_bytes)  # 最新样本与前一个样本间隔过小, 直接替换
+                return
+        samples.append((timestamp, sent_bytes, recv_bytes))
+
+    def rate(self, window):
+        """计算窗口内的平均速率(KB/s)"""
+        samples = self.samples
+        if not samples:
+            return {"sent_kbps": None, "recv_kbps": None, "span": 0., "state": "no_data"}
+        if len(samples) == 1:
+            return {"sent_kbps": None, "recv_kbps": None, "span": 0., "state": "warming"}
+        last = samples[-1]
+        start = last[0] - window
+        base, state = samples[0], "partial"
+        for sample in reversed(samples):  # 从新到旧找到第一个不晚于窗口起点的样本
+            if sample[0] <= start:
+                base, state = sample, "ok"
+                break
+        span = last[0] - base[0]
+        return {
+            "sent_kbps": round((last[1] - base[1]) / 1024. / span, 2),
+            "recv_kbps": round((last[2] - base[2]) / 1024. / span, 2),
+            "span": round(span, 2),
+            "state": state,
+        }
+
+
+class NetRateEstimator(object):
+    """进程网络速率滑动窗口计算类"""
+
+    def __init__(self, windows=NET_RATE_WINDOWS, size=NET_RATE_SAMPLES):
+        self.windows = tuple(sorted(int(w) for w in windows))
+        self.size = size
+        self.resolution = self.windows[-1] / float(max(size - 2, 1))
+        self.lock = threading.Lock()
+        self.processes = {}  # 进程号 -> NetRateWindow
+
+    def add_sample(self, pid, timestamp, sent_bytes, recv_bytes):
+        """添加进程的累计字节数样本"""
+        with self.lock:
+            window = self.processes.get(pid)
+            if window is None:
+                window = self.processes[pid] = NetRateWindow(self.size, self.resolution)
+            window.add(timestamp, sent_bytes, recv_bytes)
+
+    def remove(self, pid):
+        """移除进程的样本"""
+        with self.lock:
+            self.processes.pop(pid, None)
+
+    def rate(self, pid, window):
+        """计算进程在指定窗口内的速率"""
+        with self.lock:
+            samples = self.processes.get(pid) or NetRateWindow(1, 0)
+            return samples.rate(window)
+
+    def rates(self, pid):
+        """计算进程在所有窗口内的速率 {窗口名称: 窗口数据}"""
+        with self.lock:
+            samples = self.processes.get(pid) or NetRateWindow(1, 0)
+            return dict((window_name(w), samples.rate(w)) for w in self.windows)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - /proc 及 /sys 路径解析
+
+主要包括
+- 采集代码不再直接拼接 "/proc/..." 及 "/sys/...", 统一通过本模块得到路径
+- 根目录可以修改, 采集项即可读取其他位置的 /proc 及 /sys
+  (例如在容器中监测宿主机时挂载的 /host/proc, /host/sys, 或合成的测试数据目录)
+- 修改根目录时关闭 /proc 热点文件描述符缓存中已打开的描述符
+- 命名空间相关的文件 : /proc/net/*, /proc/mounts 指向读取者自身所在的命名空间, 修改根目录后改为读取
+  其中1号进程的视图(即宿主机的网络及挂载命名空间); 宿主机上的路径通过 /proc/1/root 访问
+- PID命名空间 : 报告的进程号均为根目录中的进程号, 发送信号等操作前转换为本进程所在PID命名空间中的进程号
+
+参考资料
+reference   :   http://man7.org/linux/man-pages/man5/proc.5.html
+reference   :   http://man7.org/linux/man-pages/man7/pid_namespaces.7.html
+"""
+
+import os
+
+from proc_file import proc_file_cache
+from proc_parse import parse_status
+
+PROC_ROOT = "/proc"  # 默认 /proc 根目录
+SYS_ROOT = "/sys"  # 默认 /sys 根目录
+
+
+class PathResolver(object):
+    """/proc 及 /sys 路径解析类"""
+
+    def __init__(self, proc_root=PROC_ROOT, sys_root=SYS_ROOT):
+        self.proc_root = proc_root
+        self.sys_root = sys_root
+        self.ns_depth = None  # 本进程在根目录所属PID命名空间中的嵌套深度 (1表示同一命名空间)
+
+    def set_root(self, proc_root=None, sys_root=None):
+        """修改根目录 (为None的保持不变)"""
+        if proc_root is not None:
+            self.proc_root = os.path.normpath(proc_root)
+        if sys_root is not None:
+            self.sys_root = os.path.normpath(sys_root)
+        self.ns_depth = None
+        proc_file_cache.close_all()  # 已缓存的描述符属于原来的根目录
+
+    def is_default_root(self):
+        """是否为本机默认的 /proc"""
+        return self.proc_root == PROC_ROOT
+
+    def proc(self, *parts):
+        """/proc 下的路径, 例如 proc(1, "stat") -> /proc/1/stat"""
+        if not parts:
+            return self.proc_root
+        return self.proc_root + "/" + "/".join(str(part) for part in parts)
+
+    def sys(self, *parts):
+        """/sys 下的路径, 例如 sys("block", "sda", "queue") -> /sys/block/sda/queue"""
+        if not parts:
+            return self.sys_root
+        return self.sys_root + "/" + "/".join(str(part) for part in parts)
+
+    def proc_ns(self, *parts):
+        """
+        命名空间相关的 /proc 文件 (net/dev, net/tcp, mounts...)
+        默认根目录时为本进程所在的命名空间, 否则为根目录中1号进程所在的命名空间
+        """
+        if self.is_default_root():
+            return self.proc(*parts)
+        return self.proc(1, *parts)
+
+    def host_path(self, path):
+        """
+        根目录所属主机上的绝对路径 (如挂载点) 在本进程中的访问路径
+        /proc 及 /sys 下的路径直接使用配置的根目录, 其余路径通过 /proc/1/root 访问 (需要ptrace权限)
+        """
+        if self.is_default_root():
+            return path
+        for prefix, root in ((PROC_ROOT, self.proc_root), (SYS_ROOT, self.sys_root)):
+            if path == prefix or path.startswith(prefix + "/"):
+                return root + path[len(prefix):]
+        return self.proc(1, "root") + path
+
+    def get_ns_depth(self):
+        """本进程在根目录所属PID命名空间中的嵌套深度 - /proc/self/status 的 NSpid (内核4.1+, 不支持时视为1)"""
+        if self.ns_depth is None:
+            self.ns_depth = 1
+            if not self.is_default_root():
+                try:
+                    with open(self.proc("self", "status"), "r") as status:
+                        ns_pids = parse_status(status.read()).get("NSpid")
+                    if ns_pids:
+                        self.ns_depth = len(ns_pids.split())
+                except (IOError, OSError):
+                    pass
+        return self.ns_depth
+
+    def self_pid(self):
+        """本进程在根目录中的进程号"""
+        if self.get_ns_depth() == 1:
+            return os.getpid()
+        return int(os.readlink(self.proc("self")))
+
+    def local_pid(self, pid):
+        """
+        根目录中的进程号 -> 本进程所在PID命名空间中的进程号 (用于发送信号)
+        与根目录处于同一PID命名空间时不需要转换; 进程在本命名空间中不可见时返回None
+        """
+        if self.get_ns_depth() == 1:
+            return int(pid)
+        try:
+            if os.readlink(self.proc(pid, "ns", "pid")) != os.readlink("/proc/self/ns/pid"):
+                return None
+            with open(self.proc(pid, "status"), "r") as status:
+                ns_pids = parse_status(status.read()).get("NSpid")
+        except (IOError, OSError):
+            return None
+        return int(ns_pids.split()[-1]) if ns_pids else None
+
+
+# 所有采集项共用的路径解析
+path_resolver = PathResolver()
+proc_path = path_resolver.proc
+sys_path = path_resolver.sys
+proc_ns_path = path_resolver.proc_ns
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - /proc 热点文件描述符缓存
+
+每个采样周期都要读取的 /proc 文件(/proc/stat, /proc/meminfo, /proc/net/dev, /proc/diskstats,
+以及每个被监测进程的 /proc/[pid]/stat, /proc/[pid]/io 等)保持打开, 每次回到偏移0重新读取,
+省去每次读取时的 open/close 系统调用 (监测上千个进程时每个周期可以减少数千次系统调用)
+
+主要包括
+- 文件描述符按最近使用顺序缓存, 超过上限时关闭最久未使用的描述符
+- 读取时复用同一个缓冲区 (python2 没有 os.pread, 使用 seek(0) + readinto 代替, 同样是一次定位一次读取)
+- 进程退出后其 /proc/[pid]/ 下已打开的描述符读取时返回ESRCH (即使进程号已被复用), 此时关闭描述符并抛出异常
+- 进程不再被监测或退出时, 可以按进程号关闭其所有描述符
+
+参考资料
+reference   :   https://www.kernel.org/doc/Documentation/filesystems/seq_file.txt
+"""
+
+import io
+import threading
+from collections import OrderedDict
+
+PROC_FD_CACHE_SIZE = 512  # 缓存的文件描述符上限
+PROC_READ_BUFFER_SIZE = 16384  # 读取缓冲区初始大小(字节), 不够时自动加倍
+
+
+class ProcFileCache(object):
+    """/proc 文件描述符缓存类"""
+
+    def __init__(self, max_fds=PROC_FD_CACHE_SIZE, buffer_size=PROC_READ_BUFFER_SIZE):
+        self.max_fds = max_fds
+        self.lock = threading.Lock()
+        self.files = OrderedDict()  # 路径 -> (文件对象, 进程号) 按最近使用排序
+        self.pid_paths = {}  # 进程号 -> 路径集合
+        self.buffer = bytearray(buffer_size)
+        self.opens = 0  # 打开文件次数
+        self.hits = 0  # 复用描述符次数
+
+    def read(self, path, pid=None):
+        """
+        读取文件的全部内容, 文件不存在/无权限时与open()抛出相同的IOError
+        :param pid: 文件属于的进程号 (用于按进程关闭描述符), 系统文件为None
+        """
+        with self.lock:
+            entry = self.files.pop(path, None)
+            if entry is None:
+                entry = (io.FileIO(path, "r"), pid)
+                self.opens += 1
+                if pid is not None:
+                    self.pid_paths.setdefault(pid, set()).add(path)
+                while len(self.files) >= self.max_fds:
+                    self._close(*self.files.popitem(last=False))
+            else:
+                self.hits += 1
+            try:
+                data = self._read_all(entry[0])
+            except (IOError, OSError):  # 进程已退出(ESRCH)等, 下次重新打开
+                self._close(path, entry)
+                raise
+            self.files[path] = entry
+            return data
+
+    def _read_all(self, f):
+        """从偏移0读取文件全部内容到复用的缓冲区"""
+        f.seek(0)
+        view = memoryview(self.buffer)
+        try:
+            total = 0
+            while True:
+                n = f.readinto(view[total:])
+                if not n:
+                    break
+                total += n
+                if total == len(self.buffer):  # 缓冲区已满, 扩大后继续读取
+                    del view  # 存在memoryview时bytearray不能改变大小
+                    self.buffer.extend(bytearray(len(self.buffer)))
+                    view = memoryview(self.buffer)
+            return view[:total].tobytes()
+        finally:
+            # 异常的traceback会引用本函数的局部变量, 必须主动释放, 否则之后缓冲区无法扩大
+            del view
+
+    def _close(self, path, entry):
+        f, pid = entry
+        f.close()
+        if pid is not None:
+            paths = self.pid_paths.get(pid)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    self.pid_paths.pop(pid)
+
+    def close_pid(self, pid):
+        """关闭进程的所有描述符 (进程不再被监测或已退出时调用)"""
+        with self.lock:
+            for path in list(self.pid_paths.get(pid, ())):
+                entry = self.files.pop(path, None)
+                if entry is not None:
+                    self._close(path, entry)
+            self.pid_paths.pop(pid, None)
+
+    def close_all(self):
+        """关闭所有描述符"""
+        with self.lock:
+            while self.files:
+                self._close(*self.files.popitem(last=False))
+
+    def get_stat(self):
+        """缓存状态"""
+        with self.lock:
+            return {"open_fds": len(self.files), "max_fds": self.max_fds, "opens": self.opens, "hits": self.hits,
+                    "pids": len(self.pid_paths), "buffer_size": len(self.buffer)}
+
+
+# 系统监测及进程监测共用的缓存 (共享描述符上限)
+proc_file_cache = ProcFileCache()
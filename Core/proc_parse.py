@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - /proc/[pid] 文件快速解析
+
+主要包括
+- /proc/[pid]/stat : 以第一个 '(' 和最后一个 ')' 定位进程名(进程名中可能含有空格及括号), 其余部分只分割一次,
+  一次解析得到所有使用者需要的字段 (进程信息, CPU时间片, 内存, 线程数...)
+- /proc/[pid]/io : 全部7个字段
+- /proc/[pid]/status : 所有字段, 以kB为单位的字段转换为整数
+- 输入为读取到的原始字节串 (python2 的 str), 不逐行读取文件, 不使用正则表达式
+
+参考资料
+reference   :   http://man7.org/linux/man-pages/man5/proc.5.html
+"""
+
+# /proc/[pid]/stat 中 ')' 之后的字段 : (字段名, 下标) - 下标从state开始计数
+STAT_FIELDS = (
+    ("ppid", 1), ("pgrp", 2), ("session", 3), ("tty_nr", 4), ("tpgid", 5), ("flags", 6),
+    ("minflt", 7), ("cminflt", 8), ("majflt", 9), ("cmajflt", 10),
+    ("utime", 11), ("stime", 12), ("cutime", 13), ("cstime", 14), ("priority", 15), ("nice", 16),
+    ("num_threads", 17), ("starttime", 19), ("vsize", 20), ("rss", 21),
+)
+
+
+def parse_stat(data):
+    """
+    解析 /proc/[pid]/stat (也适用于 /proc/[pid]/task/[tid]/stat)
+    :return: {"pid", "comm", "state"} 及 STAT_FIELDS 中的所有字段 (utime, stime, num_threads, rss...)
+    """
+    left = data.find("(")
+    right = data.rfind(")")
+    fields = data[right + 2:].split()
+    stat = {"pid": int(data[:left]), "comm": data[left + 1:right], "state": fields[0]}
+    for name, index in STAT_FIELDS:
+        stat[name] = int(fields[index])
+    return stat
+
+
+def parse_io(data):
+    """
+    解析 /proc/[pid]/io
+    :return: {"rchar", "wchar", "syscr", "syscw", "read_bytes", "write_bytes", "cancelled_write_bytes"}
+    """
+    # 格式为 "rchar: 123\nwchar: 456\n...", 整体分割后键值交替出现
+    tokens = data.split()
+    return dict((key[:-1], int(value)) for key, value in zip(tokens[0::2], tokens[1::2]))
+
+
+def parse_status(data):
+    """
+    解析 /proc/[pid]/status
+    :return: {字段名: 值} - 以kB为单位的字段(VmRSS, VmSwap...)为整数(kB), 其余为去掉首尾空白的字符串
+    """
+    status = {}
+    for line in data.splitlines():
+        key, sep, value = line.partition(":")
+        if not sep:
+            continue
+        value = value.strip()
+        if value.endswith(" kB"):
+            status[key] = int(value[:-3])
+        else:
+            status[key] = value
+    return status
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 进程事件监听
+
+主要包括
+- 增量维护进程表 (pid -> 父进程号, 进程名), 不再需要反复全量扫描/proc
+- 基于netlink proc connector 的进程事件监听 (fork/exec/exit, 需要CAP_NET_ADMIN权限)
+- 没有权限或内核不支持时退化为定时轮询/proc (只比较进程号集合)
+- 进程事件分发给订阅者 (回调函数), 并保留最近的事件供查询
+- 订阅者抛出的异常不影响监听线程, 但记录出错次数及最近一次的traceback供查询
+
+事件结构
+    {"seq": 事件序号, "event": "fork"/"exec"/"exit", "pid", "ppid", "comm", "timestamp", "exit_code", "source"}
+    exit_code 为内核给出的wait状态(同waitpid), 只有netlink模式下可以得到, 轮询模式下为None
+
+参考资料
+reference   :   https://github.com/torvalds/linux/blob/master/include/uapi/linux/cn_proc.h
+reference   :   https://github.com/torvalds/linux/blob/master/include/uapi/linux/connector.h
+reference   :   http://netsplit.com/the-proc-connector-and-socket-filters
+"""
+
+import os
+import errno
+import socket
+import struct
+import threading
+import traceback
+from time import time
+from collections import deque
+
+from path_resolver import proc_path
+
+PROC_POLL_INTERVAL = 1  # 轮询模式下扫描/proc的间隔(秒)
+EVENT_HISTORY_SIZE = 1024  # 保留的最近事件数
+
+# netlink / connector 常量
+NETLINK_CONNECTOR = 11
+NLMSG_DONE = 3
+CN_IDX_PROC = 1
+CN_VAL_PROC = 1
+PROC_CN_MCAST_LISTEN = 1
+PROC_CN_MCAST_IGNORE = 2
+
+PROC_EVENT_FORK = 0x00000001
+PROC_EVENT_EXEC = 0x00000002
+PROC_EVENT_EXIT = 0x80000000
+
+NLMSG_HEADER = struct.Struct("=IHHII")  # 长度, 类型, 标志, 序号, 端口号
+CN_MSG_HEADER = struct.Struct("=IIIIHH")  # idx, val, 序号, ack, 数据长度, 标志
+PROC_EVENT_HEADER = struct.Struct("=IIQ")  # 事件类型, cpu, 时间戳(ns)
+FORK_EVENT = struct.Struct("=iiii")  # parent_pid, parent_tgid, child_pid, child_tgid
+EXEC_EVENT = struct.Struct("=ii")  # process_pid, process_tgid
+EXIT_EVENT = struct.Struct("=iiII")  # process_pid, process_tgid, exit_code, exit_signal
+
+
+def read_process_stat(pid):
+    """读取进程的父进程号及进程名 - /proc/[pid]/stat, 进程已退出时返回None"""
+    try:
+        with open(proc_path(pid, "stat"), "r") as p_stat:
+            p_data = p_stat.readline()
+    except (IOError, OSError):
+        return None
+    # 进程名中可能含有空格及括号, 以最后一个')'分隔
+    right = p_data.rfind(")")
+    return {"ppid": int(p_data[right + 2:].split(" ", 2)[1]), "comm": p_data[p_data.find("(") + 1:right]}
+
+
+def list_pids():
+    """获取所有进程号"""
+    return set(int(pid) for pid in os.listdir(proc_path()) if pid.isdigit())
+
+
+def build_listen_message(op=PROC_CN_MCAST_LISTEN):
+    """构造订阅(取消订阅)进程事件的netlink消息"""
+    payload = struct.pack("=I", op)
+    cn_msg = CN_MSG_HEADER.pack(CN_IDX_PROC, CN_VAL_PROC, 0, 0, len(payload), 0) + payload
+    return NLMSG_HEADER.pack(NLMSG_HEADER.size + len(cn_msg), NLMSG_DONE, 0, 0, os.getpid()) + cn_msg
+
+
+def parse_proc_events(data):
+    """
+    解析netlink proc connector消息 (只保留进程级事件, 忽略线程的创建与退出)
+    :return: [(事件类型, pid, ppid, exit_code)]
+    """
+    events = []
+    offset = 0
+    while offset + NLMSG_HEADER.size <= len(data):
+        msg_len, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+        if msg_len < NLMSG_HEADER.size:
+            break
+        body = offset + NLMSG_HEADER.size
+        offset += (msg_len + 3) & ~3  # netlink消息4字节对齐
+        if body + CN_MSG_HEADER.size + PROC_EVENT_HEADER.size > len(data):
+            break
+        idx, val, _, _, _, _ = CN_MSG_HEADER.unpack_from(data, body)
+        if idx != CN_IDX_PROC or val != CN_VAL_PROC:
+            continue
+        event_offset = body + CN_MSG_HEADER.size
+        what, _, _ = PROC_EVENT_HEADER.unpack_from(data, event_offset)
+        event_offset += PROC_EVENT_HEADER.size
+        if what == PROC_EVENT_FORK:
+            parent_pid, parent_tgid, child_pid, child_tgid = FORK_EVENT.unpack_from(data, event_offset)
+            if child_pid == child_tgid:
+                events.append(("fork", child_tgid, parent_tgid, None))
+        elif what == PROC_EVENT_EXEC:
+            process_pid, process_tgid = EXEC_EVENT.unpack_from(data, event_offset)
+            events.append(("exec", process_tgid, None, None))
+        elif what == PROC_EVENT_EXIT:
+            process_pid, process_tgid, exit_code, exit_signal = EXIT_EVENT.unpack_from(data, event_offset)
+            if process_pid == process_tgid:
+                events.append(("exit", process_tgid, None, exit_code))
+    return events
+
+
+class NetlinkProcSource(object):
+    """netlink proc connector 事件源"""
+
+    name = "netlink"
+
+    def __init__(self):
+        self.sock = None
+
+    def open(self):
+        """建立连接并订阅进程事件, 权限不足时抛出socket.error"""
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_CONNECTOR)
+        try:
+            sock.bind((os.getpid(), CN_IDX_PROC))
+            sock.send(build_listen_message(PROC_CN_MCAST_LISTEN))
+        except socket.error:
+            sock.close()
+            raise
+        self.sock = sock
+        return self
+
+    def read(self, timeout):
+        """
+        读取一批事件
+        :return: (事件列表, 是否需要全量同步) - 内核缓冲区溢出(ENOBUFS)时丢失了事件, 需要重新扫描
+        """
+        self.sock.settimeout(timeout)
+        try:
+            return parse_proc_events(self.sock.recv(65536)), False
+        except socket.timeout:
+            return [], False
+        except socket.error as err:
+            if err.errno == errno.ENOBUFS:
+                return [], True
+            raise
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.send(build_listen_message(PROC_CN_MCAST_IGNORE))
+            except socket.error:
+                pass
+            self.sock.close()
+            self.sock = None
+
+
+class ProcessEventMonitor(object):
+    """进程事件监听类"""
+
+    def __init__(self, poll_interval=PROC_POLL_INTERVAL, use_netlink=True, history_size=EVENT_HISTORY_SIZE):
+        self.poll_interval = poll_interval
+        self.use_netlink = use_netlink
+        self.lock = threading.Lock()
+        self.table = {}  # 进程表 pid -> {"ppid", "comm"}
+        self.subscribers = []
+        self.history = deque(maxlen=history_size)
+        self.seq = 0
+        self.subscriber_errors = 0  # 订阅者抛出异常的次数
+        self.last_subscriber_error = None  # 最近一次异常的traceback
+        self.source = None
+        self.mode = None  # "netlink" / "poll"
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """订阅进程事件, callback(event)在监听线程中调用"""
+        with self.lock:
+            if callback not in self.subscribers:
+                self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """取消订阅"""
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def get_pids(self):
+        """获取当前进程表中的所有进程号"""
+        with self.lock:
+            return set(self.table.keys())
+
+    def get_process(self, pid):
+        """获取进程表中的进程信息, 不存在时返回None"""
+        with self.lock:
+            info = self.table.get(int(pid))
+            return dict(info) if info is not None else None
+
+    def get_events(self, since=0):
+        """获取序号大于since的最近事件"""
+        with self.lock:
+            return [e for e in self.history if e["seq"] > since]
+
+    def get_subscriber_errors(self):
+        """订阅者出错情况 {"count": 出错次数, "last": 最近一次异常的traceback}"""
+        with self.lock:
+            return {"count": self.subscriber_errors, "last": self.last_subscriber_error}
+
+    def emit(self, event_type, pid, ppid=None, comm=None, exit_code=None):
+        """记录并分发一个事件"""
+        with self.lock:
+            self.seq += 1
+            event = {"seq": self.seq, "event": event_type, "pid": pid, "ppid": ppid, "comm": comm,
+                     "timestamp": time(), "exit_code": exit_code, "source": self.mode}
+            self.history.append(event)
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:  # 订阅者的异常不能影响监听线程, 只记录
+                with self.lock:
+                    self.subscriber_errors += 1
+                    self.last_subscriber_error = traceback.format_exc()
+        return event
+
+    def on_fork(self, pid, ppid=None):
+        """新进程 (轮询模式下新出现的进程也视为fork)"""
+        info = read_process_stat(pid) or {"ppid": ppid, "comm": None}
+        if ppid is not None:
+            info["ppid"] = ppid
+        with self.lock:
+            self.table[pid] = info
+        self.emit("fork", pid, info["ppid"], info["comm"])
+
+    def on_exec(self, pid):
+        """进程执行了新程序 (进程名可能改变)"""
+        info = read_process_stat(pid)
+        with self.lock:
+            if info is None:
+                info = self.table.get(pid, {"ppid": None, "comm": None})
+            self.table[pid] = info
+        self.emit("exec", pid, info["ppid"], info["comm"])
+
+    def on_exit(self, pid, exit_code=None):
+        """进程退出"""
+        with self.lock:
+            info = self.table.pop(pid, None) or {"ppid": None, "comm": None}
+        self.emit("exit", pid, info["ppid"], info["comm"], exit_code)
+
+    def sync(self, emit_events=True):
+        """全量扫描/proc, 与进程表比较并产生差异事件"""
+        current = list_pids()
+        known = self.get_pids()
+        if not emit_events:
+            table = {}
+            for pid in current:
+                info = read_process_stat(pid)
+                if info is not None:
+                    table[pid] = info
+            with self.lock:
+                self.table = table
+            return
+        for pid in sorted(current - known):
+            if os.path.exists(proc_path(pid)):
+                self.on_fork(pid)
+        for pid in sorted(known - current):
+            self.on_exit(pid)
+
+    def open_source(self):
+        """选择事件源: 优先netlink, 失败时退化为轮询"""
+        if self.use_netlink:
+            try:
+                self.source = NetlinkProcSource().open()
+                self.mode = "netlink"
+                return
+            except (socket.error, AttributeError):  # 无权限 / 不支持AF_NETLINK
+                self.source = None
+        self.mode = "poll"
+
+    def run_event_loop(self):
+        """监听线程 - 主循环"""
+        while not self._stop_event.is_set():
+            if self.source is None:
+                self._stop_event.wait(self.poll_interval)
+                self.sync()
+                continue
+            try:
+                events, overflow = self.source.read(self.poll_interval)
+            except socket.error:  # 连接异常, 退化为轮询
+                self.source.close()
+                self.source, self.mode = None, "poll"
+                continue
+            if overflow:
+                self.sync()
+            for event_type, pid, ppid, exit_code in events:
+                if event_type == "fork":
+                    self.on_fork(pid, ppid)
+                elif event_type == "exec":
+                    self.on_exec(pid)
+                elif event_type == "exit":
+                    self.on_exit(pid, exit_code)
+
+    def start(self):
+        """启动监听线程 (先订阅事件再建立进程表, 避免遗漏两者之间产生的进程)"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self.open_source()
+        self.sync(emit_events=False)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run_event_loop, name="Watch_Dogs-ProcEvents")
+        self._thread.setDaemon(True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """停止监听线程"""
+        self._stop_event.set()
+        if self.source is not None:
+            self.source.close()
+            self.source = None
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 进程组汇总监测
+
+将一个进程及其所有子孙进程(例如 gunicorn master 及其 worker)作为一个服务整体监测
+- 每个采样周期汇总组内所有进程的CPU占用率, 内存(RSS), 磁盘IO速度及线程数
+- 有进程事件监听时, 组成员随fork/exit事件增量更新; 否则每次采样前根据进程树重新计算
+- CPU时间包含已回收子进程的时间(cutime+cstime), 子进程退出后其CPU时间转移到父进程, 汇总值保持连续
+
+汇总结果结构
+    {"root_pid": {"comm", "root_alive", "members", "cpu_percent", "rss_M", "io_read_MBs", "io_write_MBs", "threads"}}
+"""
+
+import os
+import threading
+from time import time
+
+from process_events import read_process_stat, list_pids
+from proc_parse import parse_stat, parse_io
+from path_resolver import proc_path
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def read_group_member_stat(pid):
+    """
+    读取进程的CPU时间片(utime+stime+cutime+cstime), 线程数, RSS页数 - /proc/[pid]/stat
+    进程已退出时返回None
+    """
+    try:
+        with open(proc_path(pid, "stat"), "r") as p_stat:
+            stat = parse_stat(p_stat.read())
+    except (IOError, OSError):
+        return None
+    return stat["utime"] + stat["stime"] + stat["cutime"] + stat["cstime"], stat["num_threads"], stat["rss"]
+
+
+def read_group_member_io(pid):
+    """读取进程的读写字节数 [rchar, wchar] - /proc/[pid]/io, 无权限或进程已退出时返回None"""
+    try:
+        with open(proc_path(pid, "io"), "r") as p_io:
+            io = parse_io(p_io.read())
+    except (IOError, OSError):
+        return None
+    return io["rchar"], io["wchar"]
+
+
+def get_descendants(root_pid, children):
+    """
+    获取进程的所有子孙进程
+    :param children: 进程树 {ppid: [pid]}
+    """
+    result = set()
+    stack = [root_pid]
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            if child not in result:
+                result.add(child)
+                stack.append(child)
+    return result
+
+
+def build_children(table):
+    """由进程表 {pid: {"ppid"}} 构建进程树 {ppid: [pid]}"""
+    children = {}
+    for pid, info in table.items():
+        children.setdefault(info["ppid"], []).append(pid)
+    return children
+
+
+class ProcessGroupMonitor(object):
+    """进程组汇总监测类"""
+
+    def __init__(self, sys_monitor, event_monitor=None):
+        self.sys_monitor = sys_monitor
+        self.event_monitor = event_monitor  # 进程事件监听 (为None时每次采样前扫描进程树)
+        self.lock = threading.Lock()
+        self.groups = {}  # 根进程号 -> 组数据
+
+    def scan_table(self):
+        """扫描/proc得到进程表 {pid: {"ppid", "comm"}}"""
+        table = {}
+        for pid in list_pids():
+            info = read_process_stat(pid)
+            if info is not None:
+                table[pid] = info
+        return table
+
+    def get_table(self):
+        """获取进程表 (优先使用进程事件监听维护的进程表)"""
+        if self.event_monitor is not None:
+            with self.event_monitor.lock:
+                return dict(self.event_monitor.table)
+        return self.scan_table()
+
+    def add_group(self, root_pid):
+        """添加进程组监测, 进程不存在时返回False"""
+        root_pid = int(root_pid)
+        table = self.get_table()
+        if root_pid not in table:
+            return False
+        with self.lock:
+            if root_pid not in self.groups:
+                self.groups[root_pid] = {
+                    "comm": table[root_pid]["comm"],
+                    "members": set([root_pid]) | get_descendants(root_pid, build_children(table)),
+                    "prev_total_cpu_time": None,  # 上次记录的系统CPU时间片
+                    "prev_cpu_time": None,  # 上次记录的组内CPU时间片之和
+                    "prev_io": None,  # 上次记录的组内读写字节数之和
+                    "prev_io_time": None,  # 上次读取IO数据的时间
+                }
+        return True
+
+    def remove_group(self, root_pid):
+        """移除进程组监测"""
+        with self.lock:
+            return self.groups.pop(int(root_pid), None) is not None
+
+    def get_all_groups(self):
+        """获取所有进程组 {根进程号: [成员进程号]}"""
+        with self.lock:
+            return dict((root_pid, sorted(group["members"])) for root_pid, group in self.groups.items())
+
+    def on_process_event(self, event):
+        """进程事件回调 - 增量更新组成员"""
+        pid = event["pid"]
+        with self.lock:
+            for group in self.groups.values():
+                if event["event"] == "fork" and event["ppid"] in group["members"]:
+                    group["members"].add(pid)
+                elif event["event"] == "exit":
+                    group["members"].discard(pid)
+
+    def refresh_members(self):
+        """根据进程树重新计算组成员 (没有进程事件监听时使用, 已退出的根进程的子孙进程仍保留在组内)"""
+        table = self.scan_table()
+        children = build_children(table)
+        with self.lock:
+            for root_pid, group in self.groups.items():
+                members = set(pid for pid in group["members"] if pid in table)
+                for pid in list(members) + [root_pid]:
+                    members |= get_descendants(pid, children)
+                if root_pid in table:
+                    members.add(root_pid)
+                group["members"] = members
+
+    def collect(self):
+        """计算所有进程组的汇总数据"""
+        if self.event_monitor is None:
+            self.refresh_members()
+        with self.lock:
+            groups = [(root_pid, group, list(group["members"])) for root_pid, group in self.groups.items()]
+
+        result = {}
+        total_cpu_time = self.sys_monitor.get_total_cpu_time()[0]
+        for root_pid, group, members in groups:
+            cpu_time, threads, rss_pages, read_bytes, write_bytes = 0, 0, 0, 0, 0
+            alive = 0
+            for pid in members:
+                stat = read_group_member_stat(pid)
+                if stat is None:
+                    continue
+                alive += 1
+                cpu_time += stat[0]
+                threads += stat[1]
+                rss_pages += stat[2]
+                io = read_group_member_io(pid)
+                if io is not None:
+                    read_bytes += io[0]
+                    write_bytes += io[1]
+            now = time()
+
+            # 成员进程退出时其IO数据会丢失, 增量为负时按0计算
+            cpu_percent, read_MBs, write_MBs = 0., 0., 0.
+            if group["prev_cpu_time"] is not None and total_cpu_time > group["prev_total_cpu_time"]:
+                cpu_percent = round(max(cpu_time - group["prev_cpu_time"], 0) * 100.0 /
+                                    (total_cpu_time - group["prev_total_cpu_time"]), 4)
+            if group["prev_io"] is not None and now > group["prev_io_time"]:
+                read_MBs = round(max(read_bytes - group["prev_io"][0], 0) / 1000. ** 2 /
+                                 (now - group["prev_io_time"]), 2)
+                write_MBs = round(max(write_bytes - group["prev_io"][1], 0) / 1000. ** 2 /
+                                  (now - group["prev_io_time"]), 2)
+            group["prev_total_cpu_time"], group["prev_cpu_time"] = total_cpu_time, cpu_time
+            group["prev_io"], group["prev_io_time"] = (read_bytes, write_bytes), now
+
+            result[str(root_pid)] = {
+                "comm": group["comm"],
+                "root_alive": root_pid in members and os.path.exists(proc_path(root_pid)),
+                "members": alive,
+                "cpu_percent": cpu_percent,
+                "rss_M": round(rss_pages * PAGE_SIZE / 1024. ** 2, 2),
+                "io_read_MBs": read_MBs,
+                "io_write_MBs": write_MBs,
+                "threads": threads,
+            }
+        return result
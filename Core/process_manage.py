@@ -30,6 +30,8 @@ import subprocess
 from time import localtime, strftime
 
 from prcess_exception import wrap_process_exceptions, NoSuchProcess, ZombieProcess, AccessDenied
+from proc_parse import parse_stat
+from path_resolver import path_resolver, proc_path
 
 
 class ProcManager(object):
@@ -59,27 +61,26 @@ class ProcManager(object):
             except ValueError:
                 return False
 
-        return filter(isDigit, os.listdir("/proc"))
+        return filter(isDigit, os.listdir(proc_path()))
 
     @wrap_process_exceptions
     def get_process_info(self, pid):
         """获取进程信息 - /proc/[pid]/stat"""
-        with open("/proc/{}/stat".format(pid), "r") as p_stat:
-            p_data = p_stat.readline()
+        with open(proc_path(pid, "stat"), "r") as p_stat:
+            stat = parse_stat(p_stat.read())
 
-        p_data = p_data.split(" ")
-
-        with open("/proc/{}/cmdline".format(pid), "r") as p_cmdline:
+        with open(proc_path(pid, "cmdline"), "r") as p_cmdline:
             p_cmdline = p_cmdline.readline().replace('\0', ' ').strip()
 
         return {
-            "pid": int(p_data[0]),
-            "comm": p_data[1].strip(")").strip("("),
-            "state": p_data[2],
-            "ppid": int(p_data[3]),
-            "pgrp": int(p_data[4]),
-            "thread num": len(os.listdir("/proc/{}/task".format(pid))),
-            "cmdline": p_cmdline
+            "pid": stat["pid"],
+            "comm": stat["comm"],
+            "state": stat["state"],
+            "ppid": stat["ppid"],
+            "pgrp": stat["pgrp"],
+            "thread num": stat["num_threads"],
+            "cmdline": p_cmdline,
+            "local_pid": path_resolver.local_pid(pid)  # 本进程所在PID命名空间中的进程号, 不可见时为None
         }
 
     def get_all_pid_name(self, name_type="cmdline"):
@@ -110,9 +111,12 @@ class ProcManager(object):
     def kill_process(self, pid):
         """关闭进程"""
         try:
-            if self.get_process_info(pid)['state'] == 'Z':  # zombie process
+            process_info = self.get_process_info(pid)
+            if process_info['state'] == 'Z':  # zombie process
                 raise ZombieProcess(pid)
-            os.kill(int(pid), signal.SIGKILL)
+            if process_info['local_pid'] is None:  # 进程不在本进程所在的PID命名空间中, 无法发送信号
+                raise AccessDenied(pid)
+            os.kill(process_info['local_pid'], signal.SIGKILL)
         except OSError as e:
             if e.args[0] == 1:  # Operation not permitted
                 raise AccessDenied(pid)
@@ -122,7 +126,7 @@ class ProcManager(object):
     def kill_all_process(self, pid, kill_child=True, kill_process_gourp=True):
         """关闭进程 (pid所指进程, 该进程的子进程, 该进程的同组进程)"""
         # 获取需要关闭的进程
-        self_pid = os.getpid()
+        self_pid = path_resolver.self_pid()  # 根目录中的进程号
         need_killed_process = [pid]
         if kill_child:
             need_killed_process.extend(self.get_all_child_process(pid))
@@ -174,7 +178,7 @@ class ProcManager(object):
     def get_process_execute_path(self, pid):
         """获取进程执行文件地址 - /proc/[pid]/cwd"""
 
-        cwd_path = "/proc/{}/cwd".format(pid)
+        cwd_path = proc_path(pid, "cwd")
         return os.readlink(cwd_path)
 
     def start_process(self, execute_file_full_path):
@@ -25,6 +25,7 @@ code & doc  :   https://github.com/Watch-Dogs-HIT/Watch_Dogs/blob/master/Watch_D
 
 import os
 import sys
+import errno
 import ctypes
 import signal
 import datetime
@@ -32,10 +33,16 @@ import threading
 from copy import deepcopy
 from time import time, sleep
 
-from sys_monitor import SysMonitor
-from prcess_exception import wrap_process_exceptions
+from sys_monitor import SysMonitor, split_baselines
+from net_rate import NetRateEstimator, NET_RATE_WINDOWS
+from proc_file import proc_file_cache
+from path_resolver import path_resolver, proc_path
+from proc_parse import parse_stat, parse_io, parse_status
+from prcess_exception import wrap_process_exceptions, ProcessException, NoSuchProcess, NoWatchedProcess
 
 CALC_FUNC_INTERVAL = 2
+MEM_DETAIL_BUDGET = 0.05  # 每轮采样读取smaps_rollup的时间预算(秒)
+THREAD_SCAN_LIMIT = 256  # 每次计算线程CPU占用率时最多扫描的线程数
 
 
 class ProcMonitor(object):
@@ -62,9 +69,10 @@ class ProcMonitor(object):
     https://github.com/Watch-Dogs-HIT/Watch_Dogs/blob/3ab4cdc46d0e91c3b427960ad7c29a838480c774/Watch_Dogs/Core/process_monitor.py#L631
     """
 
-    def __init__(self, net_monitor=False):
+    def __init__(self, net_monitor=False, net_rate_windows=NET_RATE_WINDOWS):
         """初始化数据结构、权限信息"""
         self.__monitor_data_init__()
+        self.net_rates = NetRateEstimator(net_rate_windows)  # 进程网络速率滑动窗口
         self.__process_env_init__(net_monitor)
 
     def __process_env_init__(self, net_monitor=False):
@@ -88,13 +96,15 @@ class ProcMonitor(object):
         self.process_monitor_dict = {}
         self.process_monitor_dict["watch_pid"] = set()  # 关注的进程pid
         self.process_monitor_dict["process"] = {}  # 关注进程的相关信息
+        self.restored_baselines = {}  # 从本地存储恢复, 尚未被监测的进程的计算基准 pid -> {字段: 值}
         # nethogs相关
         self.process_monitor_dict["libnethogs_thread"] = None  # nethogs进程流量监测线程
         self.process_monitor_dict["libnethogs_thread_install"] = False  # libnethogs是否安装成功
         self.process_monitor_dict["libnethogs"] = None  # nethogs动态链接库对象
-        self.process_monitor_dict["libnethogs_data"] = {}  # nethogs监测进程流量数据
+        self.process_monitor_dict["libnethogs_slots"] = {}  # nethogs监测进程流量数据 (每个被监测进程一个预分配的槽)
         # 系统内核数据
-        self.MEM_PAGE_SIZE = 4  # KB
+        self.MEM_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") / 1024  # KB
+        self.mem_detail_cursor = 0  # 按预算读取smaps_rollup时的轮询位置
         # Libnethogs 数据
         self.LIBRARY_NAME = "libnethogs.so"  # 动态链接库名称
         self.FILTER = None  # PCAP格式过滤器 eg: "port 80 or port 8080 or port 443"
@@ -109,7 +119,10 @@ class ProcMonitor(object):
                 "prev_process_cpu_time": None,  # 上次记录进程CPU时间片
                 "prev_io_read_time": -1,  # 上次读取IO数据的时间
                 "prev_io": None,  # 上次读取的IO数据
-                "prev_net_data": None,  # 最近一次长期网络数据
+                "mem_detail": None,  # 最近一次基于smaps_rollup的内存明细
+                "threads": {},  # 线程CPU数据 tid -> {线程名, 上次CPU时间片, CPU占用率...}
+                "thread_cursor": 0,  # 线程数超过扫描上限时的轮询位置
+                "exit_event": None,  # 进程退出事件(由进程事件监听得到)
             }
         return deepcopy(process_info_dict)
 
@@ -122,6 +135,63 @@ class ProcMonitor(object):
         self.process_monitor_dict["watch_pid"].add(int(pid))
         if not str(pid) in self.process_monitor_dict["process"]:  # use [in] rather than [dict.has_key()]
             self.process_monitor_dict["process"][str(pid)] = self.init_process_info_data()
+            self.restore_process_baselines(pid)
+        # 在请求线程中预先分配槽, nethogs回调中不再分配
+        if not int(pid) in self.process_monitor_dict["libnethogs_slots"]:
+            self.process_monitor_dict["libnethogs_slots"][int(pid)] = NetSlot()
+
+    def get_baselines(self):
+        """
+        获取被监测进程的CPU及IO计算基准 (持久化后用于重启时恢复)
+        同时记录进程启动时间, 恢复时据此排除进程号被复用的情况
+        """
+        baselines = {}
+        for pid, process_info in self.process_monitor_dict["process"].items():
+            if not process_info["prev_total_cpu_time"] and not process_info["prev_io"]:
+                continue
+            try:
+                starttime = self.get_process_stat(pid)["starttime"]
+            except ProcessException:  # 进程已退出
+                continue
+            prefix = "process." + pid + "."
+            baselines[prefix + "starttime"] = starttime
+            if process_info["prev_total_cpu_time"]:
+                baselines[prefix + "total_cpu_time"] = process_info["prev_total_cpu_time"]
+                baselines[prefix + "process_cpu_time"] = process_info["prev_process_cpu_time"]
+            if process_info["prev_io"]:
+                baselines[prefix + "io_rchar"], baselines[prefix + "io_wchar"] = process_info["prev_io"]
+                baselines[prefix + "io_time"] = process_info["prev_io_read_time"]
+        return baselines
+
+    def load_baselines(self, baselines):
+        """
+        恢复被监测进程的计算基准 (系统重启过则不恢复)
+        已被监测的进程立即恢复, 其他进程在之后加入监测时(如按规则重新关联)恢复
+        """
+        if not baselines or baselines.get("btime") != self.SysMonitor.get_boot_time():
+            return False
+        self.restored_baselines = split_baselines(baselines, "process.")
+        for pid in list(self.get_all_watched_pid()):
+            self.restore_process_baselines(pid)
+        return True
+
+    def restore_process_baselines(self, pid):
+        """按恢复的计算基准初始化进程数据 (进程启动时间不一致时说明进程号已被复用, 不恢复)"""
+        restored = self.restored_baselines.pop(str(pid), None)
+        if not restored:
+            return
+        try:
+            if restored.get("starttime") != self.get_process_stat(pid)["starttime"]:
+                return
+        except ProcessException:
+            return
+        process_info = self.process_monitor_dict["process"][str(pid)]
+        if "total_cpu_time" in restored:
+            process_info["prev_total_cpu_time"] = int(restored["total_cpu_time"])
+            process_info["prev_process_cpu_time"] = int(restored["process_cpu_time"])
+        if "io_rchar" in restored:
+            process_info["prev_io"] = [int(restored["io_rchar"]), int(restored["io_wchar"])]
+            process_info["prev_io_read_time"] = restored["io_time"]
 
     def is_process_watched(self, pid):
         """判断该进程是否被监测"""
@@ -132,6 +202,23 @@ class ProcMonitor(object):
         if str(pid) in self.process_monitor_dict["process"] and int(pid) in self.process_monitor_dict["watch_pid"]:
             self.process_monitor_dict["watch_pid"].remove(int(pid))
             self.process_monitor_dict["process"].pop(str(pid))
+            self.process_monitor_dict["libnethogs_slots"].pop(int(pid), None)
+            self.net_rates.remove(int(pid))
+            proc_file_cache.close_pid(int(pid))
+
+    def on_process_event(self, event):
+        """进程事件回调 - 被监测进程退出时立即记录退出事件, 不必等到下次读取/proc失败"""
+        if event["event"] == "exit" and self.is_process_watched(event["pid"]):
+            process_info = self.process_monitor_dict["process"].get(str(event["pid"]))
+            if process_info is not None:
+                process_info["exit_event"] = event
+            proc_file_cache.close_pid(int(event["pid"]))
+
+    def get_process_exit_event(self, pid):
+        """获取被监测进程的退出事件, 进程未退出时返回None"""
+        if not self.is_process_watched(pid):
+            raise NoWatchedProcess(pid)
+        return self.process_monitor_dict["process"][str(pid)]["exit_event"]
 
     @wrap_process_exceptions
     def get_all_pid(self):
@@ -145,50 +232,63 @@ class ProcMonitor(object):
             except ValueError:
                 return False
 
-        return filter(isDigit, os.listdir("/proc"))
+        return filter(isDigit, os.listdir(proc_path()))
 
     @wrap_process_exceptions
-    def get_process_info(self, pid):
-        """获取进程信息 - /proc/[pid]/stat"""
-        with open("/proc/{}/stat".format(pid), "r") as p_stat:
-            p_data = p_stat.readline()
+    def get_process_stat(self, pid):
+        """获取进程状态的所有字段 - /proc/[pid]/stat (同一采样周期内的多个使用者共用一次读取结果)"""
+        return parse_stat(proc_file_cache.read(proc_path(pid, "stat"), int(pid)))
 
-        p_data = p_data.split(" ")
+    @wrap_process_exceptions
+    def get_process_io_counters(self, pid):
+        """获取进程的所有IO计数 - /proc/[pid]/io (需要与进程相同的用户或root权限)"""
+        return parse_io(proc_file_cache.read(proc_path(pid, "io"), int(pid)))
 
-        with open("/proc/{}/cmdline".format(pid), "r") as p_cmdline:
+    @wrap_process_exceptions
+    def get_process_status(self, pid):
+        """获取进程状态信息 - /proc/[pid]/status"""
+        with open(proc_path(pid, "status"), "r") as p_status:
+            return parse_status(p_status.read())
+
+    @wrap_process_exceptions
+    def get_process_info(self, pid, stat=None):
+        """
+        获取进程信息 - /proc/[pid]/stat
+        :param stat: 已读取的 get_process_stat 结果, 为None时重新读取
+        """
+        stat = stat or self.get_process_stat(pid)
+
+        with open(proc_path(pid, "cmdline"), "r") as p_cmdline:
             p_cmdline = p_cmdline.readline().replace('\0', ' ').strip()
 
         return {
-            "pid": int(p_data[0]),
-            "comm": p_data[1].strip(")").strip("("),
-            "state": p_data[2],
-            "ppid": int(p_data[3]),
-            "pgrp": int(p_data[4]),
-            "thread num": len(os.listdir("/proc/{}/task".format(pid))),
-            "cmdline": p_cmdline
+            "pid": stat["pid"],
+            "comm": stat["comm"],
+            "state": stat["state"],
+            "ppid": stat["ppid"],
+            "pgrp": stat["pgrp"],
+            "thread num": stat["num_threads"],
+            "cmdline": p_cmdline,
+            "local_pid": path_resolver.local_pid(pid)  # 本进程所在PID命名空间中的进程号, 不可见时为None
         }
 
-    @wrap_process_exceptions
-    def get_process_cpu_time(self, pid):
+    def get_process_cpu_time(self, pid, stat=None):
         """获取进程cpu时间片 - /proc/[pid]/stat"""
+        stat = stat or self.get_process_stat(pid)
+        return stat["utime"] + stat["stime"] + stat["cutime"] + stat["cstime"]  # 进程cpu时间片 = utime+stime+cutime+cstime
 
-        with open("/proc/{}/stat".format(pid), "r") as p_stat:
-            p_data = p_stat.readline()
-
-        return sum(map(int, p_data.split(" ")[13:17]))  # 进程cpu时间片 = utime+stime+cutime+cstime
-
-    def calc_process_cpu_percent(self, pid):
+    def calc_process_cpu_percent(self, pid, stat=None):
         """计算进程CPU使用率 (计算的cpu总体占用率)"""
         # 初始化 - 添加进程信息
         if str(pid) in self.process_monitor_dict["process"]:  # 进程数据必须先被初始化
             process_info = self.process_monitor_dict["process"][str(pid)]
             if not process_info["prev_total_cpu_time"]:  # 第一次计算
                 process_info["prev_total_cpu_time"] = self.SysMonitor.get_total_cpu_time()[0]
-                process_info["prev_process_cpu_time"] = self.get_process_cpu_time(int(pid))
+                process_info["prev_process_cpu_time"] = self.get_process_cpu_time(int(pid), stat)
                 return 0.
             else:  # 非第一次计算
                 current_cpu_total_time = self.SysMonitor.get_total_cpu_time()[0]
-                current_process_cpu_time = self.get_process_cpu_time(int(pid))
+                current_process_cpu_time = self.get_process_cpu_time(int(pid), stat)
                 if current_cpu_total_time - process_info["prev_total_cpu_time"] > 0.:
                     process_cpu_percent = round(
                         (current_process_cpu_time - process_info["prev_process_cpu_time"]) * 100.0 \
@@ -202,6 +302,67 @@ class ProcMonitor(object):
         else:
             return -1
 
+    @wrap_process_exceptions
+    def get_process_thread_ids(self, pid):
+        """获取进程所有线程号 - /proc/[pid]/task"""
+        return sorted(map(int, os.listdir(proc_path(pid, "task"))))
+
+    @wrap_process_exceptions
+    def get_thread_cpu_time(self, pid, tid):
+        """获取线程cpu时间片 [utime, stime] - /proc/[pid]/task/[tid]/stat"""
+
+        with open(proc_path(pid, "task", tid, "stat"), "r") as t_stat:
+            t_data = t_stat.readline()
+
+        # 线程名中可能含有空格或括号, 从最后一个 ')' 之后开始解析 (第一个字段为state)
+        t_data = t_data[t_data.rfind(")") + 2:].split()
+        return int(t_data[11]), int(t_data[12])
+
+    @wrap_process_exceptions
+    def get_thread_name(self, pid, tid):
+        """获取线程名 - /proc/[pid]/task/[tid]/comm"""
+
+        with open(proc_path(pid, "task", tid, "comm"), "r") as t_comm:
+            return t_comm.readline().strip()
+
+    def calc_process_thread_cpu_percent(self, pid, top_n=10, max_threads=THREAD_SCAN_LIMIT):
+        """
+        计算进程各线程CPU占用率, 返回占用率最高的 top_n 个线程
+        线程数超过 max_threads 时每次只轮流扫描其中一部分, 未扫描的线程沿用上次结果
+        """
+        if not self.is_process_watched(pid):
+            raise NoWatchedProcess(pid)
+        process_info = self.process_monitor_dict["process"][str(pid)]
+        thread_data = process_info["threads"]
+
+        tids = self.get_process_thread_ids(pid)
+        for tid in set(thread_data.keys()) - set(tids):  # 清理已退出的线程
+            thread_data.pop(tid)
+        if len(tids) > max_threads:
+            start = process_info["thread_cursor"] % len(tids)
+            tids = (tids[start:] + tids[:start])[:max_threads]
+            process_info["thread_cursor"] = start + max_threads
+
+        current_cpu_total_time = self.SysMonitor.get_total_cpu_time()[0]
+        for tid in tids:
+            try:
+                utime, stime = self.get_thread_cpu_time(pid, tid)
+                if tid not in thread_data:  # 第一次计算, 线程名只读取一次
+                    thread_data[tid] = {"tid": tid, "name": self.get_thread_name(pid, tid), "cpu_percent": 0.}
+                else:
+                    t = thread_data[tid]
+                    if current_cpu_total_time - t["prev_total_cpu_time"] > 0:
+                        t["cpu_percent"] = round((utime + stime - t["prev_thread_cpu_time"]) * 100.0
+                                                 / (current_cpu_total_time - t["prev_total_cpu_time"]), 4)
+            except NoSuchProcess:  # 线程已退出
+                continue
+            thread_data[tid].update({"utime": utime, "stime": stime, "prev_thread_cpu_time": utime + stime,
+                                     "prev_total_cpu_time": current_cpu_total_time})
+
+        hottest_threads = sorted(thread_data.values(), key=lambda t: t["cpu_percent"], reverse=True)[:top_n]
+        return [{"tid": t["tid"], "name": t["name"], "cpu_percent": t["cpu_percent"],
+                 "utime": t["utime"], "stime": t["stime"]} for t in hottest_threads]
+
     # reference:https://github.com/giampaolo/psutil/blob/ffe8a9d280c397e8fd46eb1422c2838179cfb5d9/psutil/_psposix.py#L123
     def get_path_disk_usage(self, path):
         """计算路径磁盘占用"""
@@ -286,32 +447,109 @@ class ProcMonitor(object):
             return round(avail_size / 1024., 2)
 
     @wrap_process_exceptions
-    def get_process_mem(self, pid, style="M"):
+    def get_process_mem(self, pid, style="M", stat=None):
         """获取进程占用内存 /proc/pid/stat"""
-
-        with open("/proc/{}/stat".format(pid), "r") as p_stat:
-            p_data = p_stat.readline()
+        rss = (stat or self.get_process_stat(pid))["rss"]
 
         # 进程实际占用内存 = rss * page size
         if style == "M":
-            return round(int(p_data.split()[23]) * self.MEM_PAGE_SIZE / 1024., 2)
+            return round(rss * self.MEM_PAGE_SIZE / 1024., 2)
         elif style == "G":
-            return round(int(p_data.split()[23]) * self.MEM_PAGE_SIZE / 1024. ** 2, 2)
+            return round(rss * self.MEM_PAGE_SIZE / 1024. ** 2, 2)
         else:  # K
-            return int(p_data.split()[23]) * self.MEM_PAGE_SIZE
+            return rss * self.MEM_PAGE_SIZE
 
     @wrap_process_exceptions
-    def get_process_io(self, pid):
-        """获取进程读写数据 - /proc/pid/io"""
+    def get_process_mem_statm(self, pid):
+        """获取进程内存明细 - /proc/pid/statm (代价低, 但没有PSS/USS/swap)"""
 
-        with open("/proc/{}/io".format(pid), "r") as p_io:
-            rchar = p_io.readline().split(":")[1].strip()
-            wchar = p_io.readline().split(":")[1].strip()
+        size, resident, shared = map(int, proc_file_cache.read(proc_path(pid, "statm"), int(pid)).split()[:3])
 
-        return map(int, [rchar, wchar])
+        return {
+            "rss": resident * self.MEM_PAGE_SIZE,
+            "pss": None,
+            "uss": (resident - shared) * self.MEM_PAGE_SIZE,
+            "swap": None,
+            "shared": shared * self.MEM_PAGE_SIZE,
+            "source": "statm",
+        }
+
+    @wrap_process_exceptions
+    def get_process_mem_detail(self, pid):
+        """
+        获取进程内存明细(KB) - /proc/pid/smaps_rollup (内核4.14以下退化为/proc/pid/statm)
+        rss - 常驻内存, pss - 按共享比例分摊的内存, uss - 进程独占内存, swap - 交换分区, shared - 共享内存
+        """
+        try:
+            p_smaps = open(proc_path(pid, "smaps_rollup"), "r")
+        except IOError as err:
+            # 内核不支持smaps_rollup或无读取权限时, 退化为statm
+            if err.errno in (errno.ENOENT, errno.EACCES, errno.EPERM) and os.path.exists(proc_path(pid)):
+                return self.get_process_mem_statm(pid)
+            raise
+
+        smaps = {}
+        with p_smaps:
+            p_smaps.readline()  # 第一行为地址范围
+            for line in p_smaps:
+                key, _, value = line.partition(":")
+                smaps[key] = int(value.split()[0])
+
+        return {
+            "rss": smaps.get("Rss", 0),
+            "pss": smaps.get("Pss", 0),
+            "uss": smaps.get("Private_Clean", 0) + smaps.get("Private_Dirty", 0),
+            "swap": smaps.get("Swap", 0),
+            "shared": smaps.get("Shared_Clean", 0) + smaps.get("Shared_Dirty", 0),
+            "source": "smaps_rollup",
+        }
+
+    def collect_process_mem_detail(self, pids, budget=MEM_DETAIL_BUDGET):
+        """
+        按时间预算获取多个进程的内存明细
+        smaps_rollup 对大进程的读取代价很高, 超出预算后剩余进程改为读取statm,
+        并沿用上次smaps_rollup得到的 pss/swap; 每轮从上次中断的位置继续, 保证所有进程轮流得到更新
+        :return: {pid: 内存明细}, 读取失败的进程不在结果中
+        """
+        pids = sorted(pids)
+        if not pids:
+            return {}
+        start = self.mem_detail_cursor % len(pids)
+        ordered_pids = pids[start:] + pids[:start]
+        deadline = time() + budget
+        result = {}
+
+        for index, pid in enumerate(ordered_pids):
+            process_info = self.process_monitor_dict["process"].get(str(pid))
+            try:
+                if time() < deadline:
+                    mem_detail = self.get_process_mem_detail(pid)
+                    self.mem_detail_cursor = start + index + 1
+                    if process_info is not None:
+                        process_info["mem_detail"] = mem_detail
+                else:
+                    mem_detail = self.get_process_mem_statm(pid)
+                    prev_mem_detail = process_info and process_info["mem_detail"]
+                    if prev_mem_detail:
+                        mem_detail["pss"] = prev_mem_detail["pss"]
+                        mem_detail["swap"] = prev_mem_detail["swap"]
+            except ProcessException:
+                continue
+            result[pid] = mem_detail
+
+        return result
+
+    @wrap_process_exceptions
+    def get_process_io(self, pid, io=None):
+        """获取进程读写数据 [rchar, wchar] - /proc/pid/io"""
+        io = io or self.get_process_io_counters(pid)
+        return [io["rchar"], io["wchar"]]
 
-    def calc_process_io_speed(self, pid, style="M"):
-        """计算进程的磁盘IO速度 (默认单位MB/s)"""
+    def calc_process_io_speed(self, pid, style="M", io=None):
+        """
+        计算进程的磁盘IO速度 (默认单位MB/s)
+        :param io: 已读取的 get_process_io_counters 结果, 为None时重新读取
+        """
         if style == "M":  # MB/s
             io_speed_units = 1000. ** 2
         elif style == "G":  # GB/s
@@ -324,12 +562,12 @@ class ProcMonitor(object):
         if str(pid) in self.process_monitor_dict["process"]:  # 进程数据必须先被初始化
             process_info = self.process_monitor_dict["process"][str(pid)]
             if not process_info["prev_io"]:  # 第一次计算
-                process_info["prev_io"] = self.get_process_io(int(pid))
+                process_info["prev_io"] = self.get_process_io(int(pid), io)
                 process_info["prev_io_read_time"] = time()
                 return 0., 0.
             else:  # 非第一次计算
                 current_time = time()
-                current_rchar, current_wchar = self.get_process_io(int(pid))
+                current_rchar, current_wchar = self.get_process_io(int(pid), io)
                 read_IO_speed = round(
                     (current_rchar - process_info["prev_io"][0]) / io_speed_units /
                     (current_time - process_info["prev_io_read_time"])
@@ -416,27 +654,40 @@ class ProcMonitor(object):
             self.nethogs_running_status = False
 
     def network_activity_callback(self, action, data):
-        """nethogs进程流量监测线程 - 回调函数"""
-        if data.contents.pid in self.process_monitor_dict["watch_pid"]:
-            # 初始化一个新的进程网络监测数据, 并替代原来的
-            process_net_data = {}
-            process_net_data["pid"] = data.contents.pid
-            process_net_data["uid"] = data.contents.uid
-            process_net_data["action"] = Action.MAP.get(action, "Unknown")
-            process_net_data["pid_name"] = data.contents.name
-            process_net_data["record_id"] = data.contents.record_id
-            process_net_data["str_time"] = datetime.datetime.now().strftime("%H:%M:%S")  # 这里获取的是本地时间
-            process_net_data["unix_timestamp"] = time()  # unix时间戳, 单位是秒
-            process_net_data["device"] = data.contents.device_name.decode("ascii")
-            process_net_data["sent_bytes"] = data.contents.sent_bytes
-            process_net_data["recv_bytes"] = data.contents.recv_bytes
-            process_net_data["sent_kbs"] = round(data.contents.sent_kbs, 2)
-            process_net_data["recv_kbs"] = round(data.contents.recv_kbs, 2)
-
-            self.process_monitor_dict["libnethogs_data"][str(data.contents.pid)] = process_net_data
-            # 初始化原始记录
-            if not self.process_monitor_dict["process"][str(data.contents.pid)]["prev_net_data"]:
-                self.process_monitor_dict["process"][str(data.contents.pid)]["prev_net_data"] = process_net_data
+        """
+        nethogs进程流量监测线程 - 回调函数
+        流量较大时每秒会被调用上千次, 这里只把原始值写入被监测进程预分配的槽中,
+        不创建字典, 不格式化时间, 转换及格式化都推迟到读取时进行
+        """
+        record = data.contents
+        slot = self.process_monitor_dict["libnethogs_slots"].get(record.pid)
+        if slot is not None:
+            slot.write(action, record, time())
+
+    def read_process_net_data(self, pid):
+        """读取进程最近一次的网络数据 (与nethogs回调之间无锁, 通过序号保证读到的数据一致), 没有数据时返回{}"""
+        slot = self.process_monitor_dict["libnethogs_slots"].get(int(pid))
+        if slot is None:
+            return {}
+        values = slot.read()
+        if values is None:
+            return {}
+        action, record_pid, uid, name, record_id, device, sent_bytes, recv_bytes, sent_kbs, recv_kbs, \
+            unix_timestamp = values
+        return {
+            "pid": record_pid,
+            "uid": uid,
+            "action": Action.MAP.get(action, "Unknown"),
+            "pid_name": name,
+            "record_id": record_id,
+            "str_time": datetime.datetime.fromtimestamp(unix_timestamp).strftime("%H:%M:%S"),  # 这里获取的是本地时间
+            "unix_timestamp": unix_timestamp,  # unix时间戳, 单位是秒
+            "device": device.decode("ascii") if device is not None else None,
+            "sent_bytes": sent_bytes,
+            "recv_bytes": recv_bytes,
+            "sent_kbs": round(sent_kbs, 2),
+            "recv_kbs": round(recv_kbs, 2),
+        }
 
     def init_nethogs_thread(self):
         """nethogs进程流量监测线程 - 初始化"""
@@ -462,54 +713,43 @@ class ProcMonitor(object):
             return {"Error": "libnethogs is not running"}
 
         if self.is_process_watched(int(pid)):
-            return self.process_monitor_dict["libnethogs_data"].get(str(pid), {})
+            return self.read_process_net_data(pid)
         else:
             return {"Error": "No such process {}".format(str(pid))}
 
-    def calc_process_net_speed(self, pid, speed_type="recent", long_term_sec_interval=300):
+    def update_process_net_rate(self, pid):
+        """将进程当前的nethogs累计字节数加入速率样本 (nethogs只在有流量时回调, 累计值在读取时刻依然有效)"""
+        slot = self.process_monitor_dict["libnethogs_slots"].get(int(pid))
+        values = slot.read() if slot is not None else None
+        if values is not None:
+            self.net_rates.add_sample(int(pid), time(), values[6], values[7])
+
+    def get_process_net_rates(self, pid):
+        """
+        计算进程各窗口的网络上传,下载速度(KB/s)
+        :return: {窗口名称: {"sent_kbps", "recv_kbps", "span", "state"}}, 进程未被监测时返回None
+        """
+        if not self.is_process_watched(pid):
+            return None
+        self.update_process_net_rate(pid)
+        return self.net_rates.rates(int(pid))
+
+    def calc_process_net_speed(self, pid, speed_type="recent"):
         """
-        计算进程网络上传,下载速度[Kbps, kbps]
-        瞬时网络速度计算/长期(5min)网络速度计算
+        计算进程网络上传,下载速度[KB/s, KB/s]
+        recent : 最小窗口(默认10秒) / long : 最大窗口(默认5分钟) / 数字 : 指定窗口秒数
+        暂无数据时返回 (None, None)
         """
         if self.is_process_watched(pid):
-            process_info = self.process_monitor_dict["process"][str(pid)]
-            if speed_type == "recent":  # 瞬时
-                process_net_data = self.process_monitor_dict["libnethogs_data"].get(str(pid), {})
-                if process_net_data:
-                    if not process_info["prev_net_data"]:
-                        process_info["prev_net_data"] = process_net_data
-                    return process_net_data["sent_kbs"], process_net_data["recv_kbs"]
-                else:
-                    return 0.00001, 0.00001
-            else:  # 长期
-                prev_net_data = process_info["prev_net_data"]
-                if prev_net_data:
-                    now_net_data = self.get_process_net_info(pid)
-                    if now_net_data != prev_net_data:  # 防止 /0
-                        if now_net_data["sent_kbs"] == 0.0 and now_net_data["recv_kbs"] == 0.0:  # 有可能是过期数据
-                            unix_time = time()
-                        else:
-                            unix_time = now_net_data["unix_timestamp"]
-                        # 计算网速
-                        send_kbps = round((now_net_data["sent_bytes"] - prev_net_data["sent_bytes"]) / 1024. / \
-                                          (unix_time - prev_net_data["unix_timestamp"]), 2)
-                        recv_kbps = round((now_net_data["recv_bytes"] - prev_net_data["recv_bytes"]) / 1024. / \
-                                          (unix_time - prev_net_data["unix_timestamp"]), 2)
-                        if send_kbps < 0 or recv_kbps < 0:  # for a bug
-                            # print "[unexcept error]send_kbps < 0 or recv_kbps < 0"
-                            # print "prev_net_data", prev_net_data
-                            # note : 出现的原因是因为长时间进程无网络数据,部分链接被重置之后,发送接收字节数会变小,
-                            # 因为只会出现于长时间无网络请求的数据,所以这里不做处理,只更新数据,返回0作为网速即可
-                            process_info["prev_net_data"] = now_net_data
-                            return 0.00004, 0.00004
-                        if unix_time - prev_net_data["unix_timestamp"] > long_term_sec_interval:  # 达到长期速度计算区间
-                            process_info["prev_net_data"] = now_net_data  # 更新旧记录
-
-                    else:  # 最近两次io数据一致
-                        return 0.00002, 0.00002
-                    return send_kbps, recv_kbps
-                else:  # 一直没有io数据
-                    return 0.00003, 0.00003
+            self.update_process_net_rate(pid)
+            if speed_type == "recent":
+                window = self.net_rates.windows[0]
+            elif speed_type == "long":
+                window = self.net_rates.windows[-1]
+            else:
+                window = int(speed_type)
+            rate = self.net_rates.rate(int(pid), window)
+            return rate["sent_kbps"], rate["recv_kbps"]
         else:
             return -1., -1.
 
@@ -532,6 +772,56 @@ class LoopStatus():
     MAP = {OK: "OK", FAILURE: "FAILURE", NO_DEVICE: "NO_DEVICE"}
 
 
+class NetSlot(object):
+    """
+    nethogs进程流量监测线程 - 单个进程的数据槽 (单写多读的序号锁 seqlock)
+    写入时序号先变为奇数, 写完后变为偶数; 读取时序号为奇数或前后不一致说明读到了写入中的数据, 需要重读
+    写入方只有nethogs线程一个, 读写双方都不加锁
+    """
+    __slots__ = ("seq", "action", "pid", "uid", "name", "record_id", "device", "sent_bytes", "recv_bytes",
+                 "sent_kbs", "recv_kbs", "unix_timestamp")
+
+    READ_RETRY = 100  # 读取重试次数
+
+    def __init__(self):
+        self.seq = 0
+        self.action = self.pid = self.uid = self.name = self.record_id = self.device = None
+        self.sent_bytes = self.recv_bytes = 0
+        self.sent_kbs = self.recv_kbs = 0.
+        self.unix_timestamp = 0.
+
+    def write(self, action, record, unix_timestamp):
+        """写入一条nethogs记录 (只在nethogs线程中调用)"""
+        self.seq += 1
+        self.action = action
+        self.pid = record.pid
+        self.uid = record.uid
+        self.name = record.name
+        self.record_id = record.record_id
+        self.device = record.device_name
+        self.sent_bytes = record.sent_bytes
+        self.recv_bytes = record.recv_bytes
+        self.sent_kbs = record.sent_kbs
+        self.recv_kbs = record.recv_kbs
+        self.unix_timestamp = unix_timestamp
+        self.seq += 1
+
+    def read(self):
+        """读取一致的数据, 从未写入时返回None"""
+        for _ in xrange(self.READ_RETRY):
+            seq = self.seq
+            if seq == 0:
+                return None
+            if seq & 1:  # 正在写入
+                sleep(0)
+                continue
+            values = (self.action, self.pid, self.uid, self.name, self.record_id, self.device, self.sent_bytes,
+                      self.recv_bytes, self.sent_kbs, self.recv_kbs, self.unix_timestamp)
+            if self.seq == seq:
+                return values
+        return None
+
+
 class NethogsMonitorRecord(ctypes.Structure):
     """nethogs进程流量监测线程 - 用于进程浏览监测的数据结构
     ctypes version of the struct of the same name from libnethogs.h"""
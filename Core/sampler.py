@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 定时采样
+
+主要包括
+- 后台线程按固定间隔采集系统及被监控进程数据
+- 保存最近一次采样快照, 请求直接读取快照而不再重复读取/proc
+- CPU占用率, IO速度等依赖上一次计算基准的数值只在采样中计算, 请求线程不推进计算基准
+- 基于快照生成Prometheus文本格式指标 (每个采样周期最多渲染一次)
+- 各采集项通过注册表声明采集间隔及耗时预算, 由时间轮调度 (磁盘占用, 进程内存明细等代价高的采集项降低频率)
+- 采样线程超出CPU预算时优先保证被监测进程的数据, 先拉长全量扫描类采集项的间隔
+- 多进程模式下每次采样后将快照(已编码的JSON及Prometheus文本)发布到共享内存, 供HTTP工作进程读取
+- 每次采样后将主要数值以固定二进制格式导出到内存映射文件, 供同一主机上的其他程序直接读取
+
+快照结构
+{
+    "seq": 采样序号,
+    "timestamp": 采样时间(unix时间戳),
+    "sys": {"cpu_percent", "cpu_percents", "mem", "loadavg", "pressure", "vmstat", "net_devices", "net",
+            "io_devices", "io", "disk", "disk_pending", "sockets"},
+    "process": {"pid": {"comm", "state", "threads", "cpu_percent", "mem_M", "mem_detail", "io_read_MBs",
+                        "io_write_MBs", "top_threads", "cgroup", "net_rates", "sockets"}},
+    "process_groups": {"root_pid": {"comm", "root_alive", "members", "cpu_percent", "rss_M", "io_read_MBs",
+                                    "io_write_MBs", "threads"}},
+    "cgroups": {"cgroup路径": {"cpu_percent", "throttled_per_s", "mem_M", "mem_anon_M", "mem_file_M", "io_read_MBs",
+                              "io_write_MBs", "io_read_iops", "io_write_iops", "pids"}},
+    "errors": {采集项: 错误信息}
+}
+"""
+
+import json
+import threading
+from time import time
+
+from collector import CollectorRegistry, CollectorScheduler, PRIORITY_HIGH, PRIORITY_LOW
+from exposition import render_snapshot
+from metric_store import flatten_snapshot
+from proc_file import proc_file_cache
+from prcess_exception import ProcessException
+
+SAMPLE_INTERVAL = 5  # 默认采样间隔(秒)
+DISK_INTERVAL = 30  # 磁盘占用采集间隔(秒)
+MEM_DETAIL_INTERVAL = 15  # 进程内存明细采集间隔(秒)
+# 快照sys部分的采集项
+SYS_COLLECTORS = ("cpu_percent", "cpu_percents", "mem", "loadavg", "pressure", "vmstat", "net_devices", "net",
+                  "io_devices", "io", "disk", "disk_pending")
+TOP_THREADS_NUM = 10  # 默认快照中每个进程保留的CPU占用最高的线程数 (/proc/<pid>/threads 接口可返回的最大线程数)
+
+
+class Sampler(object):
+    """定时采样类"""
+
+    def __init__(self, sys_monitor, proc_monitor, interval=SAMPLE_INTERVAL, store=None, spool=None,
+                 watch_rules=None, process_groups=None, cgroups=None, sockets=None, collectors=None,
+                 cpu_budget=None, shared=None, export=None, top_threads=TOP_THREADS_NUM):
+        self.sys_monitor = sys_monitor
+        self.proc_monitor = proc_monitor
+        self.interval = interval
+        self.top_threads = top_threads  # 每个进程保留的CPU占用最高的线程数
+        self.store = store  # 本地持久化存储 (为None时不持久化)
+        self.spool = spool  # 快照缓冲, 服务端不可用时用于补齐数据 (为None时不缓冲)
+        self.watch_rules = watch_rules  # 没有进程事件监听时, 每次采样前按规则匹配新进程 (为None时不匹配)
+        self.process_groups = process_groups  # 进程组汇总监测 (为None时不采集)
+        self.cgroups = cgroups  # cgroup监测 (为None时不采集)
+        self.sockets = sockets  # 套接字及连接统计 (为None时不采集)
+        self.shared = shared  # 共享快照写入 (多进程模式, 为None时不发布)
+        self.export = export  # 固定二进制格式的快照导出 (为None时不导出)
+        self.seq = store.last_seq if store is not None else 0  # 重启后序号接着存储中的继续递增
+        self.snapshot = None
+        self.net_device = None
+        # 采集项注册及调度, collectors为配置文件中对采集项的覆盖 {名称: {"interval", "budget", "enabled"}}
+        self.registry = CollectorRegistry()
+        self.register_collectors()
+        self.registry.configure(collectors)
+        # cpu_budget : 采样线程的CPU预算(单核占比), 超出时按优先级拉长采集间隔
+        self.scheduler = CollectorScheduler(self.registry, interval, cpu_budget=cpu_budget)
+        # (快照序号, 渲染结果) - 整体替换, 保证读取时二者一致
+        self._metrics_cache = (-1, "")
+        self._stop_event = threading.Event()
+        self._sample_lock = threading.Lock()  # 同一时刻只进行一次采样, 计算基准不会被并发推进
+        self._thread = None
+
+    def register_collectors(self):
+        """注册默认采集项 (注册顺序即同一周期内的运行顺序, 派生数据的采集项排在其数据来源之后)"""
+        s = self.sys_monitor
+        register = self.registry.register
+
+        def simple(func):
+            return lambda values, errors: func()
+
+        def mem(values, errors):
+            total, free, available = s.get_mem_info()
+            return {"total": total, "free": free, "available": available,
+                    "percent": round((total - available) * 100.0 / total, 2)}
+
+        def net(values, errors):
+            # 默认网卡数据直接取自各网卡速率, 不再单独读取/proc/net/dev
+            net_devices = values.get("net_devices", {})
+            if self.net_device not in net_devices:
+                self.net_device = s.get_default_net_device()
+            device_speed = net_devices.get(self.net_device, {})
+            return {"device": self.net_device, "upload_kbps": device_speed.get("upload_kbps", 0.),
+                    "download_kbps": device_speed.get("download_kbps", 0.)}
+
+        def io(values, errors):
+            # 总读写速度由各分区数据汇总, 不再单独读取/proc/diskstats
+            io_devices = values["io_devices"].values()
+            return {"read_MBs": round(sum(d["read_MBs"] for d in io_devices), 2),
+                    "write_MBs": round(sum(d["write_MBs"] for d in io_devices), 2)}
+
+        register("cpu_percent", simple(s.calc_cpu_percent), schema={"type": "float", "unit": "percent"})
+        register("cpu_percents", simple(s.calc_cpu_percent_by_cores),
+                 schema={"type": "dict", "key": "cpu", "unit": "percent"})
+        register("mem", mem, schema={"type": "dict", "fields": ["total", "free", "available", "percent"]})
+        register("loadavg", simple(s.get_sys_loadavg_values),
+                 schema={"type": "dict", "fields": ["lavg_1", "lavg_5", "lavg_15", "running", "total", "last_pid"]})
+        register("pressure", simple(s.calc_pressure), schema={"type": "dict", "key": "resource"})
+        register("vmstat", simple(s.calc_vmstat_rates), schema={"type": "dict", "unit": "per second"})
+        register("net_devices", simple(s.calc_net_speed_by_devices), schema={"type": "dict", "key": "device"})
+        register("net", net, schema={"type": "dict", "fields": ["device", "upload_kbps", "download_kbps"]})
+        register("io_devices", simple(s.calc_io_speed_by_devices), schema={"type": "dict", "key": "device"})
+        register("io", io, schema={"type": "dict", "fields": ["read_MBs", "write_MBs"]})
+        # statvfs可能因网络文件系统而阻塞, 磁盘占用变化缓慢, 降低采集频率
+        register("disk", simple(s.get_disk_stat), interval=DISK_INTERVAL, budget=1., priority=PRIORITY_LOW,
+                 schema={"type": "list", "fields": ["device", "fstype", "total", "used", "percent", "mountpoint"]})
+        register("disk_pending", simple(lambda: list(s.disk_stat_pending)), interval=DISK_INTERVAL,
+                 priority=PRIORITY_LOW, schema={"type": "list", "unit": "mountpoint"})
+        register("watch_rules", self.collect_watch_rules, priority=PRIORITY_LOW,
+                 schema={"type": "dict", "key": "pid", "unit": "rule id"})
+        register("process", self.collect_process, priority=PRIORITY_HIGH, schema={"type": "dict", "key": "pid"})
+        # smaps_rollup对大进程读取代价高, 单独降低采集频率
+        register("mem_detail", self.collect_mem_detail, interval=MEM_DETAIL_INTERVAL, budget=0.2,
+                 priority=PRIORITY_HIGH,
+                 schema={"type": "dict", "key": "pid", "fields": ["rss", "pss", "uss", "swap", "shared"]})
+        # 以下采集项需要扫描整个套接字表, 进程树或cgroup树, 超出CPU预算时最先降低频率
+        register("sockets", self.collect_sockets, budget=0.5, priority=PRIORITY_LOW,
+                 schema={"type": "dict", "key": "pid"})
+        register("process_groups", self.collect_process_groups, budget=0.5, priority=PRIORITY_LOW,
+                 schema={"type": "dict", "key": "root_pid"})
+        register("cgroups", self.collect_cgroups, budget=0.5, priority=PRIORITY_LOW,
+                 schema={"type": "dict", "key": "cgroup"})
+
+    def collect_watch_rules(self, values, errors):
+        """按规则匹配新进程 (没有进程事件监听时使用, 需要扫描所有进程), 返回由规则加入监测的进程"""
+        if self.watch_rules is None:
+            return {}
+        try:
+            self.watch_rules.refresh(self.proc_monitor.get_all_pid())
+        except ProcessException as err:
+            errors["watch_rules"] = err.msg
+        return dict((str(pid), rule_id) for pid, rule_id in self.watch_rules.get_attached().items())
+
+    def collect_process(self, values, errors):
+        """采集被监控进程数据"""
+        p = self.proc_monitor
+        process_data = {}
+        for pid in list(p.get_all_watched_pid()):
+            exit_event = p.process_monitor_dict["process"].get(str(pid), {}).get("exit_event")
+            if exit_event is not None:  # 已收到退出事件, 不再读取/proc
+                errors["process " + str(pid)] = "process exited (pid={}, exit_code={})".format(
+                    pid, exit_event["exit_code"])
+                continue
+            try:
+                # 每个进程每个周期只读取一次 /proc/[pid]/stat 及 /proc/[pid]/io, 所有使用者共用解析结果
+                stat = p.get_process_stat(pid)
+                read_MBs, write_MBs = p.calc_process_io_speed(pid, io=p.get_process_io_counters(pid))
+                process_data[str(pid)] = {
+                    "comm": stat["comm"],
+                    "state": stat["state"],
+                    "threads": stat["num_threads"],
+                    "cpu_percent": p.calc_process_cpu_percent(pid, stat),
+                    "mem_M": p.get_process_mem(pid, stat=stat),
+                    "io_read_MBs": read_MBs,
+                    "io_write_MBs": write_MBs,
+                    "top_threads": p.calc_process_thread_cpu_percent(pid, top_n=self.top_threads),
+                    "cgroup": self.cgroups.get_pid_cgroup(pid) if self.cgroups is not None else None,
+                    "net_rates": p.get_process_net_rates(pid) if p.nethogs_running_status else None,
+                }
+            except ProcessException as err:
+                errors["process " + str(pid)] = err.msg
+
+        return process_data
+
+    def collect_mem_detail(self, values, errors):
+        """采集被监控进程的内存明细 {pid: 内存明细}"""
+        p = self.proc_monitor
+        return dict((str(pid), detail) for pid, detail in
+                    p.collect_process_mem_detail(list(p.get_all_watched_pid())).items())
+
+    def collect_process_groups(self, values, errors):
+        """采集进程组汇总数据"""
+        if self.process_groups is None:
+            return {}
+        return self.process_groups.collect()
+
+    def collect_cgroups(self, values, errors):
+        """采集cgroup数据"""
+        if self.cgroups is None:
+            return {}
+        return self.cgroups.collect()
+
+    def collect_sockets(self, values, errors):
+        """采集套接字数据 : (整机数据, {pid: 进程数据})"""
+        if self.sockets is None:
+            return None
+        host_data, processes = self.sockets.collect([int(pid) for pid in values.get("process", {}).keys()])
+        return host_data, dict((str(pid), data) for pid, data in processes.items())
+
+    def build_snapshot(self, values):
+        """由各采集项的结果组装快照数据 (沿用上次结果的采集项不会被修改)"""
+        sys_data = dict((name, values[name]) for name in SYS_COLLECTORS if name in values)
+        sockets = values.get("sockets")
+        if sockets is not None:
+            sys_data["sockets"] = sockets[0]
+        mem_details = values.get("mem_detail", {})
+        process_data = {}
+        for pid, data in values.get("process", {}).items():
+            data = dict(data, mem_detail=mem_details.get(pid))
+            if sockets is not None and pid in sockets[1]:
+                data["sockets"] = sockets[1][pid]
+            process_data[pid] = data
+        return sys_data, process_data
+
+    def sample_once(self):
+        """进行一次采样, 返回新的快照"""
+        with self._sample_lock:
+            return self._sample()
+
+    def _sample(self):
+        timestamp = time()
+        values, errors = self.scheduler.run_tick()
+        sys_data, process_data = self.build_snapshot(values)
+        snapshot = {
+            "seq": self.seq + 1,
+            "timestamp": timestamp,
+            "sys": sys_data,
+            "process": process_data,
+            "process_groups": values.get("process_groups", {}),
+            "cgroups": values.get("cgroups", {}),
+            "errors": errors,
+        }
+        self.seq += 1
+        if self.export is not None:
+            dropped = self.export.publish(snapshot)
+            if dropped:
+                errors["snapshot_export"] = "{} processes exceed export capacity {}".format(dropped,
+                                                                                          self.export.capacity)
+        if self.store is not None:
+            self.persist(snapshot)
+        if self.spool is not None:
+            self.spool.push(snapshot)
+        self.snapshot = snapshot
+        if self.shared is not None:
+            self.publish(snapshot)
+        return snapshot
+
+    def publish(self, snapshot):
+        """将快照, 采集项状态及采样状态发布到共享内存 (JSON编码及指标渲染在采样进程中只进行一次)"""
+        data = json.dumps({"snapshot": snapshot, "collectors": self.scheduler.describe(),
+                           "sampling": self.get_sampling_status()})
+        try:
+            self.shared.publish(snapshot["seq"], data, self.get_metrics_text())
+        except ValueError as err:
+            snapshot["errors"]["shared_snapshot"] = str(err)
+
+    def get_sampling_status(self):
+        """自适应采样状态及 /proc 文件描述符缓存状态"""
+        status = self.scheduler.get_status()
+        status["proc_fd_cache"] = proc_file_cache.get_stat()
+        return status
+
+    def persist(self, snapshot):
+        """将快照中的数值及系统, 被监测进程的计算基准写入本地存储"""
+        samples = flatten_snapshot({"sys": snapshot["sys"], "process": snapshot["process"],
+                                    "process_groups": snapshot.get("process_groups", {}),
+                                    "cgroups": snapshot.get("cgroups", {})})
+        baselines = self.sys_monitor.get_baselines()
+        baselines.update(self.proc_monitor.get_baselines())
+        for name, value in baselines.items():
+            samples["baseline." + name] = value
+        try:
+            self.store.append(snapshot["seq"], snapshot["timestamp"], samples)
+        except (IOError, OSError, ValueError) as err:
+            snapshot["errors"]["store"] = str(err)
+
+    def get_snapshot(self):
+        """
+        获取最近一次采样快照
+        尚无快照时等待正在进行的首次采样完成后返回其结果; 只有采样从未进行过(未启动采样线程)时才在当前线程中采样
+        """
+        if self.snapshot is None:
+            with self._sample_lock:
+                if self.snapshot is None:
+                    self._sample()
+        return self.snapshot
+
+    def get_metrics_text(self):
+        """获取Prometheus文本格式指标 (同一快照只渲染一次)"""
+        snapshot = self.get_snapshot()
+        cached_seq, cached_text = self._metrics_cache
+        if cached_seq == snapshot["seq"]:
+            return cached_text
+        text = render_snapshot(snapshot)
+        self._metrics_cache = (snapshot["seq"], text)
+        return text
+
+    def run_sample_loop(self):
+        """采样线程 - 主循环"""
+        while not self._stop_event.wait(self.interval):
+            self.sample_once()
+
+    def start(self):
+        """启动采样线程 (启动前先同步采样一次)"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self.sample_once()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run_sample_loop, name="Watch_Dogs-Sampler")
+        self._thread.setDaemon(True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """停止采样线程 (等待正在进行的采样完成, 之后可以安全地关闭本地存储)"""
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
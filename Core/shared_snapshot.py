@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 采样快照共享内存
+
+多进程模式下采样只在主进程中进行, 多个HTTP工作进程读取同一份快照 (每个进程有各自的GIL, 请求处理可以使用多个CPU核)
+- 快照发布到内存映射文件 (python2 没有 multiprocessing.shared_memory, 各进程以MAP_SHARED映射同一个文件, 数据共享页缓存)
+- 顺序锁(seqlock) : 写入前后各递增一次锁序号, 读取者复制数据前后锁序号相同且为偶数时数据完整, 否则重试;
+  写入者从不等待读取者, 读取者也不会阻塞采样
+- 写入者一次完成JSON编码及Prometheus文本渲染, 工作进程直接返回编码好的数据
+- 读取者按锁序号缓存解码结果, 同一份快照在每个工作进程中只解码一次
+
+文件结构
+    头部 : magic(4s) 版本(I) 锁序号(Q) 快照序号(Q) JSON长度(I) 指标文本长度(I)
+    数据 : JSON {"snapshot": 快照, "collectors": 各采集项状态, "sampling": 自适应采样状态} + Prometheus文本
+
+参考资料
+reference   :   https://en.wikipedia.org/wiki/Seqlock
+reference   :   https://docs.python.org/2/library/mmap.html
+"""
+
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+
+SHARED_SNAPSHOT_MAGIC = "WDSS"
+SHARED_SNAPSHOT_VERSION = 1
+SHARED_SNAPSHOT_SIZE = 64 * 1024 * 1024  # 映射文件大小(字节), 文件为稀疏文件, 只有写入过的页占用内存
+SHARED_SNAPSHOT_RETRY = 1000  # 读取时遇到写入中的最大重试次数
+SHARED_SNAPSHOT_RETRY_SLEEP = 0.0001  # 每次重试前让出CPU的时间(秒)
+
+HEADER = struct.Struct("=4sIQQII")
+LOCK = struct.Struct("=Q")
+LOCK_OFFSET = 8  # 锁序号在头部中的偏移
+FIELDS = struct.Struct("=QII")  # 快照序号, JSON长度, 指标文本长度
+FIELDS_OFFSET = 16
+
+
+class SharedSnapshotBusy(Exception):
+    """重试次数内没有读取到完整的快照"""
+
+
+def write_lock(mm, lock_seq):
+    """
+    写入锁序号 (锁序号位于映射区域的 LOCK_OFFSET 处)
+    不使用struct.pack_into : 它会先将目标区域清零, 读取者可能读到为0的锁序号; 切片赋值为一次内存复制
+    """
+    mm[LOCK_OFFSET:LOCK_OFFSET + LOCK.size] = LOCK.pack(lock_seq)
+
+
+def seqlock_read(mm, read):
+    """
+    在顺序锁保护下读取 : read(锁序号) 复制所需的数据, 复制前后锁序号相同且为偶数时返回其结果, 否则重试
+    """
+    for retry in xrange(SHARED_SNAPSHOT_RETRY):
+        if retry:
+            time.sleep(SHARED_SNAPSHOT_RETRY_SLEEP)
+        lock_seq = LOCK.unpack_from(mm, LOCK_OFFSET)[0]
+        if lock_seq % 2:  # 写入中
+            continue
+        result = read(lock_seq)
+        if LOCK.unpack_from(mm, LOCK_OFFSET)[0] == lock_seq:
+            return result
+    raise SharedSnapshotBusy("shared snapshot is being written, retry later")
+
+
+class SharedSnapshotWriter(object):
+    """共享快照写入类 (采样进程)"""
+
+    def __init__(self, path, size=SHARED_SNAPSHOT_SIZE):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # 只扩大不缩小 : 工作进程可能已映射了原来的文件, 缩小后读取超出文件末尾的部分会收到SIGBUS
+            os.ftruncate(fd, max(os.fstat(fd).st_size, size))
+            self.mm = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        self.lock = threading.Lock()
+        # 接着文件中原有的锁序号递增, 重启后读取者不会误用缓存的旧快照
+        magic, _, lock_seq, _, _, _ = HEADER.unpack_from(self.mm, 0)
+        self.lock_seq = lock_seq + lock_seq % 2 if magic == SHARED_SNAPSHOT_MAGIC else 0
+        self.mm[:HEADER.size] = HEADER.pack(SHARED_SNAPSHOT_MAGIC, SHARED_SNAPSHOT_VERSION, self.lock_seq, 0, 0, 0)
+
+    def publish(self, seq, data, metrics_text):
+        """
+        发布快照
+        :param data: 已编码的JSON
+        :param metrics_text: 已渲染的Prometheus文本
+        """
+        end = HEADER.size + len(data) + len(metrics_text)
+        if end > len(self.mm):
+            raise ValueError("shared snapshot too large : {} > {} bytes".format(end, len(self.mm)))
+        with self.lock:
+            self.lock_seq += 1  # 奇数 : 写入中
+            write_lock(self.mm, self.lock_seq)
+            self.mm[HEADER.size:HEADER.size + len(data)] = data
+            self.mm[HEADER.size + len(data):end] = metrics_text
+            self.mm[FIELDS_OFFSET:HEADER.size] = FIELDS.pack(seq, len(data), len(metrics_text))
+            # 锁序号最后写入, 读取者看到偶数时头部及数据均已写完
+            self.lock_seq += 1
+            write_lock(self.mm, self.lock_seq)
+
+    def close(self):
+        self.mm.close()
+
+
+class SharedSnapshotReader(object):
+    """共享快照读取类 (HTTP工作进程)"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, mmap.MAP_SHARED, mmap.PROT_READ)
+        self.lock = threading.Lock()
+        self.cache = (None, None, "")  # (锁序号, 解码结果, 指标文本)
+
+    def read_raw(self):
+        """
+        读取一份完整的快照
+        :return: (锁序号, 快照序号, JSON, 指标文本), 尚未发布过快照时返回None
+        """
+        def read(lock_seq):
+            magic, version, _, seq, data_len, metrics_len = HEADER.unpack_from(self.mm, 0)
+            if magic != SHARED_SNAPSHOT_MAGIC or version != SHARED_SNAPSHOT_VERSION or lock_seq == 0 or not data_len:
+                return None
+            return (lock_seq, seq, self.mm[HEADER.size:HEADER.size + data_len],
+                    self.mm[HEADER.size + data_len:HEADER.size + data_len + metrics_len])
+
+        return seqlock_read(self.mm, read)
+
+    def read(self):
+        """
+        读取快照 (同一份快照只解码一次)
+        :return: ({"snapshot", "collectors", "sampling"}, 指标文本), 尚未发布过快照时返回 (None, "")
+        """
+        with self.lock:
+            raw = self.read_raw()
+            if raw is None:
+                return None, ""
+            lock_seq, _, data, metrics_text = raw
+            if self.cache[0] != lock_seq:
+                self.cache = (lock_seq, json.loads(data), metrics_text)
+            return self.cache[1], self.cache[2]
+
+    def close(self):
+        self.mm.close()
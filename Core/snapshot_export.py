@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 固定二进制格式的快照导出
+
+主要包括
+- 同一主机上的其他程序(自动扩缩容, 日志采集等)只需要少数几个数值时, 不必通过HTTP请求及解析JSON
+- 每次采样后将快照中的主要数值写入内存映射文件, 格式固定(按版本号区分), 读取时按偏移直接取值
+- 与共享快照(shared_snapshot)使用相同的顺序锁, 写入者不等待读取者, 读取者复制数据前后锁序号一致时数据完整
+- 读取类 SnapshotExportReader 供Python程序使用, 其他语言按下述格式读取即可
+
+文件格式 (版本 1, 本机字节序, 文件大小由进程容量决定; 修改容量后读取者需要重新打开文件)
+    头部 (40字节)     :   magic "WDSX"(4s) 版本(I) 锁序号(Q) 快照序号(Q) 采样时间(d) 进程数(I) 进程容量(I)
+    系统数值          :   len(EXPORT_SYS_FIELDS) 个 double, 顺序同 EXPORT_SYS_FIELDS, 无数据时为NaN
+    进程记录 (各64字节) :   进程号(I) 线程数(I) CPU占用率(d) 内存(M)(d) 读取速度(MB/s)(d) 写入速度(MB/s)(d)
+                          进程名(16s, 不足补0) 状态(c) 填充(7x); 按进程号升序排列, 共"进程数"条
+    锁序号为奇数时正在写入; 读取者读取锁序号 -> 复制数据 -> 再次读取锁序号, 两次相同且为偶数时数据有效
+
+参考资料
+reference   :   https://en.wikipedia.org/wiki/Seqlock
+"""
+
+import os
+import mmap
+import struct
+import threading
+
+from shared_snapshot import LOCK_OFFSET, write_lock, seqlock_read
+
+EXPORT_MAGIC = "WDSX"
+EXPORT_VERSION = 1  # 修改头部, 系统数值或进程记录格式时递增
+EXPORT_CAPACITY = 1024  # 默认进程记录容量
+
+EXPORT_HEADER = struct.Struct("=4sIQQdII")
+EXPORT_FIELDS = struct.Struct("=QdII")  # 头部中锁序号之后的部分 : 快照序号, 采样时间, 进程数, 进程容量
+EXPORT_FIELDS_OFFSET = LOCK_OFFSET + 8
+EXPORT_PROCESS = struct.Struct("=IIdddd16sc7x")
+EXPORT_VALUE = struct.Struct("=d")
+NAN = float("nan")
+
+# 系统数值 : (名称, 快照sys中的键路径)
+EXPORT_SYS_FIELDS = (
+    ("cpu_percent", ("cpu_percent",)),
+    ("mem_total_kb", ("mem", "total")),
+    ("mem_available_kb", ("mem", "available")),
+    ("mem_percent", ("mem", "percent")),
+    ("loadavg_1", ("loadavg", "lavg_1")),
+    ("loadavg_5", ("loadavg", "lavg_5")),
+    ("loadavg_15", ("loadavg", "lavg_15")),
+    ("net_upload_kbps", ("net", "upload_kbps")),
+    ("net_download_kbps", ("net", "download_kbps")),
+    ("io_read_MBs", ("io", "read_MBs")),
+    ("io_write_MBs", ("io", "write_MBs")),
+    ("pressure_cpu_some_avg10", ("pressure", "cpu", "some_avg10")),
+    ("pressure_memory_some_avg10", ("pressure", "memory", "some_avg10")),
+    ("pressure_memory_full_avg10", ("pressure", "memory", "full_avg10")),
+    ("pressure_io_some_avg10", ("pressure", "io", "some_avg10")),
+    ("pressure_io_full_avg10", ("pressure", "io", "full_avg10")),
+    ("pgmajfault_per_s", ("vmstat", "pgmajfault_per_s")),
+    ("pswpin_per_s", ("vmstat", "pswpin_per_s")),
+    ("pswpout_per_s", ("vmstat", "pswpout_per_s")),
+    ("oom_kill", ("vmstat", "oom_kill")),
+    ("tcp_total", ("sockets", "tcp_total")),
+    ("udp_total", ("sockets", "udp")),
+)
+EXPORT_SYS = struct.Struct("=" + "d" * len(EXPORT_SYS_FIELDS))
+EXPORT_SYS_OFFSET = EXPORT_HEADER.size
+EXPORT_PROCESS_OFFSET = EXPORT_SYS_OFFSET + EXPORT_SYS.size
+
+
+def export_size(capacity):
+    """导出文件大小(字节)"""
+    return EXPORT_PROCESS_OFFSET + capacity * EXPORT_PROCESS.size
+
+
+def get_value(data, path):
+    """按键路径取值, 不存在或不是数值时为NaN"""
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return NAN
+        data = data[key]
+    return float(data) if isinstance(data, (int, long, float)) else NAN
+
+
+class SnapshotExportWriter(object):
+    """快照导出写入类 (采样进程)"""
+
+    def __init__(self, path, capacity=EXPORT_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        size = export_size(capacity)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # 只扩大不缩小 : 读取者可能已映射了原来的文件, 缩小后读取超出文件末尾的部分会收到SIGBUS
+            os.ftruncate(fd, max(os.fstat(fd).st_size, size))
+            self.mm = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        self.lock = threading.Lock()
+        magic, _, lock_seq, _, _, _, _ = EXPORT_HEADER.unpack_from(self.mm, 0)
+        self.lock_seq = lock_seq + lock_seq % 2 if magic == EXPORT_MAGIC else 0
+        self.mm[:EXPORT_HEADER.size] = EXPORT_HEADER.pack(EXPORT_MAGIC, EXPORT_VERSION, self.lock_seq, 0, 0., 0,
+                                                          capacity)
+
+    def publish(self, snapshot):
+        """
+        导出快照
+        :return: 超出容量未导出的进程数
+        """
+        sys_data = snapshot.get("sys", {})
+        sys_values = EXPORT_SYS.pack(*[get_value(sys_data, path) for _, path in EXPORT_SYS_FIELDS])
+        processes = sorted(snapshot.get("process", {}).items(), key=lambda item: int(item[0]))
+        records = "".join(EXPORT_PROCESS.pack(
+            int(pid), data.get("threads") or 0, data.get("cpu_percent") or 0., data.get("mem_M") or 0.,
+            data.get("io_read_MBs") or 0., data.get("io_write_MBs") or 0., str(data.get("comm") or "")[:16],
+            str(data.get("state") or "?")[:1]) for pid, data in processes[:self.capacity])
+        with self.lock:
+            self.lock_seq += 1  # 奇数 : 写入中
+            write_lock(self.mm, self.lock_seq)
+            self.mm[EXPORT_SYS_OFFSET:EXPORT_PROCESS_OFFSET] = sys_values
+            self.mm[EXPORT_PROCESS_OFFSET:EXPORT_PROCESS_OFFSET + len(records)] = records
+            self.mm[EXPORT_FIELDS_OFFSET:EXPORT_HEADER.size] = EXPORT_FIELDS.pack(
+                snapshot["seq"], snapshot["timestamp"], min(len(processes), self.capacity), self.capacity)
+            self.lock_seq += 1
+            write_lock(self.mm, self.lock_seq)
+        return max(len(processes) - self.capacity, 0)
+
+    def close(self):
+        self.mm.close()
+
+
+class SnapshotExportReader(object):
+    """快照导出读取类 (同一主机上的其他程序)"""
+
+    # 系统数值名称 -> 文件中的偏移
+    SYS_OFFSETS = dict((name, EXPORT_SYS_OFFSET + i * EXPORT_VALUE.size)
+                       for i, (name, _) in enumerate(EXPORT_SYS_FIELDS))
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, mmap.MAP_SHARED, mmap.PROT_READ)
+        magic, version = struct.unpack_from("=4sI", self.mm, 0)
+        if magic != EXPORT_MAGIC or version != EXPORT_VERSION:
+            raise ValueError("unsupported snapshot export {!r} version {} (expect {!r} version {})".format(
+                magic, version, EXPORT_MAGIC, EXPORT_VERSION))
+
+    def read_header(self):
+        """:return: (快照序号, 采样时间, 进程数), 尚未导出过快照时快照序号为0"""
+        return seqlock_read(self.mm, lambda lock_seq: EXPORT_FIELDS.unpack_from(self.mm, EXPORT_FIELDS_OFFSET)[:3])
+
+    def get(self, name):
+        """单个系统数值 (如 "cpu_percent"), 无数据时为NaN"""
+        offset = self.SYS_OFFSETS[name]
+        return seqlock_read(self.mm, lambda lock_seq: EXPORT_VALUE.unpack_from(self.mm, offset)[0])
+
+    def get_sys(self):
+        """所有系统数值 {"seq", "timestamp", 名称: 数值}"""
+        def read(lock_seq):
+            return (EXPORT_FIELDS.unpack_from(self.mm, EXPORT_FIELDS_OFFSET),
+                    EXPORT_SYS.unpack_from(self.mm, EXPORT_SYS_OFFSET))
+
+        (seq, timestamp, _, _), values = seqlock_read(self.mm, read)
+        result = dict(zip((name for name, _ in EXPORT_SYS_FIELDS), values))
+        result.update(seq=seq, timestamp=timestamp)
+        return result
+
+    def get_process(self, pid):
+        """单个进程的数据 (按进程号二分查找), 进程未被监测时返回None"""
+        pid = int(pid)
+
+        def read(lock_seq):
+            low, high = 0, EXPORT_FIELDS.unpack_from(self.mm, EXPORT_FIELDS_OFFSET)[2]
+            while low < high:
+                middle = (low + high) // 2
+                offset = EXPORT_PROCESS_OFFSET + middle * EXPORT_PROCESS.size
+                record_pid = struct.unpack_from("=I", self.mm, offset)[0]
+                if record_pid == pid:
+                    return EXPORT_PROCESS.unpack_from(self.mm, offset)
+                if record_pid < pid:
+                    low = middle + 1
+                else:
+                    high = middle
+            return None
+
+        record = seqlock_read(self.mm, read)
+        return self.process_dict(record) if record is not None else None
+
+    def get_processes(self):
+        """所有进程的数据 (按进程号升序)"""
+        def read(lock_seq):
+            count = EXPORT_FIELDS.unpack_from(self.mm, EXPORT_FIELDS_OFFSET)[2]
+            return self.mm[EXPORT_PROCESS_OFFSET:EXPORT_PROCESS_OFFSET + count * EXPORT_PROCESS.size]
+
+        data = seqlock_read(self.mm, read)
+        return [self.process_dict(EXPORT_PROCESS.unpack_from(data, offset))
+                for offset in xrange(0, len(data), EXPORT_PROCESS.size)]
+
+    @staticmethod
+    def process_dict(record):
+        pid, threads, cpu_percent, mem_M, io_read_MBs, io_write_MBs, comm, state = record
+        return {"pid": pid, "threads": threads, "cpu_percent": cpu_percent, "mem_M": mem_M,
+                "io_read_MBs": io_read_MBs, "io_write_MBs": io_write_MBs, "comm": comm.rstrip("\0"), "state": state}
+
+    def close(self):
+        self.mm.close()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 套接字及连接统计
+
+不依赖libnethogs及root权限的轻量网络统计
+- 每个采样周期逐行解析一次 /proc/net/{tcp,tcp6,udp,udp6} (不整体读入内存, 可以应对十万级套接字)
+- 按状态统计整机TCP连接数及UDP套接字数
+- 解析 /proc/net/snmp 计算TCP/UDP计数速率(重传, 建连, 错误等)
+- 只为被监测进程建立 套接字inode -> 进程号 映射 (读取 /proc/[pid]/fd, 并缓存已解析的fd)
+- 上次出现在套接字表中, 本次已不存在的inode(套接字已关闭, fd号可能已被新的套接字复用), 重新解析其fd,
+  更新后的映射在下一次采样时使用 (不重复解析套接字表; unix, netlink等不在表中的套接字不会被反复解析)
+- 统计被监测进程的各状态连接数, UDP套接字数及当前未确认的重传次数
+
+参考资料
+reference   :   https://www.kernel.org/doc/Documentation/networking/proc_net_tcp.txt
+reference   :   https://github.com/torvalds/linux/blob/master/include/net/tcp_states.h
+"""
+
+import os
+import threading
+from time import time
+
+from path_resolver import path_resolver
+
+FD_CACHE_REFRESH = 12  # 每隔多少次采样完整重新解析一次进程fd (防止非套接字的fd号被复用为套接字导致缓存过期)
+
+TCP_STATES = {
+    "01": "ESTABLISHED", "02": "SYN_SENT", "03": "SYN_RECV", "04": "FIN_WAIT1", "05": "FIN_WAIT2",
+    "06": "TIME_WAIT", "07": "CLOSE", "08": "CLOSE_WAIT", "09": "LAST_ACK", "0A": "LISTEN", "0B": "CLOSING",
+}
+
+# /proc/net/snmp 中关注的计数 : (协议, 字段, 结果名)
+SNMP_COUNTERS = (
+    ("Tcp", "ActiveOpens", "tcp_active_opens"),
+    ("Tcp", "PassiveOpens", "tcp_passive_opens"),
+    ("Tcp", "AttemptFails", "tcp_attempt_fails"),
+    ("Tcp", "EstabResets", "tcp_estab_resets"),
+    ("Tcp", "InSegs", "tcp_in_segs"),
+    ("Tcp", "OutSegs", "tcp_out_segs"),
+    ("Tcp", "RetransSegs", "tcp_retrans_segs"),
+    ("Tcp", "InErrs", "tcp_in_errs"),
+    ("Udp", "InDatagrams", "udp_in_datagrams"),
+    ("Udp", "OutDatagrams", "udp_out_datagrams"),
+    ("Udp", "InErrors", "udp_in_errors"),
+    ("Udp", "RcvbufErrors", "udp_rcvbuf_errors"),
+    ("Udp", "SndbufErrors", "udp_sndbuf_errors"),
+)
+
+
+def read_snmp(path):
+    """读取 /proc/net/snmp {协议: {字段: 值}} (每个协议两行, 第一行为字段名, 第二行为值)"""
+    result = {}
+    with open(path, "r") as snmp:
+        lines = snmp.readlines()
+    for header, values in zip(lines[0::2], lines[1::2]):
+        protocol = header.split(":", 1)[0]
+        result[protocol] = dict(zip(header.split()[1:], map(int, values.split()[1:])))
+    return result
+
+
+def scan_socket_table(path, inode_pids, tcp=True, seen=None):
+    """
+    逐行解析 /proc/net/{tcp,tcp6,udp,udp6}
+    :param inode_pids: 被监测进程的 套接字inode -> 进程号
+    :param seen: 不为None时, 表中出现的被监测进程的套接字inode加入此集合
+    :return: (整机 {状态: 数量}, {进程号: {"states": {状态: 数量}, "retransmits": 重传次数}})
+    """
+    host, processes = {}, {}
+    try:
+        f = open(path, "r")
+    except IOError:  # 未启用IPv6等情况
+        return host, processes
+    with f:
+        f.readline()  # 表头
+        for line in f:
+            # sl local_address rem_address st tx_queue:rx_queue tr:tm->when retrnsmt uid timeout inode ...
+            fields = line.split(None, 10)
+            if len(fields) < 10:
+                continue
+            state = TCP_STATES.get(fields[3], fields[3]) if tcp else "UDP"
+            host[state] = host.get(state, 0) + 1
+            pid = inode_pids.get(fields[9])
+            if pid is not None:
+                if seen is not None:
+                    seen.add(fields[9])
+                process = processes.setdefault(pid, {"states": {}, "retransmits": 0})
+                process["states"][state] = process["states"].get(state, 0) + 1
+                process["retransmits"] += int(fields[6], 16)
+    return host, processes
+
+
+def socket_inode(target):
+    """fd链接目标中的套接字inode (套接字的链接目标形如 socket:[12345]), 非套接字返回None"""
+    return target[8:-1] if target.startswith("socket:[") else None
+
+
+class SocketMonitor(object):
+    """套接字及连接统计类"""
+
+    def __init__(self, net_path=None, proc_path=None):
+        """
+        :param net_path: /proc/net 路径, 为None时使用根目录中的网络命名空间
+        :param proc_path: /proc 路径, 为None时使用根目录
+        """
+        self.net_path = net_path or path_resolver.proc_ns("net")
+        self.proc_path = proc_path or path_resolver.proc()
+        self.lock = threading.Lock()
+        self.fd_cache = {}  # 进程号 -> {fd: 套接字inode(非套接字为None)}
+        self.seen_inodes = set()  # 上次解析套接字表时出现的被监测进程的套接字inode
+        self.ticks = 0
+        self.prev_snmp = {}
+        self.prev_snmp_time = 0
+
+    def get_process_socket_inodes(self, pid, refresh=False):
+        """
+        获取进程的所有套接字inode (只解析新出现的fd, refresh为True时全部重新解析)
+        进程不存在或无权限时返回空集合
+        """
+        fd_dir = os.path.join(self.proc_path, str(pid), "fd")
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            self.fd_cache.pop(pid, None)
+            return set()
+        cached = {} if refresh else self.fd_cache.get(pid, {})
+        current = {}
+        for fd in fds:
+            if fd in cached:
+                current[fd] = cached[fd]
+                continue
+            try:
+                target = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:  # fd已关闭
+                continue
+            current[fd] = socket_inode(target)
+        self.fd_cache[pid] = current
+        return set(inode for inode in current.values() if inode is not None)
+
+    def build_inode_map(self, pids):
+        """建立被监测进程的 套接字inode -> 进程号 映射"""
+        refresh = self.ticks % FD_CACHE_REFRESH == 0
+        inode_pids = {}
+        for pid in pids:
+            for inode in self.get_process_socket_inodes(pid, refresh):
+                inode_pids[inode] = pid
+        # 清理已不再监测的进程
+        for pid in set(self.fd_cache.keys()) - set(pids):
+            self.fd_cache.pop(pid)
+        return inode_pids
+
+    def revalidate_fd_cache(self, pids, seen):
+        """
+        重新解析上次出现在套接字表中, 本次已不存在的inode对应的fd (套接字已关闭, fd号可能已被复用为新的套接字)
+        从未出现在表中的套接字(unix, netlink等)不重新解析; 更新后的缓存在下一次采样时生效
+        :param seen: 本次解析套接字表时出现的inode
+        """
+        closed = self.seen_inodes - seen
+        self.seen_inodes = seen
+        if not closed:
+            return
+        for pid in pids:
+            cached = self.fd_cache.get(pid)
+            if not cached:
+                continue
+            fd_dir = os.path.join(self.proc_path, str(pid), "fd")
+            for fd, inode in cached.items():
+                if inode not in closed:
+                    continue
+                try:
+                    cached[fd] = socket_inode(os.readlink(os.path.join(fd_dir, fd)))
+                except OSError:  # fd已关闭
+                    del cached[fd]
+
+    def scan_tables(self, pids, inode_pids, seen):
+        """
+        解析 /proc/net/{tcp,tcp6,udp,udp6}
+        :return: (整机TCP {状态: 数量}, 整机UDP套接字数, 被监测进程的数据)
+        """
+        tcp_states, udp_total = {}, 0
+        processes = dict((pid, {"tcp": {}, "udp": 0, "retransmits": 0}) for pid in pids)
+        for name, tcp in (("tcp", True), ("tcp6", True), ("udp", False), ("udp6", False)):
+            host, per_process = scan_socket_table(os.path.join(self.net_path, name), inode_pids, tcp, seen)
+            for pid, data in per_process.items():
+                if tcp:
+                    for state, count in data["states"].items():
+                        processes[pid]["tcp"][state] = processes[pid]["tcp"].get(state, 0) + count
+                    processes[pid]["retransmits"] += data["retransmits"]
+                else:
+                    processes[pid]["udp"] += data["states"].get("UDP", 0)
+            if tcp:
+                for state, count in host.items():
+                    tcp_states[state] = tcp_states.get(state, 0) + count
+            else:
+                udp_total += host.get("UDP", 0)
+        return tcp_states, udp_total, processes
+
+    def calc_snmp_rates(self):
+        """计算 /proc/net/snmp 计数速率(每秒), 以及TCP重传率(重传报文/发送报文, %)"""
+        snmp = read_snmp(os.path.join(self.net_path, "snmp"))
+        current_time = time()
+        current = {}
+        for protocol, field, name in SNMP_COUNTERS:
+            if field in snmp.get(protocol, {}):
+                current[name] = snmp[protocol][field]
+        prev, interval = self.prev_snmp, current_time - self.prev_snmp_time
+        self.prev_snmp, self.prev_snmp_time = current, current_time
+
+        result = {"tcp_curr_estab": snmp.get("Tcp", {}).get("CurrEstab")}
+        for name, value in current.items():
+            if name not in prev or interval <= 0:  # 未初始化
+                result[name + "_per_s"] = 0.
+            else:
+                result[name + "_per_s"] = round(max(value - prev[name], 0) / interval, 2)
+        out_segs = result.get("tcp_out_segs_per_s")
+        result["tcp_retrans_percent"] = \
+            round(result.get("tcp_retrans_segs_per_s", 0) * 100. / out_segs, 2) if out_segs else 0.
+        return result
+
+    def collect(self, pids):
+        """
+        统计整机及被监测进程的套接字数据
+        :param pids: 被监测的进程号
+        :return: (整机数据, {进程号: {"tcp": {状态: 数量}, "udp": 数量, "retransmits": 重传次数}})
+        """
+        with self.lock:
+            pids = [int(pid) for pid in pids]
+            inode_pids = self.build_inode_map(pids)
+            self.ticks += 1
+            seen = set()
+            tcp_states, udp_total, processes = self.scan_tables(pids, inode_pids, seen)
+            self.revalidate_fd_cache(pids, seen)
+
+            host_data = {"tcp": tcp_states, "tcp_total": sum(tcp_states.values()), "udp": udp_total}
+            try:
+                host_data["snmp"] = self.calc_snmp_rates()
+            except IOError:
+                host_data["snmp"] = {}
+        return host_data, processes
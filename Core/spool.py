@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 快照缓冲(store-and-forward)
+
+服务端不可用期间, 采样快照暂存在本地有界缓冲中, 服务端恢复后通过 /sync?since=<seq> 按序号补齐
+- 缓冲满时将最早的若干条记录压缩为一条汇总记录(rollup), 保留各数值的平均值/最小值/最大值
+- 汇总记录可以被再次压缩, 因此缓冲总能覆盖尽量长的时间范围, 只是越早的数据粒度越粗
+
+缓冲记录结构
+    原始记录 : {"kind": "sample", "seq", "timestamp", "data": 快照}
+    汇总记录 : {"kind": "rollup", "seq"(最后一条序号), "first_seq", "timestamp", "first_timestamp", "count",
+               "data": {指标名: {"avg", "min", "max"}}}
+"""
+
+import threading
+from collections import deque
+
+from metric_store import flatten_snapshot
+
+SPOOL_SIZE = 720  # 最多保留的记录数
+SPOOL_ROLLUP = 12  # 每次压缩的记录数
+
+
+def to_rollup(entry):
+    """将记录转换为汇总记录格式"""
+    if entry["kind"] == "rollup":
+        return entry
+    values = flatten_snapshot(dict((key, entry["data"].get(key, {}))
+                                   for key in ("sys", "process", "process_groups", "cgroups")))
+    return {"kind": "rollup", "seq": entry["seq"], "first_seq": entry["seq"], "timestamp": entry["timestamp"],
+            "first_timestamp": entry["timestamp"], "count": 1,
+            "data": dict((name, {"avg": value, "min": value, "max": value}) for name, value in values.items())}
+
+
+def merge_rollups(entries):
+    """合并多条记录为一条汇总记录 (平均值按记录数加权)"""
+    rollups = [to_rollup(e) for e in entries]
+    merged = {"kind": "rollup", "seq": rollups[-1]["seq"], "first_seq": rollups[0]["first_seq"],
+              "timestamp": rollups[-1]["timestamp"], "first_timestamp": rollups[0]["first_timestamp"],
+              "count": sum(r["count"] for r in rollups), "data": {}}
+    weights = {}
+    for r in rollups:
+        for name, v in r["data"].items():
+            if name not in merged["data"]:
+                merged["data"][name] = dict(v)
+                weights[name] = r["count"]
+                continue
+            m = merged["data"][name]
+            total = weights[name] + r["count"]
+            m["avg"] = (m["avg"] * weights[name] + v["avg"] * r["count"]) / float(total)
+            m["min"], m["max"] = min(m["min"], v["min"]), max(m["max"], v["max"])
+            weights[name] = total
+    return merged
+
+
+class SnapshotSpool(object):
+    """快照缓冲"""
+
+    def __init__(self, size=SPOOL_SIZE, rollup=SPOOL_ROLLUP):
+        self.size = max(size, 2)
+        self.rollup = max(min(rollup, self.size), 2)
+        self.entries = deque()
+        self.lock = threading.Lock()
+
+    def push(self, snapshot):
+        """加入一条快照"""
+        with self.lock:
+            self.entries.append({"kind": "sample", "seq": snapshot["seq"], "timestamp": snapshot["timestamp"],
+                                 "data": snapshot})
+            if len(self.entries) > self.size:
+                self.compact()
+
+    def compact(self):
+        """
+        压缩缓冲 : 将最早的 rollup 条原始记录压缩为一条汇总记录;
+        汇总记录已占据一半缓冲时, 改为将最早的 rollup 条汇总记录再次压缩
+        """
+        entries = list(self.entries)
+        rollups = 0
+        while rollups < len(entries) and entries[rollups]["kind"] == "rollup":
+            rollups += 1
+        start = 0 if rollups >= self.size // 2 else rollups
+        entries[start:start + self.rollup] = [merge_rollups(entries[start:start + self.rollup])]
+        self.entries = deque(entries)
+
+    def since(self, seq):
+        """获取序号大于 seq 的记录(按序号排列), 包含 seq 的汇总记录也会返回"""
+        with self.lock:
+            return [e for e in self.entries if e["seq"] > seq]
+
+    def first_seq(self):
+        """缓冲中最早的序号"""
+        with self.lock:
+            if not self.entries:
+                return None
+            return self.entries[0].get("first_seq", self.entries[0]["seq"])
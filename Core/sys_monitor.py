@@ -13,6 +13,7 @@
 - 系统总内存
 - 系统启动时间
 - 系统平均负载
+- 资源压力(PSI)及虚拟内存事件(缺页, 换入换出, OOM)
 - 系统磁盘占用
 
 参考资料
@@ -26,14 +27,43 @@ code & doc  :   https://github.com/h-j-13/Watch_Dogs/blob/master/Watch_Dogs/Core
 import re
 import socket
 import urllib2
-from os import statvfs
+from collections import OrderedDict
 from time import sleep, time, strftime, localtime
 
 from prcess_exception import wrap_process_exceptions
+from proc_file import proc_file_cache
+from path_resolver import proc_path, sys_path, proc_ns_path
+from mount_monitor import MountTable, StatvfsPool, is_remote_fs, is_special_fs, STATVFS_TIMEOUT
 
 CALC_FUNC_INTERVAL = 2  # 通用调用函数间隔(秒)
 SECTOR_SIZE_FALLBACK = 512  # 默认扇区大小 512
 
+# /proc/net/dev 各列下标 (前8列为接收 bytes packets errs drop fifo frame compressed multicast,
+# 后8列为发送 bytes packets errs drop fifo colls carrier compressed)
+NET_RX_BYTES, NET_RX_PACKETS, NET_RX_ERRS, NET_RX_DROP = 0, 1, 2, 3
+NET_TX_BYTES, NET_TX_PACKETS, NET_TX_ERRS, NET_TX_DROP = 8, 9, 10, 11
+
+PRESSURE_RESOURCES = ("cpu", "memory", "io")  # /proc/pressure/ 下的资源
+VMSTAT_KEYS = ("pgmajfault", "pswpin", "pswpout", "oom_kill")  # 关注的 /proc/vmstat 计数
+
+
+def split_baselines(baselines, prefix):
+    """
+    取出以 prefix 开头的计算基准, 按最后一个"."拆分 (网卡名等名称中可能含有".")
+    {prefix + "名称.字段": 值} -> {名称: {字段: 值}}
+    """
+    result = {}
+    for key, value in baselines.items():
+        if key.startswith(prefix):
+            name, _, field = key[len(prefix):].rpartition(".")
+            result.setdefault(name, {})[field] = value
+    return result
+
+
+def counter_list(fields):
+    """{下标: 值} -> 按下标排列的整数计数列表"""
+    return [int(value) for _, value in sorted((int(index), value) for index, value in fields.items())]
+
 
 class SysMonitor(object):
     """系统监视模块"""
@@ -48,25 +78,119 @@ class SysMonitor(object):
         return cls._instance
 
     def __init__(self):
+        self.boot_time = None
         self.prev_cpu_work_time = 0
         self.prev_cpu_total_time = 0
         self.prev_cpu_time_by_cores = {}
         self.prev_net_receive_byte = 0
         self.prev_net_send_byte = 0
         self.prev_net_time = 0
+        self.prev_net_dev_counters = {}
+        self.prev_net_dev_time = 0
         self.prev_disk_time = 0
         self.prev_disk_rbytes = 0
         self.prev_disk_wbytes = 0
+        self.prev_disk_io_counters = {}
+        self.prev_disk_io_time = 0
+        self.prev_pressure = {}
+        self.prev_pressure_time = 0
+        self.prev_vmstat = {}
+        self.prev_vmstat_time = 0
+        self.disk_device_key = None  # /proc/diskstats 中的设备列表, 用于判断分区是否变化
+        self.disk_sector_sizes = {}  # 分区 -> 扇区大小
+        # 挂载表缓存及statvfs线程池 (单例重复初始化时沿用, 避免重复创建线程)
+        self.mount_table = getattr(self, "mount_table", None) or MountTable()
+        self.statvfs_pool = getattr(self, "statvfs_pool", None) or StatvfsPool()
+        self.disk_stat_pending = []  # 尚未返回statvfs结果的挂载点
 
     @wrap_process_exceptions
     def get_total_cpu_time(self):
         """获取总cpu时间 - /proc/stat"""
 
-        with open("/proc/stat", "r") as cpu_stat:
-            total_cpu_time = cpu_stat.readline().replace('cpu', '').strip()
-            user, nice, system, idle, iowait, irq, softirq, steal, guest, guestnice = \
-                map(int, total_cpu_time.split(' '))
-            return user + nice + system + idle + iowait + irq + softirq + steal, user + nice + system
+        total_cpu_time = proc_file_cache.read(proc_path("stat")).split("\n", 1)[0].replace('cpu', '').strip()
+        user, nice, system, idle, iowait, irq, softirq, steal, guest, guestnice = \
+            map(int, total_cpu_time.split(' '))
+        return user + nice + system + idle + iowait + irq + softirq + steal, user + nice + system
+
+    @wrap_process_exceptions
+    def get_boot_time(self):
+        """获取系统启动时间(unix时间戳) - /proc/stat"""
+        if self.boot_time:
+            return self.boot_time
+
+        with open(proc_path("stat"), "r") as cpu_stat:
+            for line in cpu_stat:
+                if line.startswith("btime"):
+                    self.boot_time = int(line.split()[1])
+
+        return self.boot_time
+
+    def get_baselines(self):
+        """获取各计算函数上次记录的数据 (持久化后用于重启时恢复, 避免重启后第一次计算结果为0)"""
+        baselines = {
+            "btime": self.get_boot_time(),
+            "cpu_total_time": self.prev_cpu_total_time,
+            "cpu_work_time": self.prev_cpu_work_time,
+            "net_receive_byte": self.prev_net_receive_byte,
+            "net_send_byte": self.prev_net_send_byte,
+            "net_time": self.prev_net_time,
+            "disk_rbytes": self.prev_disk_rbytes,
+            "disk_wbytes": self.prev_disk_wbytes,
+            "disk_time": self.prev_disk_time,
+        }
+        for cpu_name, (total_time, work_time) in self.prev_cpu_time_by_cores.items():
+            baselines["core_total_time." + cpu_name] = total_time
+            baselines["core_work_time." + cpu_name] = work_time
+        # 采样使用的各网卡/各分区计数, 资源压力及虚拟内存事件计数
+        baselines["net_dev_time"] = self.prev_net_dev_time
+        for device, counters in self.prev_net_dev_counters.items():
+            for index, value in enumerate(counters):
+                baselines["net_dev.{}.{}".format(device, index)] = value
+        baselines["disk_io_time"] = self.prev_disk_io_time
+        for name, counters in self.prev_disk_io_counters.items():
+            for index, value in enumerate(counters):
+                baselines["disk_io.{}.{}".format(name, index)] = value
+        baselines["pressure_time"] = self.prev_pressure_time
+        for resource, kinds in self.prev_pressure.items():
+            for kind, values in kinds.items():
+                baselines["pressure.{}.{}".format(resource, kind)] = values["total"]
+        baselines["vmstat_time"] = self.prev_vmstat_time
+        for key, value in self.prev_vmstat.items():
+            baselines["vmstat." + key] = value
+        return baselines
+
+    def load_baselines(self, baselines):
+        """恢复各计算函数的上次记录 (系统重启过则计数器已清零, 不恢复)"""
+        if not baselines or baselines.get("btime") != self.get_boot_time():
+            return False
+        self.prev_cpu_total_time = int(baselines.get("cpu_total_time", 0))
+        self.prev_cpu_work_time = int(baselines.get("cpu_work_time", 0))
+        self.prev_net_receive_byte = int(baselines.get("net_receive_byte", 0))
+        self.prev_net_send_byte = int(baselines.get("net_send_byte", 0))
+        self.prev_net_time = baselines.get("net_time", 0)
+        self.prev_disk_rbytes = int(baselines.get("disk_rbytes", 0))
+        self.prev_disk_wbytes = int(baselines.get("disk_wbytes", 0))
+        self.prev_disk_time = baselines.get("disk_time", 0)
+        self.prev_cpu_time_by_cores = {}
+        for name, value in baselines.items():
+            if name.startswith("core_total_time."):
+                cpu_name = name.split(".", 1)[1]
+                self.prev_cpu_time_by_cores[cpu_name] = [int(value),
+                                                         int(baselines.get("core_work_time." + cpu_name, 0))]
+        self.prev_net_dev_time = baselines.get("net_dev_time", 0)
+        self.prev_net_dev_counters = OrderedDict(
+            (device, counter_list(fields)) for device, fields in split_baselines(baselines, "net_dev.").items())
+        self.prev_disk_io_time = baselines.get("disk_io_time", 0)
+        self.prev_disk_io_counters = dict(
+            (name, tuple(counter_list(fields))) for name, fields in split_baselines(baselines, "disk_io.").items())
+        self.prev_pressure_time = baselines.get("pressure_time", 0)
+        self.prev_pressure = dict(
+            (resource, dict((kind, {"total": int(total)}) for kind, total in kinds.items()))
+            for resource, kinds in split_baselines(baselines, "pressure.").items())
+        self.prev_vmstat_time = baselines.get("vmstat_time", 0)
+        self.prev_vmstat = dict((key[len("vmstat."):], int(value)) for key, value in baselines.items()
+                                if key.startswith("vmstat."))
+        return True
 
     def calc_cpu_percent(self):
         """计算CPU总占用率 (返回的是百分比)"""
@@ -75,6 +199,8 @@ class SysMonitor(object):
             self.prev_cpu_total_time, self.prev_cpu_work_time = self.get_total_cpu_time()
             return 0.
         current_total_time, current_work_time = self.get_total_cpu_time()
+        if current_total_time == self.prev_cpu_total_time:  # 为了防止两次计算间隔特别快的情况
+            return 0.
         cpu_percent = round((current_work_time - self.prev_cpu_work_time) * 100.0 \
                             / (current_total_time - self.prev_cpu_total_time), 2)
         self.prev_cpu_total_time, self.prev_cpu_work_time = current_total_time, current_work_time
@@ -85,15 +211,14 @@ class SysMonitor(object):
         """获取各核心cpu时间 - /proc/stat"""
         cpu_total_times = {}
 
-        with open("/proc/stat", "r") as cpu_stat:
-            for line in cpu_stat:
-                if line.startswith("cpu"):
-                    cpu_name = line.split(' ')[0].strip()
-                    if cpu_name != "cpu":
-                        user, nice, system, idle, iowait, irq, softirq, steal, guest, guestnice = \
-                            map(int, line.split(' ')[1:])
-                        cpu_total_times[cpu_name] = [user + nice + system + idle + iowait + irq + softirq + steal,
-                                                     user + nice + system]
+        for line in proc_file_cache.read(proc_path("stat")).splitlines():
+            if line.startswith("cpu"):
+                cpu_name = line.split(' ')[0].strip()
+                if cpu_name != "cpu":
+                    user, nice, system, idle, iowait, irq, softirq, steal, guest, guestnice = \
+                        map(int, line.split(' ')[1:])
+                    cpu_total_times[cpu_name] = [user + nice + system + idle + iowait + irq + softirq + steal,
+                                                 user + nice + system]
 
         return cpu_total_times
 
@@ -108,6 +233,10 @@ class SysMonitor(object):
         else:
             current_cpu_time_by_cores = self.get_cpu_total_time_by_cores()
             for cpu_name in current_cpu_time_by_cores.keys():
+                if cpu_name not in self.prev_cpu_time_by_cores or \
+                        current_cpu_time_by_cores[cpu_name][0] == self.prev_cpu_time_by_cores[cpu_name][0]:
+                    cpu_percent_by_cores[cpu_name] = 0.  # 新上线的核心 / 两次计算间隔特别快
+                    continue
                 cpu_percent_by_cores[cpu_name] = round(
                     (current_cpu_time_by_cores[cpu_name][1] - self.prev_cpu_time_by_cores[cpu_name][1]) * 100.0 / \
                     (current_cpu_time_by_cores[cpu_name][0] - self.prev_cpu_time_by_cores[cpu_name][0]), 2)
@@ -119,12 +248,12 @@ class SysMonitor(object):
     def get_mem_info(self):
         """获取内存信息 - /proc/meminfo"""
 
-        with open("/proc/meminfo", "r") as mem_info:
-            MemTotal = mem_info.readline().split(":")[1].strip().strip("kB")
-            MemFree = mem_info.readline().split(":")[1].strip().strip("kB")
-            MemAvailable = mem_info.readline().split(":")[1].strip().strip("kB")
-            # 只需要前三行
-            return map(int, [MemTotal, MemFree, MemAvailable])
+        # 只需要前三行
+        mem_info = proc_file_cache.read(proc_path("meminfo")).split("\n", 3)
+        MemTotal = mem_info[0].split(":")[1].strip().strip("kB")
+        MemFree = mem_info[1].split(":")[1].strip().strip("kB")
+        MemAvailable = mem_info[2].split(":")[1].strip().strip("kB")
+        return map(int, [MemTotal, MemFree, MemAvailable])
 
     def calc_mem_percent(self):
         """计算系统内存占用率 (返回的是百分比)"""
@@ -133,6 +262,18 @@ class SysMonitor(object):
         return mem_percent
 
     @wrap_process_exceptions
+    def get_net_dev_counters(self):
+        """获取所有网卡的计数器(一次读取,网卡名精确匹配) - /proc/net/dev"""
+        counters = OrderedDict()
+
+        for line in proc_file_cache.read(proc_ns_path("net", "dev")).splitlines():
+            # 前两行为表头, 不含 ":"
+            device, sep, data = line.partition(":")
+            if sep:
+                counters[device.strip()] = map(int, data.split())
+
+        return counters
+
     def get_all_net_device(self):
         """获取所有网卡(不包括本地回环)"""
 
@@ -145,44 +286,33 @@ class SysMonitor(object):
         # ppp0      -   ppp拨号
         # tpp0      -   ...
 
-        devices = []
-        with open("/proc/net/dev", "r") as net_dev:
-            for line in net_dev:
-                if not line.count("lo:") and line.count(":"):
-                    devices.append(line.split(":")[0].strip())
-
-        return devices
+        return [device for device in self.get_net_dev_counters().keys() if device != "lo"]
 
     def get_default_net_device(self):
         """获取默认网卡 - 默认选取流量最大的网卡作为默认监控网卡(本地回环除外)"""
-        devices = self.get_all_net_device()
+        counters = self.get_net_dev_counters()
+        counters.pop("lo", None)
         default_net_device = "eth0"
 
-        if default_net_device in devices:
+        if default_net_device in counters:
             return default_net_device
 
         else:  # 获取流量最大的网卡作为默认网卡
             temp_d = ''
             max_byte = -1
-            for device_name in devices:
-                if max_byte < sum(self.get_net_dev_data(device_name)):
-                    max_byte = self.get_net_dev_data(device_name)
+            for device_name, data in counters.items():
+                if max_byte < data[NET_RX_BYTES] + data[NET_TX_BYTES]:
+                    max_byte = data[NET_RX_BYTES] + data[NET_TX_BYTES]
                     temp_d = device_name
             return temp_d
 
-    @wrap_process_exceptions
     def get_net_dev_data(self, device):
         """获取系统网络数据(某一网卡) -  /proc/net/dev"""
-        receive_bytes = -1
-        send_bytes = -1
-        with open("/proc/net/dev", "r") as net_dev:
-            for line in net_dev:
-                if line.find(device) != -1:
-                    dev_data = map(int, filter(lambda x: x, line.split(":", 2)[1].strip().split(" ")))
-                    receive_bytes += dev_data[0]
-                    send_bytes += dev_data[8]
+        dev_data = self.get_net_dev_counters().get(device)
+        if not dev_data:
+            return -1, -1
 
-        return receive_bytes, send_bytes
+        return dev_data[NET_RX_BYTES], dev_data[NET_TX_BYTES]
 
     @wrap_process_exceptions
     def calc_net_speed(self, device_name=None):
@@ -206,13 +336,47 @@ class SysMonitor(object):
         self.prev_net_time = current_net_time
         return upload_speed, download_speed
 
+    def calc_net_speed_by_devices(self):
+        """
+        计算所有网卡的网络速率 (只读取一次/proc/net/dev)
+        :return: {网卡: {上传,下载速度(Kbps), 收发包数/错误数/丢包数(每秒)}}
+        """
+        current_counters = self.get_net_dev_counters()
+        current_time = time()
+        prev_counters, interval = self.prev_net_dev_counters, current_time - self.prev_net_dev_time
+        self.prev_net_dev_counters, self.prev_net_dev_time = current_counters, current_time
+        if interval <= 0:  # 为了防止两次计算间隔特别快的情况
+            interval = 1.
+
+        def rate(current, prev, index, unit=1.):
+            # 计数器被重置(如网卡重建)时差值为负, 按0处理
+            return round(max(current[index] - prev[index], 0) / unit / interval, 2)
+
+        net_speed = OrderedDict()
+        for device, data in current_counters.items():
+            prev_data = prev_counters.get(device)
+            if not prev_data:  # 未初始化或新出现的网卡
+                prev_data = data
+            net_speed[device] = {
+                "upload_kbps": rate(data, prev_data, NET_TX_BYTES, 1024.),
+                "download_kbps": rate(data, prev_data, NET_RX_BYTES, 1024.),
+                "rx_packets": rate(data, prev_data, NET_RX_PACKETS),
+                "tx_packets": rate(data, prev_data, NET_TX_PACKETS),
+                "rx_errs": rate(data, prev_data, NET_RX_ERRS),
+                "tx_errs": rate(data, prev_data, NET_TX_ERRS),
+                "rx_drop": rate(data, prev_data, NET_RX_DROP),
+                "tx_drop": rate(data, prev_data, NET_TX_DROP),
+            }
+
+        return net_speed
+
     @wrap_process_exceptions
     def get_cpu_info(self):
         """系统CPU信息 - /proc/cpuinfo"""
 
         result = []
         c = ""
-        with open("/proc/cpuinfo", "r") as cpuinfo:
+        with open(proc_path("cpuinfo"), "r") as cpuinfo:
             for line in cpuinfo:
                 if line.startswith("processor"):
                     c = ""
@@ -232,7 +396,7 @@ class SysMonitor(object):
         """系统信息 - /proc/version"""
 
         sys_info = {"kernel": "", "system": ""}
-        with open("/proc/version", "r") as version:
+        with open(proc_path("version"), "r") as version:
             sys_info_data = version.readline()
         sys_info["kernel"] = sys_info_data.split('(')[0].strip()
         sys_info["system"] = sys_info_data.split('(')[3].split(')')[0].strip()
@@ -254,12 +418,93 @@ class SysMonitor(object):
         """获取系统平均负载 - /proc/loadavg"""
 
         la = {}
-        with open("/proc/loadavg", "r") as loadavg:
-            la['lavg_1'], la['lavg_5'], la['lavg_15'], la['nr'], la['last_pid'] = \
-                loadavg.readline().split()
+        la['lavg_1'], la['lavg_5'], la['lavg_15'], la['nr'], la['last_pid'] = \
+            proc_file_cache.read(proc_path("loadavg")).split()
 
         return la
 
+    def get_sys_loadavg_values(self):
+        """获取系统平均负载(数值) {lavg_1, lavg_5, lavg_15, running, total, last_pid}"""
+        la = self.get_sys_loadavg()
+        running, total = la["nr"].split("/")
+        return {"lavg_1": float(la["lavg_1"]), "lavg_5": float(la["lavg_5"]), "lavg_15": float(la["lavg_15"]),
+                "running": int(running), "total": int(total), "last_pid": int(la["last_pid"])}
+
+    @wrap_process_exceptions
+    def get_pressure(self):
+        """
+        获取资源压力信息 - /proc/pressure/{cpu,memory,io} (内核4.20+, 不支持时返回空字典)
+        :return: {资源: {"some"/"full": {"avg10", "avg60", "avg300", "total"(微秒)}}}
+        """
+        pressure = {}
+        for resource in PRESSURE_RESOURCES:
+            try:
+                with open(proc_path("pressure", resource), "r") as f:
+                    lines = f.readlines()
+            except IOError:
+                continue
+            pressure[resource] = {}
+            for line in lines:
+                spl = line.split()
+                values = dict(item.split("=") for item in spl[1:])
+                pressure[resource][spl[0]] = {"avg10": float(values["avg10"]), "avg60": float(values["avg60"]),
+                                              "avg300": float(values["avg300"]), "total": int(values["total"])}
+        return pressure
+
+    def calc_pressure(self):
+        """
+        计算资源压力 : 内核给出的平均值, 以及根据total计算的两次调用之间的停顿时间占比(%)
+        :return: {资源: {"some_avg10", "some_avg60", "some_avg300", "some_percent", "full_..."}}
+        """
+        current_pressure = self.get_pressure()
+        current_time = time()
+        prev_pressure, interval = self.prev_pressure, current_time - self.prev_pressure_time
+        self.prev_pressure, self.prev_pressure_time = current_pressure, current_time
+
+        result = {}
+        for resource, kinds in current_pressure.items():
+            result[resource] = {}
+            for kind, values in kinds.items():
+                for window in ("avg10", "avg60", "avg300"):
+                    result[resource][kind + "_" + window] = values[window]
+                prev_total = prev_pressure.get(resource, {}).get(kind, {}).get("total")
+                if prev_total is None or interval <= 0:  # 未初始化
+                    result[resource][kind + "_percent"] = 0.
+                else:
+                    result[resource][kind + "_percent"] = \
+                        round(max(values["total"] - prev_total, 0) / (interval * 1000000.) * 100, 2)
+        return result
+
+    @wrap_process_exceptions
+    def get_vmstat_counters(self):
+        """获取虚拟内存事件计数 - /proc/vmstat (只保留 VMSTAT_KEYS, 内核不支持的计数不出现在结果中)"""
+        counters = {}
+        for line in proc_file_cache.read(proc_path("vmstat")).splitlines():
+            key, value = line.split()
+            if key in VMSTAT_KEYS:
+                counters[key] = int(value)
+        return counters
+
+    def calc_vmstat_rates(self):
+        """
+        计算虚拟内存事件速率(每秒)
+        :return: {"pgmajfault_per_s", "pswpin_per_s", "pswpout_per_s", "oom_kill_per_s", "oom_kill"(累计次数)}
+        """
+        current_counters = self.get_vmstat_counters()
+        current_time = time()
+        prev_counters, interval = self.prev_vmstat, current_time - self.prev_vmstat_time
+        self.prev_vmstat, self.prev_vmstat_time = current_counters, current_time
+
+        result = {}
+        for key, value in current_counters.items():
+            if key not in prev_counters or interval <= 0:  # 未初始化
+                result[key + "_per_s"] = 0.
+            else:
+                result[key + "_per_s"] = round(max(value - prev_counters[key], 0) / interval, 2)
+        if "oom_kill" in current_counters:
+            result["oom_kill"] = current_counters["oom_kill"]
+        return result
+
     @wrap_process_exceptions
     def get_sys_uptime(self):
         """获取系统运行时间 - /proc/uptime"""
@@ -272,7 +517,7 @@ class SysMonitor(object):
 
         ut = {}
         cpu_core_num = len(self.get_cpu_total_time_by_cores().keys())  # 计算cpu核数
-        with open("/proc/uptime", "r") as uptime:
+        with open(proc_path("uptime"), "r") as uptime:
             system_uptime, idle_time = map(float, uptime.readline().split())
             ut["system_uptime"] = second2time_str(int(system_uptime))
             ut["idle_time"] = idle_time
@@ -288,50 +533,19 @@ class SysMonitor(object):
         # reference pydf - https://github.com/k4rtik/pydf/tree/c59c16df1d1086d03f8948338238bf380431deb9
         disk_stat = []
 
-        def get_all_mount_points():
-            """获取所有挂载点 - /proc/mounts"""
-
-            mount_points = {}
-            with open("/proc/mounts", "r") as mounts:
-                for line in mounts.readlines():
-                    spl = line.split()
-                    if len(spl) < 4:
-                        continue
-                    device, mp, typ, opts = spl[0:4]
-                    opts = opts.split(',')
-                    mount_points[mp] = (device, typ, opts)
-
-            return mount_points
-
-        def is_remote_fs(fs):
-            """test if fs (as type) is a remote one"""
-
-            # reference pydf - https://github.com/k4rtik/pydf/tree/c59c16df1d1086d03f8948338238bf380431deb9
-
-            return fs.lower() in ["nfs", "smbfs", "cifs", "ncpfs", "afs", "coda",
-                                  "ftpfs", "mfs", "sshfs", "fuse.sshfs", "nfs4"]
+        mp = self.mount_table.get_mount_points()
+        # 过滤掉非物理磁盘
+        mount_points = [m for m in mp.keys() if not is_special_fs(mp[m][1])]
+        # 远程文件系统不等待结果, 直接使用上次完成的结果(失联的NFS不会阻塞请求)
+        local_mount_points = [m for m in mount_points if not is_remote_fs(mp[m][1])]
+        disk_status_dict, self.disk_stat_pending = \
+            self.statvfs_pool.statvfs(mount_points, STATVFS_TIMEOUT, wait_for=local_mount_points)
 
-        def is_special_fs(fs):
-            """test if fs (as type) is a special one
-            in addition, a filesystem is special if it has number of blocks equal to 0"""
-
-            # reference pydf - https://github.com/k4rtik/pydf/tree/c59c16df1d1086d03f8948338238bf380431deb9
-
-            return fs.lower() in ["tmpfs", "devpts", "devtmpfs", "proc", "sysfs", "usbfs", "devfs", "fdescfs",
-                                  "linprocfs"]
-
-        mp = get_all_mount_points()
-
-        for mount_point in mp.keys():
+        for mount_point in mount_points:
             device, fstype, opts = mp[mount_point]
-
-            # 过滤掉非物理磁盘
-            if is_special_fs(fstype):
-                continue
-            try:
-                disk_status = statvfs(mount_point)
-            except (OSError, IOError):
+            if mount_point not in disk_status_dict:
                 continue
+            disk_status = disk_status_dict[mount_point]
 
             # 处理磁盘数据
             fs_blocksize = disk_status.f_bsize
@@ -392,6 +606,46 @@ class SysMonitor(object):
         return addr
 
     # reference:https://github.com/giampaolo/psutil/blob/ffe8a9d280c397e8fd46eb1422c2838179cfb5d9/psutil/_pslinux.py#L1052
+    @wrap_process_exceptions
+    def get_disk_partitions(self):
+        """获取需要统计的分区 - /proc/partitions"""
+
+        # determine partitions we want to look for
+        partitions = []
+        with open(proc_path("partitions")) as f:
+            lines = f.readlines()[2:]
+        for line in reversed(lines):
+            _, _, _, name = line.split()
+            if name[-1].isdigit():
+                # we're dealing with a partition (e.g. 'sda1'); 'sda' will
+                # also be around but we want to omit it
+                partitions.append(name)
+            else:
+                if not partitions or not partitions[-1].startswith(name):
+                    # we're dealing with a disk entity for which no
+                    # partitions have been defined (e.g. 'sda' but
+                    # 'sda1' was not around), see:
+                    # https://github.com/giampaolo/psutil/issues/338
+                    partitions.append(name)
+        return partitions
+
+    def get_sector_size(self, partition):
+        """Return the sector size of a partition.
+        Used by disk_io_counters().
+        """
+        try:
+            with open(sys_path("block", partition, "queue", "hw_sector_size"), "rt") as f:
+                return int(f.read())
+        except (IOError, ValueError):
+            # man iostat states that sectors are equivalent with blocks and
+            # have a size of 512 bytes since 2.4 kernels.
+            return SECTOR_SIZE_FALLBACK
+
+    def refresh_disk_partitions(self):
+        """刷新分区及扇区大小缓存"""
+        self.disk_sector_sizes = dict((name, self.get_sector_size(name)) for name in self.get_disk_partitions())
+        return self.disk_sector_sizes
+
     @wrap_process_exceptions
     def disk_io_counters(self):
         """获取磁盘IO数据"""
@@ -400,42 +654,14 @@ class SysMonitor(object):
         system as a dict of raw tuples.
         """
 
-        # determine partitions we want to look for
-        def get_partitions():
-            partitions = []
-            with open("/proc/partitions") as f:
-                lines = f.readlines()[2:]
-            for line in reversed(lines):
-                _, _, _, name = line.split()
-                if name[-1].isdigit():
-                    # we're dealing with a partition (e.g. 'sda1'); 'sda' will
-                    # also be around but we want to omit it
-                    partitions.append(name)
-                else:
-                    if not partitions or not partitions[-1].startswith(name):
-                        # we're dealing with a disk entity for which no
-                        # partitions have been defined (e.g. 'sda' but
-                        # 'sda1' was not around), see:
-                        # https://github.com/giampaolo/psutil/issues/338
-                        partitions.append(name)
-            return partitions
-
-        def get_sector_size(partition):
-            """Return the sector size of a partition.
-            Used by disk_io_counters().
-            """
-            try:
-                with open("/sys/block/%s/queue/hw_sector_size" % partition, "rt") as f:
-                    return int(f.read())
-            except (IOError, ValueError):
-                # man iostat states that sectors are equivalent with blocks and
-                # have a size of 512 bytes since 2.4 kernels.
-                return SECTOR_SIZE_FALLBACK
-
         retdict = {}
-        partitions = get_partitions()
-        with open("/proc/diskstats") as f:
-            lines = f.readlines()
+        lines = proc_file_cache.read(proc_path("diskstats")).splitlines()
+        # 设备列表发生变化(如新增分区)时才重新读取分区及扇区大小
+        device_key = tuple(line.split(None, 4)[2] for line in lines)
+        if device_key != self.disk_device_key:
+            self.refresh_disk_partitions()
+            self.disk_device_key = device_key
+        sector_sizes = self.disk_sector_sizes
         for line in lines:
             fields = line.split()
             flen = len(fields)
@@ -458,8 +684,8 @@ class SysMonitor(object):
             else:
                 raise ValueError("not sure how to interpret line %r" % line)
 
-            if name in partitions:
-                ssize = get_sector_size(name)
+            if name in sector_sizes:
+                ssize = sector_sizes[name]
                 rbytes *= ssize
                 wbytes *= ssize
                 retdict[name] = (reads, writes, rbytes, wbytes, rtime, wtime,
@@ -494,3 +720,35 @@ class SysMonitor(object):
         self.prev_disk_rbytes, self.prev_disk_wbytes = current_disk_rbytes, current_disk_wbytes
         self.prev_disk_time = current_disk_time
         return read_MBs, write_MBs
+
+    def calc_io_speed_by_devices(self):
+        """
+        计算各分区的IO数据
+        :return: {分区: {读写速度(MB/s), 读写IOPS, 平均读写等待时间(ms), 繁忙程度(百分比)}}
+        """
+        current_counters = self.disk_io_counters()
+        current_time = time()
+        prev_counters, interval = self.prev_disk_io_counters, current_time - self.prev_disk_io_time
+        self.prev_disk_io_counters, self.prev_disk_io_time = current_counters, current_time
+        if interval <= 0:  # 为了防止两次计算间隔特别快的情况
+            interval = 1.
+
+        io_speed = {}
+        for name, data in current_counters.items():
+            prev_data = prev_counters.get(name, data)  # 未初始化或新出现的分区
+            # (reads, writes, rbytes, wbytes, rtime, wtime, reads_merged, writes_merged, busy_time)
+            reads, writes, rbytes, wbytes, rtime, wtime, _, _, busy_time = \
+                [max(c - p, 0) for c, p in zip(data, prev_data)]
+            io_speed[name] = {
+                "read_MBs": round(rbytes / (1024. ** 2) / interval, 2),
+                "write_MBs": round(wbytes / (1024. ** 2) / interval, 2),
+                "read_iops": round(reads / interval, 2),
+                "write_iops": round(writes / interval, 2),
+                "read_await_ms": round(rtime * 1. / reads, 2) if reads else 0.,
+                "write_await_ms": round(wtime * 1. / writes, 2) if writes else 0.,
+                "await_ms": round((rtime + wtime) * 1. / (reads + writes), 2) if reads + writes else 0.,
+                # busy_time 单位为毫秒
+                "util_percent": round(min(busy_time / 10. / interval, 100.), 2),
+            }
+
+        return io_speed
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+进程监测核心功能实现 - 按规则监测进程
+
+按进程名称等规则持续监测进程, 进程重启(进程号改变)后自动重新关联
+- 规则类型 : cmdline(命令行包含), regex(命令行正则匹配), comm(进程名相等), exe(执行文件路径相等), cgroup(cgroup路径包含)
+- 正则表达式在添加规则时编译一次
+- 只对新出现的进程(fork/exec事件或进程表中新增的进程号)进行匹配, 不再反复全量搜索
+- 匹配的进程自动加入监测, 退出后自动移除 (只移除由规则加入的进程, 手动加入的监测不受影响)
+- fork出的子进程继承父进程的命令行, 可能随父进程一起被加入监测; 执行新程序(exec)后重新匹配, 不再匹配时移除
+- 规则保存在JSON文件中, 重启后自动恢复
+
+规则结构
+    {"id": 规则编号, "type": 规则类型, "pattern": 匹配内容}
+"""
+
+import os
+import re
+import json
+import threading
+
+from prcess_exception import ProcessException
+from path_resolver import proc_path
+
+RULE_TYPES = ("cmdline", "regex", "comm", "exe", "cgroup")
+
+
+def read_proc_file(pid, name):
+    """读取 /proc/[pid]/ 下的文件, 进程已退出或无权限时返回None"""
+    try:
+        with open(proc_path(pid, name), "r") as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+class WatchRule(object):
+    """进程监测规则"""
+
+    def __init__(self, rule_id, rule_type, pattern):
+        if rule_type not in RULE_TYPES:
+            raise ValueError("unknown rule type : " + str(rule_type))
+        self.id = rule_id
+        self.type = rule_type
+        self.pattern = pattern
+        self.regex = re.compile(pattern) if rule_type == "regex" else None
+
+    def to_dict(self):
+        return {"id": self.id, "type": self.type, "pattern": self.pattern}
+
+    def match(self, pid, cache):
+        """
+        判断进程是否匹配规则
+        :param cache: 同一进程的多条规则共用的读取结果 {文件名: 内容}
+        """
+
+        def get(name):
+            if name not in cache:
+                if name == "exe":
+                    try:
+                        cache[name] = os.readlink(proc_path(pid, "exe"))
+                    except OSError:
+                        cache[name] = None
+                elif name == "cmdline":
+                    cmdline = read_proc_file(pid, "cmdline")
+                    cache[name] = cmdline.replace('\0', ' ').strip() if cmdline is not None else None
+                else:
+                    cache[name] = read_proc_file(pid, name)
+            return cache[name]
+
+        if self.type == "cmdline":
+            value = get("cmdline")
+            return value is not None and self.pattern in value
+        if self.type == "regex":
+            value = get("cmdline")
+            return value is not None and self.regex.search(value) is not None
+        if self.type == "comm":
+            value = get("comm")
+            return value is not None and value.strip() == self.pattern
+        if self.type == "exe":
+            return get("exe") == self.pattern
+        if self.type == "cgroup":
+            value = get("cgroup")
+            return value is not None and any(self.pattern in line.split(":", 2)[-1] for line in value.splitlines())
+        return False
+
+
+class WatchRuleManager(object):
+    """进程监测规则管理类"""
+
+    def __init__(self, proc_monitor, path=None):
+        self.proc_monitor = proc_monitor
+        self.path = path  # 规则文件路径 (为None时不保存)
+        self.lock = threading.RLock()
+        self.rules = []
+        self.next_id = 1
+        self.attached = {}  # 由规则加入监测的进程号 -> 规则编号
+        self.seen_pids = set()  # 已匹配过的进程号 (只匹配新出现的进程)
+
+    def load(self):
+        """从文件中恢复规则"""
+        if self.path and os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                rules = json.load(f)
+            with self.lock:
+                for rule in rules:
+                    self.rules.append(WatchRule(rule["id"], rule["type"].encode("utf-8"),
+                                                rule["pattern"].encode("utf-8")))
+                    self.next_id = max(self.next_id, rule["id"] + 1)
+        return self
+
+    def save(self):
+        """保存规则 (先写临时文件再重命名)"""
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([rule.to_dict() for rule in self.rules], f)
+        os.rename(tmp_path, self.path)
+
+    def get_rules(self):
+        """获取所有规则"""
+        with self.lock:
+            return [rule.to_dict() for rule in self.rules]
+
+    def get_attached(self):
+        """获取由规则加入监测的进程 {进程号: 规则编号}"""
+        with self.lock:
+            return dict(self.attached)
+
+    def add_rule(self, rule_type, pattern, pids=None):
+        """
+        添加规则, 并对当前所有进程匹配一次
+        :param pids: 当前所有进程号, 为None时读取/proc
+        """
+        with self.lock:
+            rule = WatchRule(self.next_id, rule_type, pattern)  # 正则表达式有误时抛出re.error
+            self.next_id += 1
+            self.rules.append(rule)
+            self.save()
+            if pids is None:
+                pids = [int(pid) for pid in os.listdir(proc_path()) if pid.isdigit()]
+            for pid in pids:
+                self.evaluate(pid, [rule])
+        return rule.to_dict()
+
+    def remove_rule(self, rule_id):
+        """删除规则, 并移除由该规则加入监测的进程"""
+        with self.lock:
+            rules = [rule for rule in self.rules if rule.id != rule_id]
+            if len(rules) == len(self.rules):
+                return False
+            self.rules = rules
+            self.save()
+            for pid, attached_rule_id in self.attached.items():
+                if attached_rule_id == rule_id:
+                    self.detach(pid)
+        return True
+
+    def attach(self, pid, rule_id):
+        """将进程加入监测 (CPU占用率及IO速度的计算基准由下一次采样初始化)"""
+        p = self.proc_monitor
+        if p.is_process_watched(pid):
+            return
+        p.watch_process(pid)
+        try:
+            p.get_process_stat(pid)
+        except ProcessException:  # 进程已退出
+            p.remove_watched_process(pid)
+            return
+        self.attached[pid] = rule_id
+
+    def detach(self, pid):
+        """移除由规则加入监测的进程"""
+        if self.attached.pop(pid, None) is not None:
+            self.proc_monitor.remove_watched_process(pid)
+
+    def match(self, pid, rules=None):
+        """对进程匹配规则, 返回第一条匹配的规则编号, 不匹配时返回None"""
+        cache = {}
+        for rule in (self.rules if rules is None else rules):
+            if rule.match(pid, cache):
+                return rule.id
+        return None
+
+    def evaluate(self, pid, rules=None):
+        """对进程匹配规则, 匹配成功时加入监测"""
+        with self.lock:
+            rule_id = self.match(pid, rules)
+            if rule_id is not None:
+                self.attach(pid, rule_id)
+        return rule_id
+
+    def on_process_event(self, event):
+        """进程事件回调 - 新进程及执行了新程序的进程进行匹配, 退出的进程移除监测"""
+        pid = event["pid"]
+        with self.lock:
+            if event["event"] == "exit":
+                self.seen_pids.discard(pid)
+                self.detach(pid)
+            elif pid in self.attached:
+                if event["event"] == "exec":  # 执行了新程序, 按新的命令行重新匹配
+                    rule_id = self.match(pid)
+                    if rule_id is None:
+                        self.detach(pid)
+                    else:
+                        self.attached[pid] = rule_id
+            else:
+                self.seen_pids.add(pid)
+                if self.rules:
+                    self.evaluate(pid)
+
+    def refresh(self, pids):
+        """
+        根据当前进程号集合匹配新进程并移除已退出的进程 (没有进程事件监听时使用)
+        :param pids: 当前所有进程号
+        """
+        pids = set(int(pid) for pid in pids)
+        with self.lock:
+            for pid in pids - self.seen_pids:
+                if self.rules:
+                    self.evaluate(pid)
+            for pid in self.seen_pids - pids:
+                self.detach(pid)
+            self.seen_pids = pids
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import unittest
+from timeit import default_timer
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.address_filter import AddressFilter, parse_address
+
+
+class TestAddressFilter(unittest.TestCase):
+    """请求来源地址过滤测试类"""
+
+    def test_address(self):
+        print "\n-----单个地址测试-----"
+        f = AddressFilter(["127.0.0.1", "10.1.2.3", "::1"])
+        self.assertTrue(f.is_allowed("127.0.0.1"))
+        self.assertTrue(f.is_allowed("10.1.2.3"))
+        self.assertFalse(f.is_allowed("10.1.2.4"))
+        self.assertTrue(f.is_allowed("::1"))
+        self.assertTrue(f.is_allowed("0:0:0:0:0:0:0:1"))  # 同一地址的不同写法
+        self.assertTrue(f.is_allowed("::ffff:10.1.2.3"))  # IPv4映射的IPv6地址
+        self.assertFalse(f.is_allowed("not an address"))
+        self.assertFalse(f.is_allowed(""))
+
+    def test_network(self):
+        print "\n-----网段测试-----"
+        f = AddressFilter(["10.0.0.0/8", "192.168.1.0/24", "172.16.5.9/16", "fd00::/8", "::ffff:100.64.0.0/106"])
+        self.assertTrue(f.is_allowed("10.255.0.1"))
+        self.assertTrue(f.is_allowed("192.168.1.200"))
+        self.assertFalse(f.is_allowed("192.168.2.1"))
+        self.assertTrue(f.is_allowed("172.16.200.1"))  # 网段中的主机位被忽略
+        self.assertFalse(f.is_allowed("172.17.0.1"))
+        self.assertTrue(f.is_allowed("fd12:3456::1"))
+        self.assertFalse(f.is_allowed("fe80::1"))
+        self.assertTrue(f.is_allowed("100.100.0.1"))
+        self.assertFalse(f.is_allowed("100.128.0.1"))
+        self.assertTrue(AddressFilter(["0.0.0.0/0"]).is_allowed("8.8.8.8"))
+        self.assertFalse(AddressFilter(["0.0.0.0/0"]).is_allowed("::2"))
+
+    def test_allow_all(self):
+        print "\n-----允许所有地址测试-----"
+        f = AddressFilter(["127.0.0.1", "0.0.0.0"])
+        self.assertTrue(f.is_allowed("8.8.8.8"))
+        self.assertTrue(f.is_allowed("2001:db8::1"))
+
+    def test_invalid(self):
+        print "\n-----配置格式错误测试-----"
+        for item in ("localhost", "10.0.0.0/33", "10.0.0.0/x", "fd00::/129", "1.2.3"):
+            self.assertRaises(ValueError, AddressFilter, [item])
+        self.assertEqual(parse_address("::ffff:1.2.3.4")[1:], (0x01020304, 32))
+
+    def test_speed(self):
+        print "\n-----检查耗时测试-----"
+        allowed = ["10.%d.%d.1" % (i // 256, i % 256) for i in range(2000)] + ["172.16.0.0/12", "192.168.0.0/16"]
+        f = AddressFilter(allowed)
+        n = 20000
+        start = default_timer()
+        for _ in xrange(n):
+            f.is_allowed("192.168.3.4")
+        elapsed = default_timer() - start
+        start = default_timer()
+        for _ in xrange(n):
+            "192.168.3.4" in allowed  # 原来的逐个比较
+        print "网段检查 : %.2f us, 列表查找 : %.2f us" % (elapsed / n * 1e6, (default_timer() - start) / n * 1e6)
+        self.assertTrue(f.is_allowed("10.7.207.1"))
+        self.assertTrue(f.is_allowed("172.31.255.255"))
+
+
+if __name__ == '__main__':
+    unittest.main()
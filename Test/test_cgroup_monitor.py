@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from time import sleep
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.cgroup_monitor import CgroupMonitor, discover_cgroup_mounts, parse_pid_cgroup
+
+
+def write(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f:
+        f.write(content)
+
+
+class TestCgroupMonitor(unittest.TestCase):
+    """cgroup监测测试类"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_v2(self):
+        print "\n-----cgroup v2测试-----"
+        root = self.tmp_dir
+        unit = os.path.join(root, "system.slice", "nginx.service")
+        write(os.path.join(unit, "cpu.stat"), "usage_usec 1000000\nuser_usec 600000\nsystem_usec 400000\n"
+                                              "nr_periods 10\nnr_throttled 2\nthrottled_usec 100\n")
+        write(os.path.join(unit, "memory.current"), str(64 * 1024 ** 2))
+        write(os.path.join(unit, "memory.stat"), "anon 33554432\nfile 16777216\n")
+        write(os.path.join(unit, "io.stat"), "8:0 rbytes=1000000 wbytes=0 rios=10 wios=0 dbytes=0 dios=0\n"
+                                             "8:16 rbytes=1000000 wbytes=2000000 rios=10 wios=20 dbytes=0 dios=0\n")
+        write(os.path.join(unit, "pids.current"), "5")
+        controllers = dict((c, (2, root)) for c in ("cpu", "memory", "io", "pids"))
+        monitor = CgroupMonitor(controllers, subtree="/system.slice")
+        self.assertEqual(monitor.list_cgroups(), ["/system.slice", "/system.slice/nginx.service"])
+
+        monitor.collect()
+        monitor.prev["/system.slice/nginx.service"] = (monitor.prev["/system.slice/nginx.service"][0] - 1,
+                                                       monitor.prev["/system.slice/nginx.service"][1])
+        write(os.path.join(unit, "cpu.stat"), "usage_usec 1500000\nnr_throttled 4\n")
+        write(os.path.join(unit, "io.stat"), "8:0 rbytes=2000000 wbytes=1000000 rios=20 wios=10\n"
+                                             "8:16 rbytes=1000000 wbytes=2000000 rios=10 wios=20\n")
+        data = monitor.collect()["/system.slice/nginx.service"]
+        print data
+        self.assertEqual(data["mem_M"], 64.)
+        self.assertEqual(data["mem_anon_M"], 32.)
+        self.assertEqual(data["pids"], 5)
+        self.assertAlmostEqual(data["cpu_percent"], 50. / monitor.cpu_count, delta=5. / monitor.cpu_count)
+        self.assertAlmostEqual(data["throttled_per_s"], 2, delta=0.2)
+        self.assertAlmostEqual(data["io_read_MBs"], 1, delta=0.1)
+        self.assertAlmostEqual(data["io_write_iops"], 10, delta=1)
+
+    def test_v1(self):
+        print "\n-----cgroup v1测试-----"
+        root = self.tmp_dir
+        write(os.path.join(root, "cpuacct", "docker", "abc", "cpuacct.usage"), "2000000000")
+        write(os.path.join(root, "memory", "docker", "abc", "memory.usage_in_bytes"), str(10 * 1024 ** 2))
+        write(os.path.join(root, "memory", "docker", "abc", "memory.stat"), "rss 1\ntotal_rss 1048576\n"
+                                                                            "total_cache 2097152\n")
+        write(os.path.join(root, "blkio", "docker", "abc", "blkio.throttle.io_service_bytes"),
+              "8:0 Read 4096\n8:0 Write 8192\n8:0 Total 12288\nTotal 12288\n")
+        write(os.path.join(root, "blkio", "docker", "abc", "blkio.throttle.io_serviced"),
+              "8:0 Read 1\n8:0 Write 2\n8:0 Total 3\nTotal 3\n")
+        controllers = {"cpuacct": (1, os.path.join(root, "cpuacct")), "memory": (1, os.path.join(root, "memory")),
+                       "blkio": (1, os.path.join(root, "blkio"))}
+        monitor = CgroupMonitor(controllers, subtree="/docker")
+        self.assertIn("/docker/abc", monitor.list_cgroups())
+        monitor.collect()
+        sleep(0.1)
+        data = monitor.collect()["/docker/abc"]
+        print data
+        self.assertEqual(data["mem_M"], 10.)
+        self.assertEqual(data["mem_anon_M"], 1.)
+        self.assertEqual(data["mem_file_M"], 2.)
+        self.assertEqual(data["cpu_percent"], 0.)
+        self.assertIsNone(data["pids"])
+
+    def test_pid_cgroup(self):
+        print "\n-----进程cgroup测试-----"
+        self.assertEqual(parse_pid_cgroup("4:memory:/docker/abc\n2:cpu,cpuacct:/docker/abc\n0::/\n"),
+                         {"memory": "/docker/abc", "cpu": "/docker/abc", "cpuacct": "/docker/abc", "": "/"})
+        monitor = CgroupMonitor(discover_cgroup_mounts())
+        cgroup = monitor.get_pid_cgroup(os.getpid())
+        print "当前进程cgroup :", cgroup
+        self.assertTrue(cgroup.startswith("/"))
+        self.assertIsNone(monitor.get_pid_cgroup(999999999))
+
+
+if __name__ == '__main__':
+    unittest.main()
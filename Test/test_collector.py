@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import unittest
+from time import sleep
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.collector import CollectorRegistry, CollectorScheduler, TimerWheel, thread_cpu_time, \
+    COLLECTOR_MAX_BACKOFF, PRIORITY_HIGH, PRIORITY_LOW
+
+
+class TestCollector(unittest.TestCase):
+    """采集项注册及调度测试类"""
+
+    def test_timer_wheel(self):
+        print "\n-----时间轮测试-----"
+        wheel = TimerWheel(slots=4)
+        wheel.schedule("a", 1)
+        wheel.schedule("b", 6)  # 超过一圈
+        due = [wheel.advance() for _ in range(8)]
+        self.assertEqual(due[0], ["a"])
+        self.assertEqual(due[5], ["b"])
+        self.assertEqual(sum(len(d) for d in due), 2)
+
+    def test_intervals(self):
+        print "\n-----采集间隔测试-----"
+        registry = CollectorRegistry()
+        calls = []
+        registry.register("cheap", lambda values, errors: calls.append("cheap") or len(calls))
+        registry.register("derived", lambda values, errors: values["cheap"] * 10)
+        registry.register("slow", lambda values, errors: calls.append("slow") or "slow", interval=15)
+        scheduler = CollectorScheduler(registry, tick_seconds=5)
+        for _ in range(6):
+            values, errors = scheduler.run_tick()
+        self.assertEqual(calls.count("cheap"), 6)
+        self.assertEqual(calls.count("slow"), 2)  # 第1, 4个周期
+        self.assertEqual(values["slow"], "slow")  # 未到期时沿用上次结果
+        self.assertEqual(values["derived"], values["cheap"] * 10)
+        self.assertEqual(registry.get("slow").skips, 4)
+        describe = dict((c["name"], c) for c in scheduler.describe())
+        self.assertEqual(describe["slow"]["effective_interval"], 15)
+        print describe["slow"]
+
+    def test_budget_and_config(self):
+        print "\n-----耗时预算及配置测试-----"
+        registry = CollectorRegistry()
+        registry.register("heavy", lambda values, errors: sleep(0.02), budget=0.001)
+        registry.register("broken", lambda values, errors: 1 / 0)
+        registry.register("off", lambda values, errors: 1)
+        registry.configure({"off": {"enabled": False}, "unknown": {"interval": 1}})
+        scheduler = CollectorScheduler(registry, tick_seconds=1)
+        values, errors = scheduler.run_tick()
+        heavy = registry.get("heavy")
+        self.assertEqual(heavy.backoff, 2)
+        self.assertEqual(heavy.interval_ticks(1), 2)
+        self.assertIn("broken", errors)
+        self.assertNotIn("broken", values)
+        self.assertNotIn("off", values)
+        for _ in range(40):
+            scheduler.run_tick()
+        self.assertEqual(heavy.backoff, COLLECTOR_MAX_BACKOFF)
+        # 预算放宽后逐步恢复
+        registry.configure({"heavy": {"budget": 10}})
+        for _ in range(40):
+            scheduler.run_tick()
+        self.assertEqual(heavy.backoff, 1)
+        registry.unregister("broken")
+        self.assertNotIn("broken", scheduler.run_tick()[1])
+
+
+    def test_adaptive(self):
+        print "\n-----自适应采样测试-----"
+        self.assertGreaterEqual(thread_cpu_time(), 0)
+        registry = CollectorRegistry()
+        registry.register("process", lambda values, errors: 1, priority=PRIORITY_HIGH)
+        registry.register("sweep", lambda values, errors: 1, interval=10, priority=PRIORITY_LOW)
+        scheduler = CollectorScheduler(registry, tick_seconds=5, cpu_budget=0.01)
+        # 每周期0.5秒CPU, 远超预算 : 先拉长全量扫描
+        scheduler.adapt(0.5)
+        self.assertEqual(scheduler.stretch[PRIORITY_LOW], 2)
+        self.assertEqual(scheduler.stretch[PRIORITY_HIGH], 1)
+        for _ in range(200):
+            scheduler.adapt(0.5)
+        self.assertEqual(scheduler.stretch[PRIORITY_HIGH], 16)
+        status = scheduler.get_status()
+        self.assertEqual(status["intervals"]["sweep"], 10 * 16)
+        self.assertEqual(status["stretch"]["low"], 16)
+        # 负载恢复后先恢复被监测进程的数据
+        for _ in range(4 * 10):
+            scheduler.adapt(0.)
+        self.assertEqual(scheduler.stretch[PRIORITY_HIGH], 1)
+        self.assertGreater(scheduler.stretch[PRIORITY_LOW], 1)
+        for _ in range(200):
+            scheduler.adapt(0.)
+        self.assertEqual(scheduler.get_status()["intervals"], {"process": 5, "sweep": 10})
+        print status
+
+if __name__ == '__main__':
+    unittest.main()
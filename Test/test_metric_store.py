@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.sys_monitor import SysMonitor
+from Core.process_monitor import ProcMonitor
+from Core.metric_store import MetricStore, flatten_snapshot, RECORD_SIZE
+
+
+class TestMetricStore(unittest.TestCase):
+    """本地指标持久化存储测试类"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_append_reopen(self):
+        print "\n-----存储写入及恢复测试-----"
+        store = MetricStore(self.path).open()
+        for seq in range(1, 11):
+            store.append(seq, 1000. + seq, {"a": seq, "b": seq * 2})
+        store.close()
+
+        store = MetricStore(self.path).open()
+        self.assertEqual(store.last_seq, 10)
+        self.assertEqual(store.latest()[1], {"a": 10., "b": 20.})
+        self.assertEqual(len(store.query(since_seq=8, names=["a"])), 2)
+        self.assertRaises(ValueError, store.append, 10, 2000., {"a": 1})
+        store.append(11, 1011., {"a": 11})
+        self.assertEqual(store.query(since_seq=10), [(11, 1011., "a", 11.)])
+        print "恢复后序号 :", store.last_seq
+
+    def test_rotate(self):
+        print "\n-----存储分段轮转测试-----"
+        store = MetricStore(self.path, segment_size=64 + RECORD_SIZE * 4, max_segments=3).open()
+        for seq in range(1, 21):
+            store.append(seq, 1000. + seq, {"a": seq, "b": seq})
+        self.assertEqual(len(store.segments), 3)
+        self.assertEqual(len([f for f in os.listdir(self.path) if f.endswith(".idx")]), 2)
+        self.assertEqual([r[0] for r in store.query(start_time=1019.)], [19, 19, 20, 20])
+        print "分段文件 :", sorted(os.listdir(self.path))
+
+    def test_metric_names(self):
+        print "\n-----指标名日志及编号回收测试-----"
+        store = MetricStore(self.path, segment_size=64 + RECORD_SIZE * 4, max_segments=2).open()
+        for seq in range(1, 41):  # 每次采样一个新的指标名(如已退出进程的指标)
+            store.append(seq, 1000. + seq, {"a": seq, "p%d" % seq: seq})
+        self.assertLessEqual(len(store.names), 6)
+        self.assertLessEqual(len(store.metric_names), 7)
+        self.assertNotIn("p1", store.names)
+        with open(os.path.join(self.path, "metrics.journal")) as f:
+            self.assertLessEqual(len(f.readlines()), 2)
+        latest = store.latest()[1]
+        store.close()
+
+        store = MetricStore(self.path).open()
+        self.assertEqual(store.latest()[1], latest)
+        self.assertEqual(sorted(r[2] for r in store.query(since_seq=38)), ["a", "a", "p39", "p40"])
+        store.append(41, 1041., {"p41": 41})
+        self.assertEqual(store.query(since_seq=40), [(41, 1041., "p41", 41.)])
+        print "指标编号 :", store.metric_names
+
+    def test_torn_record(self):
+        print "\n-----半写入记录恢复测试-----"
+        store = MetricStore(self.path).open()
+        store.append(1, 1001., {"a": 1})
+        store.append(2, 1002., {"a": 2})
+        segment = store.segments[-1]
+        segment.mm[64 + RECORD_SIZE + 4] = "\xff"  # 破坏第二条记录
+        store.close()
+        store = MetricStore(self.path).open()
+        self.assertEqual(store.last_seq, 1)
+        store.append(2, 1002., {"a": 2})
+        self.assertEqual(store.latest()[1], {"a": 2.})
+
+    def test_baselines(self):
+        print "\n-----计算基准恢复测试-----"
+        S = SysMonitor()
+        S.calc_cpu_percent()
+        S.calc_cpu_percent_by_cores()
+        baselines = S.get_baselines()
+        store = MetricStore(self.path).open()
+        store.append(1, 1000., dict(("baseline." + k, v) for k, v in baselines.items()))
+        restored = dict((k[len("baseline."):], v) for k, v in store.latest("baseline.")[1].items())
+        S.prev_cpu_work_time = 0
+        self.assertTrue(S.load_baselines(restored))
+        self.assertEqual(S.prev_cpu_work_time, baselines["cpu_work_time"])
+        self.assertFalse(S.load_baselines(dict(restored, btime=0)))
+
+    def test_restart_rates(self):
+        print "\n-----重启后首次采样速率测试-----"
+        S = SysMonitor()
+        P = ProcMonitor()
+        P.watch_process(os.getpid())
+        S.calc_net_speed_by_devices()
+        S.calc_io_speed_by_devices()
+        S.calc_vmstat_rates()
+        P.calc_process_cpu_percent(os.getpid())
+        P.calc_process_io_speed(os.getpid())
+        baselines = S.get_baselines()
+        baselines.update(P.get_baselines())
+        # 模拟上次运行之后(停机期间)的网络及磁盘流量
+        for name in baselines.keys():
+            if name.startswith("net_dev.") or name.startswith("disk_io.") or name.startswith("vmstat."):
+                baselines[name] = max(baselines[name] - 1024 * 1024, 0)
+        store = MetricStore(self.path).open()
+        store.append(1, 1000., dict(("baseline." + k, v) for k, v in baselines.items()))
+        store.close()
+
+        # 重启 : 计算基准清空, 未恢复时首次采样为0
+        S.prev_net_dev_counters, S.prev_disk_io_counters, S.prev_vmstat = {}, {}, {}
+        self.assertFalse(any(d["download_kbps"] for d in S.calc_net_speed_by_devices().values()))
+        self.assertFalse(any(d["read_MBs"] for d in S.calc_io_speed_by_devices().values()))
+        P = ProcMonitor()
+        store = MetricStore(self.path).open()
+        restored = dict((k[len("baseline."):], v) for k, v in store.latest("baseline.")[1].items())
+        self.assertTrue(S.load_baselines(restored))
+        self.assertTrue(P.load_baselines(restored))
+        self.assertTrue(any(d["download_kbps"] for d in S.calc_net_speed_by_devices().values()))
+        self.assertTrue(any(d["read_MBs"] for d in S.calc_io_speed_by_devices().values()))
+        self.assertGreater(S.calc_vmstat_rates()["pgmajfault_per_s"], 0)
+        # 被监测进程在重新加入监测时恢复
+        P.watch_process(os.getpid())
+        self.assertIsNotNone(P.process_monitor_dict["process"][str(os.getpid())]["prev_io"])
+        self.assertGreaterEqual(P.calc_process_cpu_percent(os.getpid()), 0.)
+        self.assertFalse(P.load_baselines(dict(restored, btime=0)))
+
+    def test_flatten_snapshot(self):
+        self.assertEqual(flatten_snapshot({"sys": {"cpu": 1.5, "disk": [], "mem": {"total": 3}}}),
+                         {"sys.cpu": 1.5, "sys.mem.total": 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import unittest
+from time import time, sleep
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.mount_monitor import MountTable, StatvfsPool
+
+
+class TestMountMonitor(unittest.TestCase):
+    """挂载点监测测试类"""
+
+    def test_mount_table(self):
+        print "\n-----挂载表缓存测试-----"
+        mt = MountTable()
+        mount_points = mt.get_mount_points()
+        self.assertIn("/", mount_points)
+        # 挂载表未变化时直接返回缓存
+        self.assertIs(mount_points, mt.get_mount_points())
+        print "挂载点个数 :", len(mount_points)
+
+    def test_statvfs_timeout(self):
+        print "\n-----statvfs超时测试-----"
+
+        def statvfs(path):
+            if path == "/hung":  # 模拟失联的NFS
+                sleep(3)
+            return os.statvfs("/")
+
+        pool = StatvfsPool(workers=1, statvfs_func=statvfs)
+        start = time()
+        results, pending = pool.statvfs(["/hung", "/"], timeout=0.5)
+        self.assertLess(time() - start, 1.5)
+        self.assertIn("/", results)
+        self.assertEqual(pending, ["/hung"])
+        # 卡住的挂载点不会被重复提交
+        results, pending = pool.statvfs(["/hung", "/"], timeout=0.5, wait_for=["/"])
+        self.assertEqual(pending, ["/hung"])
+        print "耗时 :", round(time() - start, 2), "s"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import unittest
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.net_rate import NetRateEstimator, window_name
+
+
+class TestNetRate(unittest.TestCase):
+    """进程网络速率滑动窗口测试类"""
+
+    def test_states(self):
+        print "\n-----网络速率数据状态测试-----"
+        e = NetRateEstimator(windows=(10, 60))
+        rates = e.rates(1)
+        self.assertEqual(sorted(rates.keys()), ["10s", "1m"])
+        self.assertEqual(rates["10s"]["state"], "no_data")
+        self.assertIsNone(rates["10s"]["sent_kbps"])
+        e.add_sample(1, 1000., 0, 0)
+        self.assertEqual(e.rate(1, 10)["state"], "warming")
+        e.add_sample(1, 1005., 5 * 1024, 10 * 1024)
+        rate = e.rate(1, 10)
+        self.assertEqual(rate["state"], "partial")
+        self.assertEqual((rate["sent_kbps"], rate["recv_kbps"]), (1., 2.))
+        print rates, rate
+
+    def test_windows(self):
+        print "\n-----网络速率多窗口测试-----"
+        e = NetRateEstimator(windows=(10, 60), size=32)
+        # 前60秒 1KB/s, 之后10秒 10KB/s
+        sent = 0
+        for t in range(0, 61):
+            e.add_sample(1, float(t), sent, 0)
+            sent += 1024
+        for t in range(61, 71):
+            sent += 9 * 1024
+            e.add_sample(1, float(t), sent, 0)
+        self.assertLessEqual(len(e.processes[1].samples), 32)
+        recent, minute = e.rate(1, 10), e.rate(1, 60)
+        self.assertEqual(recent["state"], "ok")
+        self.assertEqual(minute["state"], "ok")
+        self.assertGreater(recent["sent_kbps"], 8.)
+        self.assertLess(minute["sent_kbps"], recent["sent_kbps"])
+        self.assertGreaterEqual(minute["span"], 60)
+        print recent, minute
+
+    def test_reset(self):
+        print "\n-----网络计数重置测试-----"
+        e = NetRateEstimator(windows=(10,))
+        e.add_sample(1, 1., 10000, 10000)
+        e.add_sample(1, 2., 20000, 20000)
+        e.add_sample(1, 3., 100, 100)  # 计数变小
+        self.assertEqual(e.rate(1, 10)["state"], "warming")
+        e.add_sample(1, 3., 200, 200)  # 时间戳未前进
+        self.assertEqual(len(e.processes[1].samples), 1)
+        e.remove(1)
+        self.assertEqual(e.rate(1, 10)["state"], "no_data")
+        self.assertEqual([window_name(w) for w in (10, 60, 90, 300)], ["10s", "1m", "90s", "5m"])
+
+
+if __name__ == '__main__':
+    unittest.main()
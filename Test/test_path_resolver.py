@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import unittest
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.path_resolver import path_resolver, PathResolver, PROC_ROOT, SYS_ROOT
+from Core.sys_monitor import SysMonitor
+from Core.process_monitor import ProcMonitor
+from Core.process_manage import ProcManager
+from Benchmark.proc_fixture import build_proc_tree, remove_proc_tree
+from Benchmark.bench_collectors import run
+
+
+class TestPathResolver(unittest.TestCase):
+    """/proc 及 /sys 路径解析测试类"""
+
+    def setUp(self):
+        self.root, self.pids = build_proc_tree(pids=10, threads=3, interfaces=2, partitions=3, cores=2)
+        path_resolver.set_root(os.path.join(self.root, "proc"), os.path.join(self.root, "sys"))
+
+    def tearDown(self):
+        path_resolver.set_root(PROC_ROOT, SYS_ROOT)
+        remove_proc_tree(self.root)
+
+    def test_path(self):
+        print "\n-----路径拼接测试-----"
+        resolver = PathResolver("/host/proc/", "/host/sys")
+        self.assertEqual(resolver.proc(), "/host/proc/")
+        resolver.set_root("/host/proc/")
+        self.assertEqual(resolver.proc(), "/host/proc")
+        self.assertEqual(resolver.proc(1, "task", 2, "stat"), "/host/proc/1/task/2/stat")
+        self.assertEqual(resolver.sys("block", "sda"), "/host/sys/block/sda")
+
+    def test_fixture_root(self):
+        print "\n-----合成数据目录读取测试-----"
+        sm, pm, manager = SysMonitor(), ProcMonitor(), ProcManager()
+        self.assertEqual(sm.get_mem_info()[0], 16303488)
+        self.assertEqual(sorted(sm.get_cpu_total_time_by_cores().keys()), ["cpu0", "cpu1"])
+        self.assertEqual(sm.get_all_net_device(), ["eth0", "eth1"])
+        self.assertEqual(sm.get_sys_loadavg_values()["total"], 11)
+        self.assertEqual(sorted(sm.refresh_disk_partitions().items()), [("sda1", 512), ("sdb1", 512), ("sdc1", 512)])
+        self.assertEqual(sorted(map(int, pm.get_all_pid())), [1] + self.pids)
+        pid = self.pids[0]
+        self.assertEqual(pm.get_process_info(pid)["comm"], "fixture-{} (worker)".format(pid))
+        self.assertEqual(len(pm.get_process_thread_ids(pid)), 3)
+        self.assertEqual(manager.get_process_info(pid)["cmdline"], "/usr/bin/fixture --worker {}".format(pid))
+        self.assertEqual(manager.get_process_execute_path(pid), self.root)
+        self.assertIn(str(pid), manager.get_all_child_process(1))
+        print sm.get_sys_info(), pm.get_process_mem_detail(pid)
+
+    def test_namespace(self):
+        print "\n-----命名空间测试-----"
+        proc = os.path.join(self.root, "proc")
+        self.assertEqual(path_resolver.proc_ns("net", "dev"), os.path.join(proc, "1", "net", "dev"))
+        self.assertEqual(path_resolver.host_path("/data"), os.path.join(proc, "1", "root") + "/data")
+        self.assertEqual(path_resolver.host_path("/sys/fs/cgroup"), os.path.join(self.root, "sys", "fs", "cgroup"))
+        self.assertEqual(SysMonitor().get_all_net_device(), ["eth0", "eth1"])  # 通过 /proc/1/net 读取
+        self.assertEqual(path_resolver.local_pid(self.pids[0]), self.pids[0])  # 同一PID命名空间
+        # 模拟在容器中运行 : 本进程在根目录中的进程号为5000, 容器内为7
+        os.makedirs(os.path.join(proc, "5000"))
+        with open(os.path.join(proc, "5000", "status"), "w") as f:
+            f.write("Name:\tpython\nPid:\t5000\nNSpid:\t5000\t7\n")
+        os.symlink("5000", os.path.join(proc, "self"))
+        path_resolver.set_root(proc)
+        self.assertEqual(path_resolver.get_ns_depth(), 2)
+        self.assertEqual(path_resolver.self_pid(), 5000)
+        same, other = self.pids[0], self.pids[1]
+        os.makedirs(os.path.join(proc, str(same), "ns"))
+        os.symlink(os.readlink("/proc/self/ns/pid"), os.path.join(proc, str(same), "ns", "pid"))
+        with open(os.path.join(proc, str(same), "status"), "w") as f:
+            f.write("Name:\tworker\nNSpid:\t{}\t42\n".format(same))
+        os.makedirs(os.path.join(proc, str(other), "ns"))
+        os.symlink("pid:[1]", os.path.join(proc, str(other), "ns", "pid"))
+        self.assertEqual(path_resolver.local_pid(same), 42)
+        self.assertEqual(path_resolver.local_pid(other), None)  # 不在本进程所在的PID命名空间中
+        self.assertEqual(ProcManager().get_process_info(same)["local_pid"], 42)
+
+    def test_benchmark(self):
+        print "\n-----性能测试结果格式测试-----"
+        result = run({"pids": 10, "threads": 2}, min_time=0, min_calls=2)
+        self.assertEqual(path_resolver.proc_root, os.path.join(self.root, "proc"))  # 运行结束后恢复根目录
+        self.assertIn("sampler.sample_once", result["results"])
+        for name, item in result["results"].items():
+            self.assertEqual(item["errors"], 0, name)
+            self.assertGreater(item["ops_per_sec"], 0)
+        print result["results"]["sampler.sample_once"]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import errno
+import subprocess
+import unittest
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.proc_file import ProcFileCache
+
+
+class TestProcFile(unittest.TestCase):
+    """/proc 文件描述符缓存测试类"""
+
+    def test_reuse(self):
+        print "\n-----描述符复用测试-----"
+        cache = ProcFileCache(max_fds=4, buffer_size=16)
+        for _ in range(3):
+            data = cache.read("/proc/self/stat", os.getpid())
+            self.assertTrue(data.startswith(str(os.getpid()) + " ("))
+        # 缓冲区不够时自动扩大, 内容完整
+        self.assertEqual(cache.read("/proc/cpuinfo"), open("/proc/cpuinfo").read())
+        stat = cache.get_stat()
+        self.assertEqual(stat["opens"], 2)
+        self.assertEqual(stat["hits"], 2)
+        self.assertEqual(stat["pids"], 1)
+        print stat
+
+    def test_bound(self):
+        print "\n-----描述符上限测试-----"
+        cache = ProcFileCache(max_fds=2)
+        for path in ("/proc/stat", "/proc/meminfo", "/proc/loadavg", "/proc/uptime"):
+            cache.read(path)
+        self.assertEqual(cache.get_stat()["open_fds"], 2)
+        self.assertEqual(list(cache.files.keys()), ["/proc/loadavg", "/proc/uptime"])
+        self.assertRaises(IOError, cache.read, "/proc/not_exist")
+        cache.close_all()
+        self.assertEqual(cache.get_stat()["open_fds"], 0)
+
+    def test_process_exit(self):
+        print "\n-----进程退出测试-----"
+        cache = ProcFileCache()
+        p = subprocess.Popen(["sleep", "30"])
+        cache.read("/proc/{}/stat".format(p.pid), p.pid)
+        cache.read("/proc/{}/statm".format(p.pid), p.pid)
+        p.kill()
+        p.wait()
+        try:
+            cache.read("/proc/{}/stat".format(p.pid), p.pid)
+            self.fail("read from exited process")
+        except IOError as err:
+            self.assertIn(err.errno, (errno.ESRCH, errno.ENOENT))
+        self.assertNotIn("/proc/{}/stat".format(p.pid), cache.files)
+        cache.close_pid(p.pid)
+        self.assertEqual(cache.get_stat()["open_fds"], 0)
+        self.assertEqual(cache.get_stat()["pids"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
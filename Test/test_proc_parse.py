@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import unittest
+from time import time
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.proc_parse import parse_stat, parse_io, parse_status
+from Core.proc_file import proc_file_cache
+from Core.sampler import Sampler
+from Core.sys_monitor import SysMonitor
+from Core.process_monitor import ProcMonitor
+
+BENCH_ROUNDS = 2000
+
+# 进程名中含有空格及括号
+STAT_SAMPLE = "1234 (a) b (c)) S 1 1234 1234 0 -1 4194560 100 200 3 4 50 60 7 8 20 0 3 0 1000 123456789 2048 " \
+              "18446744073709551615 1 1 0 0 0 0 0 0 0 0 0 0 17 0 0 0 0 0 0\n"
+IO_SAMPLE = "rchar: 1\nwchar: 2\nsyscr: 3\nsyscw: 4\nread_bytes: 5\nwrite_bytes: 6\ncancelled_write_bytes: 7\n"
+
+
+class TestProcParse(unittest.TestCase):
+    """/proc/[pid] 文件快速解析测试类"""
+
+    def test_parse_stat(self):
+        print "\n-----stat解析测试-----"
+        stat = parse_stat(STAT_SAMPLE)
+        self.assertEqual(stat["pid"], 1234)
+        self.assertEqual(stat["comm"], "a) b (c)")
+        self.assertEqual(stat["state"], "S")
+        self.assertEqual(stat["ppid"], 1)
+        self.assertEqual((stat["utime"], stat["stime"], stat["cutime"], stat["cstime"]), (50, 60, 7, 8))
+        self.assertEqual(stat["num_threads"], 3)
+        self.assertEqual(stat["rss"], 2048)
+        with open("/proc/self/stat") as f:
+            self.assertEqual(parse_stat(f.read())["pid"], os.getpid())
+        print stat
+
+    def test_parse_io_status(self):
+        print "\n-----io及status解析测试-----"
+        self.assertEqual(parse_io(IO_SAMPLE), {"rchar": 1, "wchar": 2, "syscr": 3, "syscw": 4, "read_bytes": 5,
+                                               "write_bytes": 6, "cancelled_write_bytes": 7})
+        with open("/proc/self/status") as f:
+            status = parse_status(f.read())
+        self.assertEqual(int(status["Pid"]), os.getpid())
+        self.assertIsInstance(status["VmRSS"], int)
+        print status["Name"], status["VmRSS"], "kB"
+
+    def test_one_read_per_tick(self):
+        print "\n-----每周期读取次数测试-----"
+        pid = os.getpid()
+        p = ProcMonitor()
+        p.watch_process(pid)
+        sampler = Sampler(SysMonitor(), p)
+        sampler.sample_once()
+        reads = []
+        read = proc_file_cache.read
+
+        def counting_read(path, pid=None):
+            reads.append(path)
+            return read(path, pid)
+
+        proc_file_cache.read = counting_read
+        try:
+            sampler.sample_once()
+        finally:
+            del proc_file_cache.read
+        self.assertEqual(reads.count("/proc/{}/stat".format(pid)), 1)
+        self.assertEqual(reads.count("/proc/{}/io".format(pid)), 1)
+        print "本周期读取的/proc文件 :", sorted(set(reads))
+
+    def test_benchmark(self):
+        print "\n-----解析速度对比-----"
+        path = "/proc/{}/stat".format(os.getpid())
+
+        def legacy():
+            # 原实现 : 进程信息, CPU时间片, 内存各自打开并分割一次
+            results = []
+            for _ in range(3):
+                with open(path, "r") as p_stat:
+                    results.append(p_stat.readline().split(" "))
+            return results[0][1], sum(map(int, results[1][13:17])), int(results[2][23])
+
+        def fast():
+            stat = parse_stat(proc_file_cache.read(path, os.getpid()))
+            return stat["comm"], stat["utime"] + stat["stime"] + stat["cutime"] + stat["cstime"], stat["rss"]
+
+        timings = {}
+        for name, func in (("legacy", legacy), ("fast", fast)):
+            start = time()
+            for _ in xrange(BENCH_ROUNDS):
+                func()
+            timings[name] = time() - start
+        for name in ("legacy", "fast"):
+            print "%-6s : %8.0f ops/s, %6.2f us/op" % (name, BENCH_ROUNDS / timings[name],
+                                                       timings[name] * 1e6 / BENCH_ROUNDS)
+        print "speedup : %.2fx" % (timings["legacy"] / timings["fast"])
+        proc_file_cache.close_pid(os.getpid())
+
+
+if __name__ == '__main__':
+    unittest.main()
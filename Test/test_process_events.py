@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import struct
+import unittest
+import subprocess
+from time import sleep, time
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.process_events import ProcessEventMonitor, parse_proc_events, NLMSG_HEADER, CN_MSG_HEADER, \
+    PROC_EVENT_HEADER, CN_IDX_PROC, CN_VAL_PROC, PROC_EVENT_FORK, PROC_EVENT_EXIT
+
+
+def make_message(what, event_data):
+    """构造一条proc connector消息"""
+    payload = PROC_EVENT_HEADER.pack(what, 0, 0) + event_data
+    cn_msg = CN_MSG_HEADER.pack(CN_IDX_PROC, CN_VAL_PROC, 0, 0, len(payload), 0) + payload
+    return NLMSG_HEADER.pack(NLMSG_HEADER.size + len(cn_msg), 3, 0, 0, 0) + cn_msg
+
+
+class TestProcessEvents(unittest.TestCase):
+    """进程事件监听测试类"""
+
+    def test_parse(self):
+        print "\n-----netlink消息解析测试-----"
+        data = make_message(PROC_EVENT_FORK, struct.pack("=iiii", 1, 1, 100, 100)) + \
+            make_message(PROC_EVENT_FORK, struct.pack("=iiii", 100, 100, 101, 100)) + \
+            make_message(PROC_EVENT_EXIT, struct.pack("=iiII", 100, 100, 9, 17))
+        events = parse_proc_events(data)
+        print events
+        # 线程创建(101)被忽略
+        self.assertEqual(events, [("fork", 100, 1, None), ("exit", 100, None, 9)])
+
+    def test_poll(self):
+        print "\n-----进程事件轮询测试-----"
+        monitor = ProcessEventMonitor(poll_interval=0.1, use_netlink=False)
+        received = []
+        monitor.subscribe(received.append)
+        monitor.start()
+        self.assertEqual(monitor.mode, "poll")
+        self.assertIn(os.getpid(), monitor.get_pids())
+
+        child = subprocess.Popen(["sleep", "30"])
+        deadline = time() + 5
+        while child.pid not in monitor.get_pids() and time() < deadline:
+            sleep(0.1)
+        self.assertEqual(monitor.get_process(child.pid)["ppid"], os.getpid())
+        child.kill()
+        child.wait()
+        while child.pid in monitor.get_pids() and time() < deadline:
+            sleep(0.1)
+        monitor.stop()
+
+        child_events = [e["event"] for e in received if e["pid"] == child.pid]
+        print child_events
+        self.assertEqual(child_events, ["fork", "exit"])
+        self.assertEqual(monitor.get_events(received[-1]["seq"]), [])
+
+    def test_subscriber_error(self):
+        print "\n-----订阅者异常记录测试-----"
+        monitor = ProcessEventMonitor(use_netlink=False)
+        received = []
+        monitor.subscribe(lambda event: 1 / 0)
+        monitor.subscribe(received.append)
+        monitor.emit("fork", 100, 1)
+        monitor.emit("exit", 100)
+        errors = monitor.get_subscriber_errors()
+        print errors["last"]
+        # 出错的订阅者不影响其他订阅者
+        self.assertEqual([e["event"] for e in received], ["fork", "exit"])
+        self.assertEqual(errors["count"], 2)
+        self.assertIn("ZeroDivisionError", errors["last"])
+
+
+if __name__ == '__main__':
+    unittest.main()
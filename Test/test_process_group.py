@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import signal
+import unittest
+import subprocess
+from time import sleep, time
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.sys_monitor import SysMonitor
+from Core.process_events import ProcessEventMonitor
+from Core.process_group import ProcessGroupMonitor, get_descendants
+
+
+class TestProcessGroup(unittest.TestCase):
+    """进程组汇总监测测试类"""
+
+    def setUp(self):
+        # 一个父进程(sh) + 一个占用CPU的子进程 + 一个空闲子进程
+        self.service = subprocess.Popen(
+            ["sh", "-c", sys.executable + " -c 'while 1: pass' & sleep 34 & wait"], preexec_fn=os.setsid)
+        sleep(0.3)
+
+    def tearDown(self):
+        os.killpg(self.service.pid, signal.SIGKILL)
+        self.service.wait()
+
+    def test_descendants(self):
+        print "\n-----进程树测试-----"
+        self.assertEqual(get_descendants(1, {1: [2, 3], 3: [4], 4: [5]}), set([2, 3, 4, 5]))
+
+    def test_group_poll(self):
+        print "\n-----进程组汇总测试(扫描进程树)-----"
+        groups = ProcessGroupMonitor(SysMonitor())
+        self.assertFalse(groups.add_group(999999999))
+        self.assertTrue(groups.add_group(self.service.pid))
+        groups.collect()
+        sleep(1)
+        data = groups.collect()[str(self.service.pid)]
+        print data
+        self.assertEqual(data["members"], 3)
+        self.assertTrue(data["root_alive"])
+        self.assertGreater(data["cpu_percent"], 0)
+        self.assertGreater(data["rss_M"], 0)
+        self.assertGreaterEqual(data["threads"], 3)
+        self.assertTrue(groups.remove_group(self.service.pid))
+        self.assertEqual(groups.collect(), {})
+
+    def test_group_events(self):
+        print "\n-----进程组汇总测试(进程事件)-----"
+        events = ProcessEventMonitor(poll_interval=0.1, use_netlink=False)
+        events.start()
+        groups = ProcessGroupMonitor(SysMonitor(), events)
+        events.subscribe(groups.on_process_event)
+        self.assertTrue(groups.add_group(self.service.pid))
+        self.assertEqual(len(groups.get_all_groups()[self.service.pid]), 3)
+        # 组内进程退出
+        sleep_pid = [pid for pid in groups.get_all_groups()[self.service.pid]
+                     if events.get_process(pid)["comm"] == "sleep"][0]
+        os.kill(sleep_pid, signal.SIGKILL)
+        deadline = time() + 5
+        while len(groups.get_all_groups()[self.service.pid]) != 2 and time() < deadline:
+            sleep(0.1)
+        events.stop()
+        self.assertEqual(len(groups.get_all_groups()[self.service.pid]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@
 
 import os
 import sys
+import ctypes
 import unittest
 from time import sleep
 
@@ -10,7 +11,7 @@ root_path = os.path.dirname(sys.path[0])
 os.chdir(root_path)
 sys.path.append(root_path)
 
-from Core.process_monitor import ProcMonitor
+from Core.process_monitor import ProcMonitor, NethogsMonitorRecord, Action
 from Core.process_manage import ProcManager
 
 
@@ -86,6 +87,28 @@ class TestSysMontor(unittest.TestCase):
         else:
             print "未获取到{}进程".format(self.test_process_name)
 
+    def test_process_mem_detail(self):
+        """进程内存明细测试"""
+        print "进程内存明细测试",
+        md = self.P.get_process_mem_detail(self.pid)
+        self.assertIsInstance(md, dict)
+        self.assertGreater(md["rss"], 0)
+        print md
+        self.assertEqual(self.P.get_process_mem_statm(self.pid)["source"], "statm")
+        # 预算耗尽时退化为statm
+        self.assertEqual(self.P.collect_process_mem_detail([self.pid], budget=-1)[self.pid]["source"], "statm")
+        self.assertIn(self.pid, self.P.collect_process_mem_detail([self.pid]))
+
+    def test_process_threads(self):
+        """进程线程CPU占用率测试"""
+        print "进程线程CPU占用率测试",
+        self.P.calc_process_thread_cpu_percent(self.pid)
+        sum(range(1000000))
+        threads = self.P.calc_process_thread_cpu_percent(self.pid, top_n=1, max_threads=1)
+        self.assertEqual(len(threads), 1)
+        self.assertEqual(threads[0]["tid"], self.pid)
+        print threads
+
     def test_process_path(self):
         """进程相关路径大小测试"""
         print "进程相关路径大小测试",
@@ -105,14 +128,44 @@ class TestSysMontor(unittest.TestCase):
             sleep(5)
             self.assertIsInstance(self.P.get_process_net_info(self.pid), dict)
             u, d = self.P.calc_process_net_speed(self.pid)
-            self.assertIsInstance(u, float)
-            self.assertIsInstance(d, float)
+            # 没有nethogs数据时为None
+            self.assertIsInstance(u, (float, type(None)))
+            self.assertIsInstance(d, (float, type(None)))
             print "上传速度", u, "KB/s"
             print "下载速度", d, "KB/s"
 
         else:
             print "未获取到{}进程".format(self.test_process_name)
 
+    def test_process_net_slot(self):
+        """nethogs回调数据传递测试"""
+        print "nethogs回调数据传递测试"
+        record = NethogsMonitorRecord(record_id=1, name="test", pid=self.pid, uid=0, device_name="lo",
+                                      sent_bytes=2048, recv_bytes=1024, sent_kbs=1.234, recv_kbs=0.5)
+        self.assertEqual(self.P.read_process_net_data(self.pid), {})
+        self.P.network_activity_callback(Action.SET, ctypes.pointer(record))
+        data = self.P.read_process_net_data(self.pid)
+        self.assertEqual(data["pid"], self.pid)
+        self.assertEqual(data["device"], "lo")
+        self.assertEqual(data["action"], "SET")
+        self.assertEqual((data["sent_bytes"], data["recv_bytes"]), (2048, 1024))
+        self.assertEqual(data["sent_kbs"], 1.23)
+        self.assertEqual(len(data["str_time"]), 8)
+        # 未被监测的进程不写入
+        record.pid = self.pid + 100000
+        self.P.network_activity_callback(Action.SET, ctypes.pointer(record))
+        self.assertEqual(self.P.read_process_net_data(self.pid + 100000), {})
+        # 读取时加入速率样本
+        self.P.calc_process_net_speed(self.pid)
+        record.pid, record.sent_bytes = self.pid, 2048 + 10240
+        self.P.network_activity_callback(Action.SET, ctypes.pointer(record))
+        sleep(0.1)
+        u, d = self.P.calc_process_net_speed(self.pid)
+        self.assertGreater(u, 0)
+        self.assertEqual(d, 0)
+        self.assertEqual(self.P.get_process_net_rates(self.pid)["10s"]["state"], "partial")
+        print data
+
     def teardown_class(self):
         print "clear..."
         os.kill(os.getpid(), 9)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import unittest
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.sampler import Sampler
+from Core.sys_monitor import SysMonitor
+from Core.process_monitor import ProcMonitor
+from Core.process_group import ProcessGroupMonitor
+from Core.exposition import escape_label_value
+
+
+class TestSampler(unittest.TestCase):
+    """采样及指标导出测试类"""
+
+    def setUp(self):
+        self.P = ProcMonitor()
+        self.S = SysMonitor()
+        self.P.watch_process(os.getpid())
+        self.sampler = Sampler(self.S, self.P)
+
+    def test_sample_once(self):
+        print "\n-----采样测试-----"
+        snapshot = self.sampler.sample_once()
+        self.assertEqual(snapshot["seq"], 1)
+        self.assertIsInstance(snapshot["sys"], dict)
+        self.assertIn(str(os.getpid()), snapshot["process"])
+        print "采样序号 :", snapshot["seq"]
+        print "采样错误 :", snapshot["errors"]
+        self.assertEqual(self.sampler.sample_once()["seq"], 2)
+
+    def test_metrics_text(self):
+        print "\n-----指标导出测试-----"
+        self.sampler.sample_once()
+        text = self.sampler.get_metrics_text()
+        self.assertIn("# TYPE watchdogs_cpu_percent gauge", text)
+        self.assertIn('watchdogs_process_cpu_percent{pid="%d"' % os.getpid(), text)
+        # 同一快照只渲染一次
+        self.assertIs(text, self.sampler.get_metrics_text())
+        self.sampler.sample_once()
+        self.assertIsNot(text, self.sampler.get_metrics_text())
+        print text.splitlines()[0]
+
+    def test_process_groups(self):
+        print "\n-----进程组采样测试-----"
+        groups = ProcessGroupMonitor(self.S)
+        groups.add_group(os.getpid())
+        self.sampler.process_groups = groups
+        snapshot = self.sampler.sample_once()
+        self.assertEqual(snapshot["process_groups"][str(os.getpid())]["members"], 1)
+        self.assertIn('watchdogs_process_group_rss_megabytes{root_pid="%d"' % os.getpid(),
+                      self.sampler.get_metrics_text())
+
+    def test_collectors(self):
+        print "\n-----采集项配置测试-----"
+        sampler = Sampler(self.S, self.P, interval=5, collectors={"disk": {"enabled": False},
+                                                                  "mem_detail": {"interval": 10}})
+        snapshot = sampler.sample_once()
+        self.assertNotIn("disk", snapshot["sys"])
+        self.assertIn("cpu_percent", snapshot["sys"])
+        mem_detail = snapshot["process"][str(os.getpid())]["mem_detail"]
+        # 内存明细未到期时沿用上次结果
+        self.assertEqual(sampler.sample_once()["process"][str(os.getpid())]["mem_detail"], mem_detail)
+        self.assertEqual(sampler.registry.get("mem_detail").skips, 1)
+
+    def test_escape_label_value(self):
+        self.assertEqual(escape_label_value('a"b\\c\n'), 'a\\"b\\\\c\\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
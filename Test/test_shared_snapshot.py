@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import imp
+import json
+import shutil
+import tempfile
+import unittest
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+import tornado.web
+from tornado.httpserver import HTTPServer
+from tornado.testing import AsyncHTTPTestCase, bind_unused_port
+
+from setting import Setting
+from Core.shared_snapshot import SharedSnapshotWriter, SharedSnapshotReader, SharedSnapshotBusy, HEADER, LOCK, \
+    LOCK_OFFSET
+from Core.sampler import Sampler
+from Core.sys_monitor import SysMonitor
+from Core.process_monitor import ProcMonitor
+from Core.exposition import CONTENT_TYPE
+from handlers import WORKER_TOKEN_HEADER
+
+SIZE = 1024 * 1024
+
+
+def make_data(seq):
+    return json.dumps({"snapshot": {"seq": seq, "sys": {"cpu_percent": float(seq)}, "process": {}},
+                       "collectors": [], "sampling": {}})
+
+
+class TestSharedSnapshot(unittest.TestCase):
+    """采样快照共享内存测试类"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="watch_dogs_shm_")
+        self.path = os.path.join(self.tmp, "snapshot.shm")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_publish(self):
+        print "\n-----共享快照发布及读取测试-----"
+        writer = SharedSnapshotWriter(self.path, SIZE)
+        reader = SharedSnapshotReader(self.path)
+        self.assertEqual(reader.read(), (None, ""))
+        writer.publish(1, make_data(1), "a 1\n")
+        data, text = reader.read()
+        self.assertEqual(data["snapshot"]["seq"], 1)
+        self.assertEqual(text, "a 1\n")
+        # 同一份快照只解码一次
+        self.assertIs(reader.read()[0], data)
+        writer.publish(2, make_data(2), "a 2\n")
+        self.assertEqual(reader.read()[0]["snapshot"]["seq"], 2)
+        # 超出映射大小
+        self.assertRaises(ValueError, writer.publish, 3, "x" * SIZE, "")
+        self.assertEqual(reader.read()[0]["snapshot"]["seq"], 2)
+        # 写入中 (锁序号为奇数) 时读取者不会返回不完整的数据
+        LOCK.pack_into(writer.mm, LOCK_OFFSET, writer.lock_seq + 1)
+        reader.cache = (None, None, "")
+        self.assertRaises(SharedSnapshotBusy, reader.read)
+        LOCK.pack_into(writer.mm, LOCK_OFFSET, writer.lock_seq)
+        # 采样进程重启后锁序号继续递增
+        lock_seq = writer.lock_seq
+        writer.close()
+        writer = SharedSnapshotWriter(self.path, SIZE)
+        self.assertGreaterEqual(writer.lock_seq, lock_seq)
+        writer.publish(1, make_data(1), "")
+        self.assertEqual(reader.read()[0]["snapshot"]["seq"], 1)
+        # 以较小的大小重启 : 文件不缩小, 已映射文件的读取者不受影响
+        SharedSnapshotWriter(self.path, HEADER.size + 1024).publish(2, make_data(2), "")
+        self.assertEqual(os.path.getsize(self.path), SIZE)
+        self.assertEqual(reader.read()[0]["snapshot"]["seq"], 2)
+        print "锁序号 :", HEADER.unpack_from(reader.mm, 0)[2]
+
+    def test_concurrent_read(self):
+        print "\n-----共享快照多进程读写一致性测试-----"
+        writer = SharedSnapshotWriter(self.path, SIZE)
+        writer.publish(1, make_data(1), "seq 1\n" * 2)
+        pid = os.fork()
+        if pid == 0:  # 读取进程 : 每次读到的JSON与指标文本属于同一份快照
+            code = 0
+            try:
+                reader = SharedSnapshotReader(self.path)
+                for _ in range(3000):
+                    data, text = reader.read()
+                    if text != "seq {}\n".format(data["snapshot"]["seq"]) * (data["snapshot"]["seq"] % 50 + 1):
+                        code = 1
+                        break
+            except Exception as err:
+                print "读取错误 :", repr(err)
+                code = 2
+            os._exit(code)
+        for seq in range(2, 3000):
+            writer.publish(seq, make_data(seq), "seq {}\n".format(seq) * (seq % 50 + 1))
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.WEXITSTATUS(status), 0)
+
+    def test_sampler_publish(self):
+        print "\n-----采样发布共享快照测试-----"
+        P = ProcMonitor()
+        P.watch_process(os.getpid())
+        sampler = Sampler(SysMonitor(), P, shared=SharedSnapshotWriter(self.path, SIZE))
+        snapshot = sampler.sample_once()
+        data, text = SharedSnapshotReader(self.path).read()
+        self.assertEqual(data["snapshot"]["seq"], snapshot["seq"])
+        self.assertIn(str(os.getpid()), data["snapshot"]["process"])
+        self.assertEqual(text, sampler.get_metrics_text())
+        self.assertEqual([c["name"] for c in data["collectors"]], [c["name"] for c in sampler.scheduler.describe()])
+        self.assertIn("proc_fd_cache", data["sampling"])
+        # 超出映射大小时记录错误, 不影响采样
+        sampler.shared = SharedSnapshotWriter(os.path.join(self.tmp, "small.shm"), HEADER.size + 16)
+        self.assertIn("shared_snapshot", sampler.sample_once()["errors"])
+
+
+class TestWorker(AsyncHTTPTestCase):
+    """HTTP工作进程接口测试类"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="watch_dogs_shm_")
+        self.path = os.path.join(self.tmp, "snapshot.shm")
+        self.writer = SharedSnapshotWriter(self.path, SIZE)
+        super(TestWorker, self).setUp()
+
+    def tearDown(self):
+        super(TestWorker, self).tearDown()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def get_app(self):
+        worker = imp.load_source("watch_dogs_worker", os.path.join(root_path, "Watch_Dogs-Worker.py"))
+        app = worker.make_app(SharedSnapshotReader(self.path), Setting())
+        app.worker_token = "token"
+        return app
+
+    def start_upstream(self):
+        """模拟采样进程 : 返回转发请求中的令牌"""
+        class UpstreamHandler(tornado.web.RequestHandler):
+            def get(self):
+                self.set_status(404 if self.request.path == "/nope" else 200)
+                self.finish({"path": self.request.uri, "token": self.request.headers.get(WORKER_TOKEN_HEADER)})
+
+        sock, port = bind_unused_port()
+        server = HTTPServer(tornado.web.Application([(r".*", UpstreamHandler)]))
+        server.add_sockets([sock])
+        self._app.upstream = "http://127.0.0.1:{}".format(port)
+        return server
+
+    def test_routes(self):
+        print "\n-----HTTP工作进程接口测试-----"
+        self.assertEqual(self.fetch("/metrics").code, 503)
+        snapshot = {"seq": 7, "sys": {"pressure": {"cpu": {"some_avg10": 0.1}}, "cpu_percent": 12.5,
+                                      "cpu_percents": {"cpu0": 12.5}, "mem": {"percent": 40.0},
+                                      "net": {"upload_kbps": 1.0, "download_kbps": 2.0},
+                                      "io": {"read_MBs": 3.0, "write_MBs": 4.0}},
+                    "process": {"42": {"sockets": {"tcp": {"ESTABLISHED": 3}}, "cpu_percent": 5.0, "io_read_MBs": 0.5,
+                                       "io_write_MBs": 0.25, "top_threads": [{"tid": 42}, {"tid": 43}]}},
+                    "cgroups": {}, "process_groups": {}}
+        self.writer.publish(7, json.dumps({"snapshot": snapshot, "collectors": [{"name": "mem"}],
+                                           "sampling": {"cpu_budget": 0.01}}), "watch_dogs_up 1\n")
+        response = self.fetch("/metrics")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, "watch_dogs_up 1\n")
+        self.assertEqual(response.headers["Content-Type"], CONTENT_TYPE)
+        self.assertEqual(json.loads(self.fetch("/sys/pressure").body), snapshot["sys"]["pressure"])
+        self.assertEqual(json.loads(self.fetch("/sys/vmstat").body), {})
+        self.assertEqual(json.loads(self.fetch("/sys/collectors").body), [{"name": "mem"}])
+        self.assertEqual(json.loads(self.fetch("/proc/42/sockets").body), {"tcp": {"ESTABLISHED": 3}})
+        self.assertIn("Error", json.loads(self.fetch("/proc/43/sockets").body))
+        self.assertEqual(json.loads(self.fetch("/snapshot").body)["seq"], 7)
+        # 基于采样快照的接口
+        self.assertEqual(self.fetch("/sys/cpu/percent").body, "12.5")
+        self.assertEqual(json.loads(self.fetch("/sys/cpu/percents").body), {"cpu0": 12.5})
+        self.assertEqual(self.fetch("/sys/mem/percent").body, "40.0")
+        self.assertEqual(json.loads(self.fetch("/sys/net").body), [1.0, 2.0])
+        self.assertEqual(json.loads(self.fetch("/sys/io").body), [3.0, 4.0])
+        self.assertEqual(json.loads(self.fetch("/proc/42/cpu").body), 5.0)
+        self.assertEqual(json.loads(self.fetch("/proc/43/cpu").body), -1)
+        self.assertEqual(json.loads(self.fetch("/proc/42/io").body), [0.5, 0.25])
+        self.assertEqual(json.loads(self.fetch("/proc/42/threads?n=1").body), [{"tid": 42}])
+        self.assertEqual(self.fetch("/proc/42/threads?n=100").code, 400)
+
+    def test_proxy(self):
+        print "\n-----HTTP工作进程转发测试-----"
+        self.assertEqual(self.fetch("/proc/kill/42").code, 502)  # 采样进程未启动
+        upstream = self.start_upstream()
+        response = self.fetch("/proc/kill/42?n=1")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body), {"path": "/proc/kill/42?n=1", "token": "token"})
+        self.assertEqual(self.fetch("/nope").code, 404)
+        upstream.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import math
+import shutil
+import tempfile
+import unittest
+from timeit import default_timer
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.snapshot_export import SnapshotExportWriter, SnapshotExportReader, EXPORT_HEADER, EXPORT_PROCESS, \
+    EXPORT_SYS_FIELDS, export_size
+from Core.sampler import Sampler
+from Core.sys_monitor import SysMonitor
+from Core.process_monitor import ProcMonitor
+
+
+def make_snapshot(seq, pids):
+    return {"seq": seq, "timestamp": 1000. + seq,
+            "sys": {"cpu_percent": float(seq), "mem": {"total": 1024, "available": 512, "percent": 50.},
+                    "pressure": {"cpu": {"some_avg10": 0.5}}},
+            "process": dict((str(pid), {"comm": "proc-%d" % pid, "state": "S", "threads": seq, "cpu_percent": 1.5,
+                                        "mem_M": 10., "io_read_MBs": 0.1, "io_write_MBs": 0.2}) for pid in pids)}
+
+
+class TestSnapshotExport(unittest.TestCase):
+    """固定二进制格式快照导出测试类"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="watch_dogs_export_")
+        self.path = os.path.join(self.tmp, "snapshot.export")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_layout(self):
+        print "\n-----导出文件格式测试-----"
+        self.assertEqual(EXPORT_HEADER.size, 40)
+        self.assertEqual(EXPORT_PROCESS.size, 64)
+        SnapshotExportWriter(self.path, capacity=16)
+        self.assertEqual(os.path.getsize(self.path), export_size(16))
+        print "文件大小 :", export_size(16), "系统数值 :", len(EXPORT_SYS_FIELDS)
+
+    def test_publish(self):
+        print "\n-----导出及读取测试-----"
+        writer = SnapshotExportWriter(self.path, capacity=16)
+        reader = SnapshotExportReader(self.path)
+        self.assertEqual(reader.read_header()[0], 0)
+        self.assertEqual(writer.publish(make_snapshot(3, [300, 20, 1000])), 0)
+        self.assertEqual(reader.read_header(), (3, 1003., 3))
+        self.assertEqual(reader.get("cpu_percent"), 3.)
+        self.assertEqual(reader.get("pressure_cpu_some_avg10"), 0.5)
+        self.assertTrue(math.isnan(reader.get("loadavg_1")))  # 无数据
+        values = reader.get_sys()
+        self.assertEqual((values["seq"], values["mem_total_kb"], values["mem_percent"]), (3, 1024., 50.))
+        self.assertEqual([p["pid"] for p in reader.get_processes()], [20, 300, 1000])
+        process = reader.get_process(300)
+        self.assertEqual((process["comm"], process["state"], process["threads"]), ("proc-300", "S", 3))
+        self.assertIsNone(reader.get_process(301))
+        # 进程减少后不再读到旧记录
+        writer.publish(make_snapshot(4, [1000]))
+        self.assertEqual([p["pid"] for p in reader.get_processes()], [1000])
+        self.assertIsNone(reader.get_process(20))
+        # 超出容量
+        self.assertEqual(writer.publish(make_snapshot(5, range(1, 21))), 4)
+        self.assertEqual(len(reader.get_processes()), 16)
+        # 以较小的容量重启 : 文件不缩小, 已映射文件的读取者不受影响
+        SnapshotExportWriter(self.path, capacity=4).publish(make_snapshot(6, [7]))
+        self.assertEqual(os.path.getsize(self.path), export_size(16))
+        self.assertEqual([p["pid"] for p in reader.get_processes()], [7])
+        # 版本不一致
+        with open(os.path.join(self.tmp, "other"), "wb") as f:
+            f.write("\0" * 4096)
+        self.assertRaises(ValueError, SnapshotExportReader, os.path.join(self.tmp, "other"))
+
+        start, n = default_timer(), 10000
+        for _ in xrange(n):
+            reader.get("cpu_percent")
+        print "单个数值读取耗时 : %.2f us" % ((default_timer() - start) / n * 1e6)
+
+    def test_concurrent_read(self):
+        print "\n-----导出多进程读写一致性测试-----"
+        writer = SnapshotExportWriter(self.path, capacity=64)
+        writer.publish(make_snapshot(1, range(1, 3)))
+        pid = os.fork()
+        if pid == 0:  # 读取进程 : 同一次读取中各进程的线程数(快照序号)相同, 进程数与快照序号一致
+            code = 0
+            try:
+                reader = SnapshotExportReader(self.path)
+                for _ in range(3000):
+                    processes = reader.get_processes()
+                    if len(set(p["threads"] for p in processes)) != 1 or \
+                            processes[-1]["pid"] != processes[0]["threads"] % 60 + 1:
+                        code = 1
+                        break
+            except Exception as err:
+                print "读取错误 :", repr(err)
+                code = 2
+            os._exit(code)
+        for seq in range(2, 3000):
+            writer.publish(make_snapshot(seq, range(1, seq % 60 + 2)))
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.WEXITSTATUS(status), 0)
+
+    def test_sampler_export(self):
+        print "\n-----采样导出测试-----"
+        P = ProcMonitor()
+        P.watch_process(os.getpid())
+        sampler = Sampler(SysMonitor(), P, export=SnapshotExportWriter(self.path, capacity=4))
+        snapshot = sampler.sample_once()
+        reader = SnapshotExportReader(self.path)
+        self.assertEqual(reader.read_header()[0], snapshot["seq"])
+        self.assertEqual(reader.get("cpu_percent"), snapshot["sys"]["cpu_percent"])
+        self.assertEqual(reader.get_process(os.getpid())["comm"], snapshot["process"][str(os.getpid())]["comm"])
+        self.assertNotIn("snapshot_export", snapshot["errors"])
+        print reader.get_sys()
+
+
+if __name__ == '__main__':
+    unittest.main()
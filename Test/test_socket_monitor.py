@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import shutil
+import socket
+import tempfile
+import unittest
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.socket_monitor import SocketMonitor, scan_socket_table
+
+TCP_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+TCP_LINE = "   {}: 0100007F:1F90 0100007F:D2F0 {} 00000000:00000000 00:00000000 {:08X}     0        0 {} 1 " \
+           "0000000000000000 20 4 30 10 -1\n"
+SNMP = "Tcp: RtoAlgorithm ActiveOpens PassiveOpens AttemptFails EstabResets CurrEstab InSegs OutSegs RetransSegs " \
+       "InErrs\nTcp: 1 {} 5 0 0 2 100 {} {} 0\n" \
+       "Udp: InDatagrams NoPorts InErrors OutDatagrams RcvbufErrors SndbufErrors\nUdp: 10 0 0 10 0 0\n"
+
+
+class TestSocketMonitor(unittest.TestCase):
+    """套接字及连接统计测试类"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.net_path = os.path.join(self.tmp_dir, "net")
+        self.proc_path = os.path.join(self.tmp_dir, "proc")
+        os.makedirs(self.net_path)
+        # 进程100 : fd 3,4 为套接字, fd 5 为普通文件
+        os.makedirs(os.path.join(self.proc_path, "100", "fd"))
+        os.symlink("socket:[1001]", os.path.join(self.proc_path, "100", "fd", "3"))
+        os.symlink("socket:[1002]", os.path.join(self.proc_path, "100", "fd", "4"))
+        os.symlink("/var/log/syslog", os.path.join(self.proc_path, "100", "fd", "5"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, content):
+        with open(os.path.join(self.net_path, name), "w") as f:
+            f.write(content)
+
+    def test_fixture(self):
+        print "\n-----套接字统计测试(模拟数据)-----"
+        self.write("tcp", TCP_HEADER + TCP_LINE.format(0, "01", 3, 1001) + TCP_LINE.format(1, "0A", 0, 2000) +
+                   TCP_LINE.format(2, "06", 0, 0))
+        self.write("tcp6", TCP_HEADER + TCP_LINE.format(0, "01", 1, 2001))
+        self.write("udp", TCP_HEADER + TCP_LINE.format(0, "07", 0, 1002))
+        self.write("snmp", SNMP.format(10, 1000, 0))
+        monitor = SocketMonitor(self.net_path, self.proc_path)
+        host, processes = monitor.collect([100])
+        print host, processes
+        self.assertEqual(host["tcp"], {"ESTABLISHED": 2, "LISTEN": 1, "TIME_WAIT": 1})
+        self.assertEqual(host["tcp_total"], 4)
+        self.assertEqual(host["udp"], 1)
+        self.assertEqual(processes[100], {"tcp": {"ESTABLISHED": 1}, "udp": 1, "retransmits": 3})
+        self.assertEqual(sorted(monitor.fd_cache[100].keys()), ["3", "4", "5"])
+
+        # snmp 速率
+        monitor.prev_snmp_time -= 1
+        self.write("snmp", SNMP.format(20, 2000, 50))
+        snmp = monitor.collect([100])[0]["snmp"]
+        self.assertAlmostEqual(snmp["tcp_active_opens_per_s"], 10, delta=1)
+        self.assertAlmostEqual(snmp["tcp_retrans_percent"], 5, delta=0.1)
+        # fd 3 关闭后被复用为新的套接字 (未到完整重新解析的周期)
+        os.remove(os.path.join(self.proc_path, "100", "fd", "3"))
+        os.symlink("socket:[1003]", os.path.join(self.proc_path, "100", "fd", "3"))
+        self.write("tcp", TCP_HEADER + TCP_LINE.format(0, "0A", 0, 1003))
+        monitor.collect([100])  # 套接字表只解析一次, 更新后的映射在下一次采样时使用
+        self.assertEqual(monitor.fd_cache[100]["3"], "1003")
+        processes = monitor.collect([100])[1]
+        self.assertEqual(processes[100], {"tcp": {"LISTEN": 1}, "udp": 1, "retransmits": 0})
+        # 不在套接字表中的套接字(如unix套接字)不反复解析
+        os.symlink("socket:[3001]", os.path.join(self.proc_path, "100", "fd", "6"))
+        monitor.collect([100])
+        os.remove(os.path.join(self.proc_path, "100", "fd", "6"))
+        os.symlink("socket:[3002]", os.path.join(self.proc_path, "100", "fd", "6"))
+        monitor.collect([100])
+        self.assertEqual(monitor.fd_cache[100]["6"], "3001")
+        # 不再监测的进程清理缓存
+        monitor.collect([])
+        self.assertEqual(monitor.fd_cache, {})
+
+    def test_live(self):
+        print "\n-----套接字统计测试(本机)-----"
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        try:
+            host, processes = SocketMonitor().collect([os.getpid()])
+        finally:
+            server.close()
+        print host
+        self.assertGreaterEqual(host["tcp"].get("LISTEN", 0), 1)
+        self.assertGreaterEqual(processes[os.getpid()]["tcp"].get("LISTEN", 0), 1)
+
+    def test_missing_table(self):
+        self.assertEqual(scan_socket_table(os.path.join(self.net_path, "tcp6"), {}), ({}, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import unittest
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.spool import SnapshotSpool
+
+
+def make_snapshot(seq):
+    return {"seq": seq, "timestamp": 1000. + seq, "sys": {"cpu_percent": float(seq)}, "process": {}}
+
+
+class TestSpool(unittest.TestCase):
+    """快照缓冲测试类"""
+
+    def test_since(self):
+        print "\n-----快照缓冲补齐测试-----"
+        spool = SnapshotSpool(size=10, rollup=3)
+        for seq in range(1, 6):
+            spool.push(make_snapshot(seq))
+        self.assertEqual([e["seq"] for e in spool.since(3)], [4, 5])
+        self.assertEqual(spool.first_seq(), 1)
+
+    def test_rollup(self):
+        print "\n-----快照缓冲压缩测试-----"
+        spool = SnapshotSpool(size=6, rollup=3)
+        for seq in range(1, 31):
+            spool.push(make_snapshot(seq))
+        entries = spool.since(0)
+        self.assertLessEqual(len(entries), 6)
+        self.assertEqual(entries[-1]["seq"], 30)
+        self.assertEqual(spool.first_seq(), 1)
+        # 序号连续, 没有遗漏
+        seqs = [(e.get("first_seq", e["seq"]), e["seq"]) for e in entries]
+        for (_, prev_end), (start, _) in zip(seqs, seqs[1:]):
+            self.assertEqual(start, prev_end + 1)
+        rollup = entries[0]
+        self.assertEqual(rollup["kind"], "rollup")
+        cpu = rollup["data"]["sys.cpu_percent"]
+        self.assertEqual(cpu["min"], 1.)
+        self.assertAlmostEqual(cpu["avg"], (rollup["first_seq"] + rollup["seq"]) / 2.)
+        for e in entries:
+            print e["kind"], e.get("first_seq", e["seq"]), "-", e["seq"]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -77,6 +77,49 @@ class TestSysMontor(unittest.TestCase):
         self.assertIsInstance(self.S.get_intranet_ip(), str)
         print "本地内网IP :", self.S.get_intranet_ip()
 
+    def test_net_devices(self):
+        print "\n-----各网卡信息-----"
+        counters = self.S.get_net_dev_counters()
+        self.assertIn("lo", counters)
+        self.assertEqual(len(counters["lo"]), 16)
+        self.assertNotIn("lo", self.S.get_all_net_device())
+        self.assertEqual(self.S.get_net_dev_data("no-such-device"), (-1, -1))
+        self.S.calc_net_speed_by_devices()
+        speed = self.S.calc_net_speed_by_devices()
+        for device in speed.keys():
+            print device, ":", speed[device]
+        self.assertEqual(set(speed.keys()), set(counters.keys()))
+
+    def test_io_devices(self):
+        print "\n-----各分区IO信息-----"
+        self.S.calc_io_speed_by_devices()
+        sector_sizes = self.S.disk_sector_sizes
+        io = self.S.calc_io_speed_by_devices()
+        self.assertIsInstance(io, dict)
+        # 分区未变化时不重新读取扇区大小
+        self.assertIs(sector_sizes, self.S.disk_sector_sizes)
+        self.assertTrue(set(io.keys()) <= set(sector_sizes.keys()))
+        for name in io.keys():
+            print name, ":", io[name]
+
+    def test_pressure_vmstat(self):
+        print "\n-----资源压力及虚拟内存事件-----"
+        la = self.S.get_sys_loadavg_values()
+        self.assertIsInstance(la["lavg_1"], float)
+        self.assertLessEqual(la["running"], la["total"])
+        self.S.calc_pressure()
+        pressure = self.S.calc_pressure()
+        if os.path.exists("/proc/pressure/cpu"):
+            self.assertIn("some_avg10", pressure["cpu"])
+            self.assertGreaterEqual(pressure["cpu"]["some_percent"], 0)
+        else:
+            self.assertEqual(pressure, {})
+        print "资源压力 :", pressure
+        self.S.calc_vmstat_rates()
+        vmstat = self.S.calc_vmstat_rates()
+        self.assertGreaterEqual(vmstat["pgmajfault_per_s"], 0)
+        print "虚拟内存事件 :", vmstat
+
     def test_dist_montor(self):
         print "\n-----磁盘信息-----"
         ds = self.S.get_disk_stat(style="G")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+from time import sleep, time
+
+root_path = os.path.dirname(sys.path[0])
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from Core.process_monitor import ProcMonitor
+from Core.process_events import ProcessEventMonitor
+from Core.watch_rules import WatchRuleManager, WatchRule
+
+
+def list_pids():
+    return [int(pid) for pid in os.listdir("/proc") if pid.isdigit()]
+
+
+class TestWatchRules(unittest.TestCase):
+    """按规则监测进程测试类"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "watch_rules.json")
+        self.p = ProcMonitor()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_match(self):
+        print "\n-----规则匹配测试-----"
+        pid = os.getpid()
+        comm = open("/proc/{}/comm".format(pid)).read().strip()
+        self.assertTrue(WatchRule(1, "comm", comm).match(pid, {}))
+        self.assertTrue(WatchRule(2, "regex", r"test_watch_rules\.py").match(pid, {}))
+        self.assertTrue(WatchRule(3, "exe", os.readlink("/proc/self/exe")).match(pid, {}))
+        self.assertFalse(WatchRule(4, "cmdline", "no-such-process-keyword").match(pid, {}))
+        self.assertRaises(ValueError, WatchRule, 5, "unknown", "x")
+
+    def test_restart(self):
+        print "\n-----进程重启后自动监测测试-----"
+        rules = WatchRuleManager(self.p, self.path)
+        rules.refresh(list_pids())
+        rule = rules.add_rule("cmdline", "sleep 31.5")
+        child = subprocess.Popen(["sleep", "31.5"])
+        sleep(0.1)
+        rules.refresh(list_pids())
+        self.assertTrue(self.p.is_process_watched(child.pid))
+        # 模拟重启
+        child.kill()
+        child.wait()
+        new_child = subprocess.Popen(["sleep", "31.5"])
+        sleep(0.1)
+        rules.refresh(list_pids())
+        self.assertFalse(self.p.is_process_watched(child.pid))
+        self.assertTrue(self.p.is_process_watched(new_child.pid))
+        print rules.get_attached()
+        # 规则持久化
+        restored = WatchRuleManager(self.p, self.path).load()
+        self.assertEqual(restored.get_rules(), [rule])
+        self.assertTrue(rules.remove_rule(rule["id"]))
+        self.assertFalse(self.p.is_process_watched(new_child.pid))
+        new_child.kill()
+        new_child.wait()
+
+    def test_events(self):
+        print "\n-----基于进程事件的规则匹配测试-----"
+        events = ProcessEventMonitor(poll_interval=0.1, use_netlink=False)
+        rules = WatchRuleManager(self.p)
+        rules.add_rule("regex", r"^sleep 32\.5$")
+        events.subscribe(rules.on_process_event)
+        events.start()
+        child = subprocess.Popen(["sleep", "32.5"])
+        deadline = time() + 5
+        while not self.p.is_process_watched(child.pid) and time() < deadline:
+            sleep(0.1)
+        self.assertTrue(self.p.is_process_watched(child.pid))
+        child.kill()
+        child.wait()
+        while self.p.is_process_watched(child.pid) and time() < deadline:
+            sleep(0.1)
+        events.stop()
+        self.assertFalse(self.p.is_process_watched(child.pid))
+
+    def test_exec(self):
+        print "\n-----执行新程序后重新匹配测试-----"
+        rules = WatchRuleManager(self.p)
+        rules.add_rule("cmdline", "watch_dogs_exec_test")
+        # 子进程先继承匹配的命令行, 之后执行不匹配的新程序
+        child = subprocess.Popen(["sh", "-c", "sleep 1; exec sleep 30", "watch_dogs_exec_test"])
+        deadline = time() + 5
+        while "watch_dogs_exec_test" not in open("/proc/{}/cmdline".format(child.pid)).read() and time() < deadline:
+            sleep(0.01)
+        rules.on_process_event({"event": "fork", "pid": child.pid})
+        self.assertTrue(self.p.is_process_watched(child.pid))
+        while "watch_dogs_exec_test" in open("/proc/{}/cmdline".format(child.pid)).read() and time() < deadline:
+            sleep(0.1)
+        rules.on_process_event({"event": "exec", "pid": child.pid})
+        self.assertFalse(self.p.is_process_watched(child.pid))
+        self.assertNotIn(child.pid, rules.get_attached())
+        child.kill()
+        child.wait()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,23 +7,50 @@ Watch_Dogs
 
 - 来源验证
 - 异步响应
+- 本机程序可以通过Unix域套接字访问接口 (由文件权限控制访问, 不检查来源地址)
+- 多进程模式 : 本进程负责采样及全部接口, 快照发布到共享内存, 由多个HTTP工作进程(Watch_Dogs-Worker.py)提供只读接口
 """
 
+import os
+import re
+import sys
+import stat
+import signal
+import hmac
+import json
 import getpass
+import binascii
 import functools
 import traceback
-from tornado.ioloop import IOLoop
+import subprocess
+from tornado.ioloop import IOLoop, PeriodicCallback
 from tornado.wsgi import WSGIContainer
 from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_unix_socket
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 
 from setting import Setting
 
+from Core.sampler import Sampler
+from Core.exposition import CONTENT_TYPE
+from Core.metric_store import MetricStore
+from Core.spool import SnapshotSpool
+from Core.shared_snapshot import SharedSnapshotWriter
+from Core.snapshot_export import SnapshotExportWriter
 from Core.sys_monitor import SysMonitor
 from Core.process_manage import ProcManager
 from Core.process_monitor import ProcMonitor
+from Core.process_events import ProcessEventMonitor
+from Core.watch_rules import WatchRuleManager
+from Core.process_group import ProcessGroupMonitor
+from Core.cgroup_monitor import CgroupMonitor
+from Core.socket_monitor import SocketMonitor
+from Core.proc_file import proc_file_cache
+from Core.path_resolver import path_resolver
+from Core.address_filter import AddressFilter
 from Core.prcess_exception import NoWatchedProcess
+from handlers import WORKER_TOKEN_ENVIRON, WORKER_TOKEN_HEADER
 
 app = Flask("Watch_Dogs-Client")
 
@@ -31,15 +58,75 @@ app = Flask("Watch_Dogs-Client")
 setting = Setting()
 logger = setting.logger
 ALLOWED_REQUEST_ADDR = setting.ALLOWED_REQUEST_ADDR_LIST
+address_filter = AddressFilter(ALLOWED_REQUEST_ADDR)  # 允许的地址及网段, 启动时预先解析
+UNIX_SOCKET_ENVIRON = "watch_dogs.unix_socket"  # 经由Unix域套接字的请求在WSGI environ中的标记
+WORKER_ENVIRON = "watch_dogs.worker"  # HTTP工作进程转发的请求(已检查过请求地址)在WSGI environ中的标记
 LINUX_USER = getpass.getuser()
+# /proc 及 /sys 根目录 (必须在创建各监测对象之前设置)
+path_resolver.set_root(Setting.PROC_ROOT, Setting.SYS_ROOT)
 system_monitor = SysMonitor()
-process_monitor = ProcMonitor(net_monitor=Setting.NET_MONITOR)
+process_monitor = ProcMonitor(net_monitor=Setting.NET_MONITOR, net_rate_windows=Setting.NET_RATE_WINDOWS)
 process_manager = ProcManager()
-# 初始化监控数据
-system_monitor.calc_cpu_percent()
-system_monitor.calc_cpu_percent_by_cores()
-system_monitor.calc_net_speed()
-system_monitor.calc_io_speed()
+# 本地持久化存储
+metric_store = None
+if Setting.STORE_PATH:
+    metric_store = MetricStore(Setting.STORE_PATH, Setting.STORE_SEGMENT_SIZE, Setting.STORE_SEGMENT_SECONDS,
+                               Setting.STORE_MAX_SEGMENTS).open()
+# 初始化监控数据 (优先从本地存储恢复上次运行时的数据, 被监测进程的数据在按规则重新关联时恢复)
+baselines = dict((k[len("baseline."):], v) for k, v in metric_store.latest("baseline.")[1].items()) \
+    if metric_store else {}
+if system_monitor.load_baselines(baselines):
+    process_monitor.load_baselines(baselines)
+    logger.info("restore monitor baselines from " + Setting.STORE_PATH)
+else:
+    system_monitor.calc_cpu_percent()
+    system_monitor.calc_cpu_percent_by_cores()
+    system_monitor.calc_net_speed()
+    system_monitor.calc_io_speed()
+# 进程事件监听 (被监测进程退出时立即得到通知)
+process_event_monitor = None
+if Setting.PROC_EVENTS:
+    process_event_monitor = ProcessEventMonitor(poll_interval=Setting.PROC_POLL_INTERVAL)
+    process_event_monitor.subscribe(process_monitor.on_process_event)
+    process_event_monitor.start()
+    logger.info("process event monitor start in " + process_event_monitor.mode + " mode")
+# 按规则监测进程 (有进程事件监听时只匹配新进程, 否则每次采样前比较进程号集合)
+watch_rules = WatchRuleManager(process_monitor, Setting.WATCH_RULES_PATH or None).load()
+if process_event_monitor is not None:
+    watch_rules.refresh(process_event_monitor.get_pids())
+    process_event_monitor.subscribe(watch_rules.on_process_event)
+# 进程组汇总监测
+process_group_monitor = ProcessGroupMonitor(system_monitor, process_event_monitor)
+if process_event_monitor is not None:
+    process_event_monitor.subscribe(process_group_monitor.on_process_event)
+# cgroup监测
+cgroup_monitor = None
+if Setting.CGROUP_MONITOR:
+    try:
+        cgroup_monitor = CgroupMonitor(subtree=Setting.CGROUP_SUBTREE, max_depth=Setting.CGROUP_MAX_DEPTH,
+                                       max_cgroups=Setting.CGROUP_MAX)
+    except IOError as err:
+        logger.warning("cgroup monitor initial failed : " + str(err))
+# 套接字及连接统计 (不依赖nethogs)
+socket_monitor = SocketMonitor() if Setting.SOCKET_MONITOR else None
+# /proc 热点文件描述符缓存上限
+proc_file_cache.max_fds = Setting.PROC_FD_CACHE_SIZE
+# 后台采样
+spool = SnapshotSpool(Setting.SPOOL_SIZE, Setting.SPOOL_ROLLUP)
+# 多进程模式 : 快照发布到共享内存, 供HTTP工作进程读取
+shared_snapshot = None
+if Setting.HTTP_WORKERS > 0:
+    shared_snapshot = SharedSnapshotWriter(Setting.SHARED_SNAPSHOT_PATH, Setting.SHARED_SNAPSHOT_SIZE)
+# 固定二进制格式的快照导出 (同一主机上的其他程序直接读取, 不经过HTTP)
+snapshot_export = None
+if Setting.SNAPSHOT_EXPORT_PATH:
+    snapshot_export = SnapshotExportWriter(Setting.SNAPSHOT_EXPORT_PATH, Setting.SNAPSHOT_EXPORT_CAPACITY)
+sampler = Sampler(system_monitor, process_monitor, interval=Setting.SAMPLE_INTERVAL, store=metric_store, spool=spool,
+                  watch_rules=watch_rules if process_event_monitor is None else None,
+                  process_groups=process_group_monitor, cgroups=cgroup_monitor, sockets=socket_monitor,
+                  collectors=Setting.COLLECTORS, cpu_budget=Setting.SAMPLE_CPU_BUDGET, shared=shared_snapshot,
+                  export=snapshot_export, top_threads=Setting.TOP_THREADS)
+sampler.start()
 # log
 logger.info("Watch_Dogs-Clinet @ " + str(system_monitor.get_intranet_ip()) + " start at " + setting.get_local_time())
 START_TIME = setting.get_local_time()
@@ -52,12 +139,13 @@ START_TIME = setting.get_local_time()
 
 def request_source_check(func):
     """装饰器 - 请求地址识别"""
-    global ALLOWED_REQUEST_ADDR
+    global address_filter
 
     @functools.wraps(func)
     def wrapper(*args, **kw):
-        # 验证请求地址
-        if request.remote_addr not in ALLOWED_REQUEST_ADDR and "0.0.0.0" not in ALLOWED_REQUEST_ADDR:
+        # 验证请求地址 (Unix域套接字的请求由文件权限控制, 工作进程转发的请求已由工作进程检查)
+        if not request.environ.get(UNIX_SOCKET_ENVIRON) and not request.environ.get(WORKER_ENVIRON) \
+                and not address_filter.is_allowed(request.remote_addr):
             logger.error("Unknown request addr - " + str(request.remote_addr))
             return jsonify({"Error": "Unknown request addr - " + str(request.remote_addr)}), 403
         try:
@@ -72,6 +160,15 @@ def request_source_check(func):
     return wrapper
 
 
+def get_sampled_process(pid):
+    """
+    被监测进程在最近一次采样中的数据 (刚加入监测尚未被采样时为空)
+    CPU占用率, IO速度及线程CPU占用率依赖上一次计算的基准, 只由采样线程计算, 接口不再调用这些计算函数
+    """
+    global sampler
+    return sampler.get_snapshot()["process"].get(str(pid), {})
+
+
 # -----index-----
 @app.route("/")
 @request_source_check
@@ -82,11 +179,59 @@ def index():
         "time": setting.get_local_time(),
         "nethogs env": process_monitor.is_libnethogs_install(),
         "nethogs status": process_monitor.nethogs_running_status,
-        "start time": START_TIME
+        "start time": START_TIME,
+        "proc root": path_resolver.proc_root,
+        "sys root": path_resolver.sys_root
     }
     return jsonify(res)
 
 
+# -----metrics-----
+@app.route("/metrics")
+@request_source_check
+def metrics():
+    global sampler
+    return Response(sampler.get_metrics_text(), content_type=CONTENT_TYPE)
+
+
+@app.route("/history")
+@request_source_check
+def history():
+    global metric_store
+    if metric_store is None:
+        return jsonify({"ERROR": "metric store disabled"})
+    since, start, end, names = 0, None, None, None
+    if request.args.has_key("since"):
+        since = int(request.args.get("since"))
+    if request.args.has_key("start"):
+        start = float(request.args.get("start"))
+    if request.args.has_key("end"):
+        end = float(request.args.get("end"))
+    if request.args.has_key("name"):
+        names = [name.encode('utf-8') for name in request.args.getlist("name")]
+    res = {}
+    for seq, timestamp, name, value in metric_store.query(since, start, end, names):
+        res.setdefault(name, []).append((seq, timestamp, value))
+    return jsonify(res)
+
+
+@app.route("/sync")
+@request_source_check
+def sync():
+    """按序号补齐服务端错过的快照 (每行一条JSON记录)"""
+    global spool
+    since = 0
+    if request.args.has_key("since"):
+        since = int(request.args.get("since"))
+    entries = spool.since(since)
+
+    def generate():
+        for entry in entries:
+            yield json.dumps(entry) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
 # -----sys------
 @app.route("/sys/info")
 @request_source_check
@@ -104,6 +249,38 @@ def sys_loadavg():
     return jsonify(system_monitor.get_sys_loadavg())
 
 
+@app.route("/sys/pressure")
+@request_source_check
+def sys_pressure():
+    """资源压力(PSI) (来自最近一次采样)"""
+    global sampler
+    return jsonify(sampler.get_snapshot()["sys"].get("pressure", {}))
+
+
+@app.route("/sys/vmstat")
+@request_source_check
+def sys_vmstat():
+    """虚拟内存事件速率 (来自最近一次采样)"""
+    global sampler
+    return jsonify(sampler.get_snapshot()["sys"].get("vmstat", {}))
+
+
+@app.route("/sys/collectors")
+@request_source_check
+def sys_collectors():
+    """各采集项的配置间隔, 生效间隔, 耗时预算及耗时统计"""
+    global sampler
+    return jsonify(sampler.scheduler.describe())
+
+
+@app.route("/sys/sampling")
+@request_source_check
+def sys_sampling():
+    """自适应采样状态 : 采样线程CPU占用, 各优先级拉长倍数及各采集项的生效间隔(秒), /proc文件描述符缓存状态"""
+    global sampler
+    return jsonify(sampler.get_sampling_status())
+
+
 @app.route("/sys/uptime")
 @request_source_check
 def sys_uptime():
@@ -121,15 +298,17 @@ def sys_cpu_info():
 @app.route("/sys/cpu/percent")
 @request_source_check
 def sys_cpu_percent():
-    global system_monitor
-    return str(system_monitor.calc_cpu_percent())
+    """CPU总占用率 (来自最近一次采样)"""
+    global sampler
+    return str(sampler.get_snapshot()["sys"]["cpu_percent"])
 
 
 @app.route("/sys/cpu/percents")
 @request_source_check
 def sys_cpu_percents():
-    global system_monitor
-    return jsonify(system_monitor.calc_cpu_percent_by_cores())
+    """CPU各核心占用率 (来自最近一次采样)"""
+    global sampler
+    return jsonify(sampler.get_snapshot()["sys"]["cpu_percents"])
 
 
 @app.route("/sys/mem/info")
@@ -156,8 +335,10 @@ def sys_mem_percent():
 @app.route("/sys/net")
 @request_source_check
 def sys_net_percent():
-    global system_monitor
-    return jsonify(system_monitor.calc_net_speed())
+    """默认网卡上传,下载速度(Kbps) (来自最近一次采样)"""
+    global sampler
+    net = sampler.get_snapshot()["sys"]["net"]
+    return jsonify([net["upload_kbps"], net["download_kbps"]])
 
 
 @app.route("/sys/net/devices")
@@ -167,6 +348,21 @@ def sys_net_devices():
     return jsonify(system_monitor.get_all_net_device())
 
 
+@app.route("/sys/net/devices/speed")
+@request_source_check
+def sys_net_devices_speed():
+    global sampler
+    return jsonify(sampler.get_snapshot()["sys"].get("net_devices", {}))
+
+
+@app.route("/sys/net/sockets")
+@request_source_check
+def sys_net_sockets():
+    """各状态TCP连接数, UDP套接字数及TCP/UDP计数速率 (来自最近一次采样)"""
+    global sampler
+    return jsonify(sampler.get_snapshot()["sys"].get("sockets", {}))
+
+
 @app.route("/sys/net/default_device")
 @request_source_check
 def sys_net_defaultdevice():
@@ -188,8 +384,17 @@ def sys_net_ip():
 @app.route("/sys/io")
 @request_source_check
 def sys_io():
-    global system_monitor
-    return jsonify(system_monitor.calc_io_speed())
+    """读取,写入速度(MB/s) (来自最近一次采样)"""
+    global sampler
+    io = sampler.get_snapshot()["sys"]["io"]
+    return jsonify([io["read_MBs"], io["write_MBs"]])
+
+
+@app.route("/sys/io/devices")
+@request_source_check
+def sys_io_devices():
+    global sampler
+    return jsonify(sampler.get_snapshot()["sys"].get("io_devices", {}))
 
 
 @app.route("/sys/disk/stat")
@@ -310,29 +515,44 @@ def process_all_info(pid):
     """进程所有信息汇总"""
     global process_monitor
     if not process_monitor.is_process_watched(pid):
-        # import! : 如果未被进程初始化, 则初始化之后在进行计算进程数据
+        # import! : 如果未被进程初始化, 则初始化之后在进行计算进程数据 (CPU占用率及IO速度由采样线程计算)
         process_monitor.watch_process(pid)
         # init process data
-        process_monitor.calc_process_cpu_percent(pid)
-        process_monitor.calc_process_io_speed(pid)
         if process_monitor.net_monitor_ability:
             process_monitor.calc_process_net_speed(pid)
         logger.info("add process watch pid = {}".format(str(pid)))
         logger.info("now watched process list :" + str(process_monitor.get_all_watched_pid()))
     res = process_monitor.get_process_info(pid)
-    res["cpu"] = process_monitor.calc_process_cpu_percent(pid)
-    res["io"] = process_monitor.calc_process_io_speed(pid)
+    process_data = get_sampled_process(pid)
+    res["cpu"] = process_data.get("cpu_percent", 0.)
+    res["io"] = [process_data.get("io_read_MBs", 0.), process_data.get("io_write_MBs", 0.)]
     res["mem"] = process_monitor.get_process_mem(pid)
     if process_monitor.nethogs_running_status:
         res["net_recent"] = process_monitor.calc_process_net_speed(pid, speed_type="recent")
         res["net"] = process_monitor.calc_process_net_speed(pid, speed_type="long")
+        res["net_rates"] = process_monitor.get_process_net_rates(pid)
     else:  # nethogs error
-        res["net_recent"] = [-0.1, -0.1]
-        res["net"] = [-0.1, -0.1]
+        res["net_recent"] = [None, None]
+        res["net"] = [None, None]
+        res["net_rates"] = None
     logger.info("collect process({}) info.".format(str(pid)))
     return jsonify(res)
 
 
+@app.route("/proc/events")
+@request_source_check
+def proc_events():
+    """最近的进程事件(fork/exec/exit)"""
+    global process_event_monitor
+    if process_event_monitor is None:
+        return jsonify({"mode": None, "events": [], "subscriber_errors": {"count": 0, "last": None}})
+    since = 0
+    if request.args.has_key("since"):
+        since = int(request.args.get("since"))
+    return jsonify({"mode": process_event_monitor.mode, "events": process_event_monitor.get_events(since),
+                    "subscriber_errors": process_event_monitor.get_subscriber_errors()})
+
+
 @app.route("/proc/all_pid/")
 @request_source_check
 def proc_all_pid():
@@ -370,8 +590,6 @@ def proc_watch_add_pid(pid):
     if not process_monitor.is_process_watched(pid):
         process_monitor.watch_process(pid)
         # init process data
-        process_monitor.calc_process_cpu_percent(pid)
-        process_monitor.calc_process_io_speed(pid)
         if process_monitor.net_monitor_ability:
             process_monitor.calc_process_net_speed(pid)
         logger.info("add process watch pid = {}".format(str(pid)))
@@ -389,6 +607,106 @@ def proc_watch_remove_pid(pid):
     return str(process_monitor.is_process_watched(pid))
 
 
+@app.route("/proc/watch/rules")
+@request_source_check
+def proc_watch_rules():
+    """所有监测规则及由规则加入监测的进程"""
+    global watch_rules
+    return jsonify({"rules": watch_rules.get_rules(),
+                    "attached": dict((str(pid), rule_id) for pid, rule_id in watch_rules.get_attached().items())})
+
+
+@app.route("/proc/watch/rules/add")
+@request_source_check
+def proc_watch_rules_add():
+    """添加监测规则"""
+    global watch_rules, process_event_monitor
+    rule_type = request.args.get("type", "cmdline").encode("utf-8")
+    pattern = request.args.get("pattern", "").encode("utf-8")
+    if not pattern:
+        return jsonify({"Error": "pattern is required"}), 400
+    pids = process_event_monitor.get_pids() if process_event_monitor is not None else None
+    try:
+        rule = watch_rules.add_rule(rule_type, pattern, pids)
+    except (ValueError, re.error) as err:
+        return jsonify({"Error": str(err)}), 400
+    logger.info("add watch rule {}".format(str(rule)))
+    logger.info("now watched process list :" + str(process_monitor.get_all_watched_pid()))
+    return jsonify(rule)
+
+
+@app.route("/proc/watch/rules/remove/<int:rule_id>")
+@request_source_check
+def proc_watch_rules_remove(rule_id):
+    """删除监测规则"""
+    global watch_rules
+    removed = watch_rules.remove_rule(rule_id)
+    logger.info("watch rule {} removed".format(str(rule_id)))
+    return str(removed)
+
+
+# -----cgroup-----
+
+@app.route("/cgroup/stat")
+@request_source_check
+def cgroup_stat():
+    """所有cgroup的CPU,内存,IO,进程数 (来自最近一次采样)"""
+    global sampler
+    return jsonify(sampler.get_snapshot().get("cgroups", {}))
+
+
+@app.route("/cgroup/pid/<int:pid>")
+@request_source_check
+def cgroup_pid(pid):
+    """进程所属的cgroup {控制器: cgroup路径}"""
+    global cgroup_monitor
+    if cgroup_monitor is None:
+        return jsonify({"Error": "cgroup monitor is not running"})
+    cgroups = cgroup_monitor.get_pid_cgroups(pid)
+    if cgroups is None:
+        return jsonify({"Error": "No such process {}".format(str(pid))})
+    return jsonify({"cgroup": cgroup_monitor.get_pid_cgroup(pid), "controllers": cgroups})
+
+
+# -----process group-----
+
+@app.route("/proc/group/all")
+@request_source_check
+def proc_group_all():
+    """所有进程组的汇总数据 (来自最近一次采样)"""
+    global sampler
+    return jsonify(sampler.get_snapshot().get("process_groups", {}))
+
+
+@app.route("/proc/group/add/<int:pid>")
+@request_source_check
+def proc_group_add(pid):
+    """添加进程组监测 (进程及其所有子孙进程)"""
+    global process_group_monitor
+    added = process_group_monitor.add_group(pid)
+    if added:
+        logger.info("add process group watch root pid = {}".format(str(pid)))
+    return str(added)
+
+
+@app.route("/proc/group/remove/<int:pid>")
+@request_source_check
+def proc_group_remove(pid):
+    """移除进程组监测"""
+    global process_group_monitor
+    removed = process_group_monitor.remove_group(pid)
+    logger.info("process group root pid = {} removed".format(str(pid)))
+    return str(removed)
+
+
+@app.route("/proc/group/members/<int:pid>")
+@request_source_check
+def proc_group_members(pid):
+    """进程组成员"""
+    global process_group_monitor
+    return jsonify(process_group_monitor.get_all_groups().get(pid, []))
+
+
 # -----process-----
 
 @app.route("/proc/<int:pid>/info")
@@ -401,15 +719,22 @@ def proc_pid_info(pid):
 @app.route("/proc/<int:pid>/cpu")
 @request_source_check
 def proc_pid_cpu(pid):
+    """进程CPU占用率 (来自最近一次采样, 进程未被监测时为-1)"""
     global process_monitor
-    return jsonify(process_monitor.calc_process_cpu_percent(pid))
+    if not process_monitor.is_process_watched(pid):
+        return jsonify(-1)
+    return jsonify(get_sampled_process(pid).get("cpu_percent", 0.))
 
 
 @app.route("/proc/<int:pid>/io")
 @request_source_check
 def proc_pid_io(pid):
+    """进程IO读取,写入速度(MB/s) (来自最近一次采样, 进程未被监测时为-1)"""
     global process_monitor
-    return jsonify(process_monitor.calc_process_io_speed(pid, style="M"))
+    if not process_monitor.is_process_watched(pid):
+        return jsonify([-1., -1.])
+    process_data = get_sampled_process(pid)
+    return jsonify([process_data.get("io_read_MBs", 0.), process_data.get("io_write_MBs", 0.)])
 
 
 @app.route("/proc/<int:pid>/net")
@@ -419,6 +744,25 @@ def proc_pid_net(pid):
     return jsonify(process_monitor.calc_process_net_speed(pid))
 
 
+@app.route("/proc/<int:pid>/net/rates")
+@request_source_check
+def proc_pid_net_rates(pid):
+    """进程各窗口(默认10秒/1分钟/5分钟)的网络上传,下载速度及数据状态"""
+    global process_monitor
+    return jsonify(process_monitor.get_process_net_rates(pid))
+
+
+@app.route("/proc/<int:pid>/sockets")
+@request_source_check
+def proc_pid_sockets(pid):
+    """进程各状态TCP连接数, UDP套接字数及重传次数 (来自最近一次采样, 进程需被监测)"""
+    global sampler
+    process_data = sampler.get_snapshot()["process"].get(str(pid))
+    if process_data is None:
+        return jsonify({"Error": NoWatchedProcess(pid).msg})
+    return jsonify(process_data.get("sockets", {}))
+
+
 @app.route("/proc/<int:pid>/mem")
 @request_source_check
 def proc_pid_mem(pid):
@@ -426,6 +770,28 @@ def proc_pid_mem(pid):
     return jsonify(process_monitor.get_process_mem(pid))
 
 
+@app.route("/proc/<int:pid>/mem/detail")
+@request_source_check
+def proc_pid_mem_detail(pid):
+    global process_monitor
+    return jsonify(process_monitor.get_process_mem_detail(pid))
+
+
+@app.route("/proc/<int:pid>/threads")
+@request_source_check
+def proc_pid_threads(pid):
+    """CPU占用率最高的n个线程 (来自最近一次采样, 最多为配置的top_threads个, 进程需被监测)"""
+    global process_monitor, sampler
+    n = sampler.top_threads
+    if request.args.has_key("n"):
+        n = int(request.args.get("n").encode('utf-8'))
+    if n > sampler.top_threads:
+        return jsonify({"Error": "n must not exceed top_threads ({}) in setting.json".format(sampler.top_threads)}), 400
+    if not process_monitor.is_process_watched(pid):
+        return jsonify({"Error": NoWatchedProcess(pid).msg})
+    return jsonify(get_sampled_process(pid).get("top_threads", [])[:n])
+
+
 @app.route("/path/size/total")
 @request_source_check
 def path_size_total():
@@ -457,12 +823,103 @@ def api_no_found(e):
 
 # todo : 直接改用tornado部署Watch_Dogs-Client
 
+# -----http workers-----
+WORKER_CHECK_INTERVAL = 5000  # 检查HTTP工作进程是否存活的间隔(毫秒)
+http_workers = []
+worker_token = binascii.hexlify(os.urandom(16))  # 确认转发的请求来自本进程启动的工作进程
+
+
+def start_http_worker():
+    """启动一个HTTP工作进程 (全新的解释器, 不继承本进程的采样线程及描述符)"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env[WORKER_TOKEN_ENVIRON] = worker_token
+    return subprocess.Popen([sys.executable, os.path.join(root, "Watch_Dogs-Worker.py")], cwd=root, close_fds=True,
+                            env=env)
+
+
+def check_http_workers():
+    """重新启动已退出的HTTP工作进程"""
+    global http_workers
+    for i, worker in enumerate(http_workers):
+        if worker.poll() is not None:
+            logger.warning("http worker {} exit with code {}, restart".format(worker.pid, worker.returncode))
+            http_workers[i] = start_http_worker()
+
+
+def worker_app(environ, start_response):
+    """多进程模式下本进程只接收工作进程转发的请求 : 令牌正确时标记后交给flask应用"""
+    token = environ.get("HTTP_" + WORKER_TOKEN_HEADER.upper().replace("-", "_"), "")
+    if hmac.compare_digest(token, worker_token):
+        environ[WORKER_ENVIRON] = True
+    return app(environ, start_response)
+
+
+def unix_socket_app(environ, start_response):
+    """经由Unix域套接字的请求 : 标记后交给flask应用"""
+    environ[UNIX_SOCKET_ENVIRON] = True
+    return app(environ, start_response)
+
+
+def remove_unix_socket():
+    """删除Unix域套接字文件 (路径已被替换为其他类型的文件时保留)"""
+    try:
+        if stat.S_ISSOCK(os.lstat(Setting.UNIX_SOCKET_PATH).st_mode):
+            os.remove(Setting.UNIX_SOCKET_PATH)
+    except OSError:
+        pass
+
+
+def stop_http_workers():
+    """结束所有HTTP工作进程"""
+    global http_workers
+    for worker in http_workers:
+        if worker.poll() is None:
+            worker.terminate()
+    for worker in http_workers:
+        worker.wait()
+
+
+def shutdown(signum, frame):
+    """收到SIGTERM : 停止IOLoop, 由主流程完成清理后退出"""
+    IOLoop.instance().add_callback_from_signal(IOLoop.instance().stop)
+
+
+def cleanup():
+    """退出前清理 : 停止采样线程, 关闭本地存储及快照文件, 结束HTTP工作进程, 删除Unix域套接字文件"""
+    sampler.stop()
+    for writer in (metric_store, shared_snapshot, snapshot_export):
+        if writer is not None:
+            writer.close()
+    stop_http_workers()
+    if Setting.UNIX_SOCKET_PATH:
+        remove_unix_socket()
+
 
 if __name__ == "__main__":
-    # 利用tornado部署flask应用
-    http_server = HTTPServer(WSGIContainer(app))
-    http_server.listen(setting.PORT, )
-    IOLoop.instance().start()
+    if Setting.HTTP_WORKERS > 0:
+        # 多进程模式 : HTTP工作进程监听对外的端口, 本进程只在本机地址上接收工作进程转发的请求
+        http_server = HTTPServer(WSGIContainer(worker_app))
+        http_server.listen(Setting.WORKER_PORT, address="127.0.0.1")
+        http_workers = [start_http_worker() for _ in range(Setting.HTTP_WORKERS)]
+        PeriodicCallback(check_http_workers, WORKER_CHECK_INTERVAL).start()
+        logger.info("start {} http workers on port {}".format(Setting.HTTP_WORKERS, setting.PORT))
+    else:
+        # 利用tornado部署flask应用
+        http_server = HTTPServer(WSGIContainer(app))
+        http_server.listen(setting.PORT, )
+    # 本机访问 : Unix域套接字 (权限由 unix_socket_mode 控制)
+    if Setting.UNIX_SOCKET_PATH:
+        unix_server = HTTPServer(WSGIContainer(unix_socket_app))
+        unix_server.add_socket(bind_unix_socket(Setting.UNIX_SOCKET_PATH, mode=Setting.UNIX_SOCKET_MODE))
+        logger.info("listen on unix socket " + Setting.UNIX_SOCKET_PATH)
+    # 默认的SIGTERM处理直接结束进程, 只在需要清理(工作进程, 套接字文件, 本地存储)时接管
+    if http_workers or Setting.UNIX_SOCKET_PATH or metric_store is not None:
+        signal.signal(signal.SIGTERM, shutdown)
+    try:
+        IOLoop.instance().start()
+    finally:
+        cleanup()
 
     # flask demo
     # app.run(
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# encoding:utf-8
+
+"""
+Watch_Dogs
+多进程模式下的HTTP工作进程
+
+- 由 Watch_Dogs-Client.py 启动 (setting.json 中 http_workers 大于0时), 不需要单独运行
+- 不采集数据, 基于采样快照的接口直接读取采样进程发布到共享内存的快照 (见 url.py 中的 WORKER_HANDLERS)
+- 所有工作进程通过SO_REUSEPORT监听对外的端口(port), 由内核在各进程间分配连接
+- 其余接口检查请求地址后转发给采样进程 (只在本机地址的worker_port上监听, 请求头中携带启动时传入的令牌)
+- 采样进程退出后工作进程随之退出, 不会继续返回过期的快照
+"""
+
+import os
+
+import tornado.web
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+
+from setting import Setting
+from url import WORKER_HANDLERS
+from handlers import WORKER_TOKEN_ENVIRON
+from Core.shared_snapshot import SharedSnapshotReader
+from Core.address_filter import AddressFilter
+
+PARENT_CHECK_INTERVAL = 1000  # 检查采样进程是否存活的间隔(毫秒)
+
+
+def make_app(snapshot_reader, setting):
+    """创建工作进程的tornado应用"""
+    app = tornado.web.Application(WORKER_HANDLERS)
+    app.setting = setting
+    app.log = setting.logger
+    app.allowed_request_addr_list = setting.ALLOWED_REQUEST_ADDR_LIST
+    app.address_filter = AddressFilter(setting.ALLOWED_REQUEST_ADDR_LIST)
+    app.snapshot_reader = snapshot_reader
+    app.upstream = "http://127.0.0.1:{}".format(setting.WORKER_PORT)
+    app.worker_token = os.environ.get(WORKER_TOKEN_ENVIRON, "")
+    return app
+
+
+def exit_with_parent(parent_pid):
+    """采样进程退出后(被init收养)停止IOLoop"""
+    if os.getppid() != parent_pid:
+        IOLoop.current().stop()
+
+
+if __name__ == "__main__":
+    setting = Setting()
+    parent_pid = os.getppid()
+    http_server = HTTPServer(make_app(SharedSnapshotReader(Setting.SHARED_SNAPSHOT_PATH), setting))
+    http_server.add_sockets(bind_sockets(Setting.PORT, reuse_port=True))
+    PeriodicCallback(lambda: exit_with_parent(parent_pid), PARENT_CHECK_INTERVAL).start()
+    setting.logger.info("Watch_Dogs-Worker pid {} listen on {}".format(os.getpid(), Setting.PORT))
+    IOLoop.current().start()
@@ -12,7 +12,15 @@ import traceback
 
 import tornado.web
 from tornado import gen
+from tornado.httpclient import AsyncHTTPClient
 
+from Core.exposition import CONTENT_TYPE
+from Core.shared_snapshot import SharedSnapshotBusy
+from Core.prcess_exception import NoWatchedProcess
+
+WORKER_TOKEN_ENVIRON = "WATCH_DOGS_WORKER_TOKEN"  # 采样进程传给工作进程的令牌 (环境变量)
+WORKER_TOKEN_HEADER = "X-Watch-Dogs-Worker"  # 工作进程转发请求时携带令牌的请求头
+PROXY_TIMEOUT = 60  # 转发请求的超时时间(秒)
 
 def byteify(input_unicode_dict, encoding='utf-8'):
     """
@@ -38,24 +46,38 @@ class BaseHandler(tornado.web.RequestHandler):
         self.set_header("Access-Control-Allow-Methods", "GET")
         self.set_header("Access-Control-Allow-Credentials", True)
 
-    def get(self):
+    def get(self, *args):
         """get"""
-        self.check_require_address()
-        self.return_result()
+        self.check_require_address(*args)
 
-    def check_require_address(self):
-        """检查请求地址"""
-        if "0.0.0.0" in self.allowed_request_addr_list or self.request.remote_ip in self.allowed_request_addr_list:
+    def check_require_address(self, *args):
+        """检查请求地址, 通过后返回响应结果"""
+        if self.address_filter.is_allowed(self.request.remote_ip):
             try:
-                self.return_result()
+                self.return_result(*args)
+            except tornado.web.HTTPError:
+                raise
             except Exception as err:
+                self.log.error("Error " + str(err.__class__) + " | " + str(err))
+                self.set_status(501)
                 self.finish({"error": str(err)})
         else:
-            self.finish({"error": "ip address not allowed"})
+            self.reject_address()
 
-    def return_result(self):
+    def reject_address(self):
+        """拒绝未允许的请求地址"""
+        self.log.error("Unknown request addr - " + str(self.request.remote_ip))
+        self.set_status(403)
+        self.finish({"error": "ip address not allowed"})
+
+    def return_result(self, *args):
         """返回响应结果"""
 
+    def write_json(self, data):
+        """返回JSON (tornado的finish不接受列表)"""
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(data))
+
     @property
     def log(self):
         """日志对象"""
@@ -71,18 +93,21 @@ class BaseHandler(tornado.web.RequestHandler):
         """静态设置"""
         return self.application.allowed_request_addr_list
 
+    @property
+    def address_filter(self):
+        """请求来源地址过滤"""
+        return self.application.address_filter
+
     def write_error(self, status_code, **kwargs):
         """500"""
         error_message = ["Oops! Something wrong,"]
 
         if self.settings.get("serve_traceback") and "exc_info" in kwargs:
             error_message = traceback.format_exception(*kwargs["exc_info"])
+        elif "exc_info" in kwargs and isinstance(kwargs["exc_info"][1], tornado.web.HTTPError):
+            error_message = [kwargs["exc_info"][1].log_message]
 
-        return self.render(
-            'error.html',
-            http_code=500,
-            error_message=error_message
-        )
+        return self.finish({"error": error_message, "http_code": status_code})
 
 
 class TestHandler(BaseHandler):
@@ -96,5 +121,125 @@ class TestHandler(BaseHandler):
 class NotFoundHandler(BaseHandler):
     """404"""
 
-    def get(self):
-        return self.render("404.html", status_code=404)
+    def get(self, *args):
+        self.set_status(404)
+        self.finish({"ERROR": self.request.uri + " no found! please click "
+                              "https://github.com/Watch-Dogs-HIT/Watch_Dogs-Client"})
+
+
+class SnapshotHandler(BaseHandler):
+    """
+    多进程模式下HTTP工作进程的只读接口 - 数据来自采样进程发布到共享内存的快照
+    path : 共享数据 {"snapshot", "collectors", "sampling"} 中的键路径
+    fields : 指定时返回该路径下各键的值构成的列表 (如 /sys/net 的 [上传速度, 下载速度])
+    text : 与主进程中直接返回str()的接口一致, 以文本返回 (如 /sys/cpu/percent)
+    """
+
+    def initialize(self, path=(), default=None, fields=None, text=False):
+        self.path = path
+        self.default = default
+        self.fields = fields
+        self.text = text
+
+    def get_shared(self):
+        """共享数据及Prometheus文本"""
+        try:
+            data, metrics_text = self.application.snapshot_reader.read()
+        except SharedSnapshotBusy as err:
+            raise tornado.web.HTTPError(503, str(err))
+        if data is None:
+            raise tornado.web.HTTPError(503, "no snapshot published yet")
+        return data, metrics_text
+
+    def get_process(self, pid):
+        """被监测进程在最近一次采样中的数据, 不在快照中(未被监测或尚未被采样)时返回None"""
+        return self.get_shared()[0]["snapshot"]["process"].get(str(int(pid)))
+
+    def return_result(self, *args):
+        data = self.get_shared()[0]
+        for key in self.path:
+            data = data.get(key)
+            if data is None:
+                return self.write_json(self.default)
+        if self.fields:
+            data = [data.get(key) for key in self.fields]
+        if self.text:
+            self.set_header("Content-Type", "text/html; charset=utf-8")
+            return self.finish(str(data))
+        return self.write_json(data)
+
+
+class MetricsHandler(SnapshotHandler):
+    """/metrics"""
+
+    def return_result(self, *args):
+        self.set_header("Content-Type", CONTENT_TYPE)
+        return self.finish(self.get_shared()[1])
+
+
+class ProcSocketsHandler(SnapshotHandler):
+    """/proc/<pid>/sockets"""
+
+    def return_result(self, pid):
+        process_data = self.get_process(pid)
+        if process_data is None:
+            return self.write_json({"Error": NoWatchedProcess(pid).msg})
+        return self.write_json(process_data.get("sockets", {}))
+
+
+class ProcCpuHandler(SnapshotHandler):
+    """/proc/<pid>/cpu (进程未被监测时为-1)"""
+
+    def return_result(self, pid):
+        process_data = self.get_process(pid)
+        if process_data is None:
+            return self.write_json(-1)
+        return self.write_json(process_data.get("cpu_percent", 0.))
+
+
+class ProcIoHandler(SnapshotHandler):
+    """/proc/<pid>/io (进程未被监测时为-1)"""
+
+    def return_result(self, pid):
+        process_data = self.get_process(pid)
+        if process_data is None:
+            return self.write_json([-1., -1.])
+        return self.write_json([process_data.get("io_read_MBs", 0.), process_data.get("io_write_MBs", 0.)])
+
+
+class ProcThreadsHandler(SnapshotHandler):
+    """/proc/<pid>/threads (最多为配置的top_threads个)"""
+
+    def return_result(self, pid):
+        top_threads = self.setting.TOP_THREADS
+        n = int(self.get_argument("n", top_threads))
+        if n > top_threads:
+            self.set_status(400)
+            return self.write_json({"Error": "n must not exceed top_threads ({}) in setting.json".format(top_threads)})
+        process_data = self.get_process(pid)
+        if process_data is None:
+            return self.write_json({"Error": NoWatchedProcess(pid).msg})
+        return self.write_json(process_data.get("top_threads", [])[:n])
+
+
+class ProxyHandler(BaseHandler):
+    """
+    多进程模式下其余的接口 (需要实时读取或修改监测状态) : 检查请求地址后转发给采样进程
+    采样进程只在本机地址上监听, 并通过令牌确认请求来自工作进程
+    """
+
+    @gen.coroutine
+    def get(self, *args):
+        if not self.address_filter.is_allowed(self.request.remote_ip):
+            self.reject_address()
+            return
+        response = yield AsyncHTTPClient().fetch(
+            self.application.upstream + self.request.uri,
+            headers={WORKER_TOKEN_HEADER: self.application.worker_token, "Host": self.request.host},
+            follow_redirects=False, raise_error=False, request_timeout=PROXY_TIMEOUT)
+        if response.code == 599:  # 连接失败或超时
+            raise tornado.web.HTTPError(502, str(response.error))
+        self.set_status(response.code)
+        if "Content-Type" in response.headers:
+            self.set_header("Content-Type", response.headers["Content-Type"])
+        self.finish(response.body)
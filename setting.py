@@ -46,6 +46,36 @@ class Setting(object):
     PORT = 80
     ALLOWED_REQUEST_ADDR_LIST = []
     NET_MONITOR = False
+    SAMPLE_INTERVAL = 5
+    TOP_THREADS = 10
+    STORE_PATH = ""
+    STORE_SEGMENT_SIZE = 4 * 1024 * 1024
+    STORE_SEGMENT_SECONDS = 3600
+    STORE_MAX_SEGMENTS = 48
+    SPOOL_SIZE = 720
+    SPOOL_ROLLUP = 12
+    PROC_EVENTS = True
+    PROC_POLL_INTERVAL = 1
+    WATCH_RULES_PATH = ""
+    CGROUP_MONITOR = True
+    CGROUP_SUBTREE = "/"
+    CGROUP_MAX_DEPTH = 3
+    CGROUP_MAX = 256
+    SOCKET_MONITOR = True
+    NET_RATE_WINDOWS = [10, 60, 300]
+    COLLECTORS = {}
+    SAMPLE_CPU_BUDGET = 0.01
+    PROC_FD_CACHE_SIZE = 512
+    PROC_ROOT = "/proc"
+    SYS_ROOT = "/sys"
+    HTTP_WORKERS = 0
+    WORKER_PORT = 8001
+    SHARED_SNAPSHOT_PATH = "snapshot.shm"
+    SHARED_SNAPSHOT_SIZE = 64 * 1024 * 1024
+    SNAPSHOT_EXPORT_PATH = ""
+    SNAPSHOT_EXPORT_CAPACITY = 1024
+    UNIX_SOCKET_PATH = ""
+    UNIX_SOCKET_MODE = 0o600
 
     # @staticmethod
     def static_value_refresh(self):
@@ -57,6 +87,38 @@ class Setting(object):
         Setting.ALLOWED_REQUEST_ADDR_LIST = map(lambda u: u.encode("utf-8"), setting["allowed_request_addr"])
         Setting.PORT = setting["port"]
         Setting.NET_MONITOR = setting["net_monitor"]
+        Setting.SAMPLE_INTERVAL = setting.get("sample_interval", Setting.SAMPLE_INTERVAL)
+        Setting.TOP_THREADS = setting.get("top_threads", Setting.TOP_THREADS)
+        Setting.STORE_PATH = setting.get("store_path", Setting.STORE_PATH).encode("utf-8")  # 不填则不持久化
+        Setting.STORE_SEGMENT_SIZE = setting.get("store_segment_size", Setting.STORE_SEGMENT_SIZE)
+        Setting.STORE_SEGMENT_SECONDS = setting.get("store_segment_seconds", Setting.STORE_SEGMENT_SECONDS)
+        Setting.STORE_MAX_SEGMENTS = setting.get("store_max_segments", Setting.STORE_MAX_SEGMENTS)
+        Setting.SPOOL_SIZE = setting.get("spool_size", Setting.SPOOL_SIZE)
+        Setting.SPOOL_ROLLUP = setting.get("spool_rollup", Setting.SPOOL_ROLLUP)
+        Setting.PROC_EVENTS = setting.get("proc_events", Setting.PROC_EVENTS)
+        Setting.PROC_POLL_INTERVAL = setting.get("proc_poll_interval", Setting.PROC_POLL_INTERVAL)
+        Setting.WATCH_RULES_PATH = setting.get("watch_rules_path", Setting.WATCH_RULES_PATH).encode("utf-8")
+        Setting.CGROUP_MONITOR = setting.get("cgroup_monitor", Setting.CGROUP_MONITOR)
+        Setting.CGROUP_SUBTREE = setting.get("cgroup_subtree", Setting.CGROUP_SUBTREE).encode("utf-8")
+        Setting.CGROUP_MAX_DEPTH = setting.get("cgroup_max_depth", Setting.CGROUP_MAX_DEPTH)
+        Setting.CGROUP_MAX = setting.get("cgroup_max", Setting.CGROUP_MAX)
+        Setting.SOCKET_MONITOR = setting.get("socket_monitor", Setting.SOCKET_MONITOR)
+        Setting.NET_RATE_WINDOWS = setting.get("net_rate_windows", Setting.NET_RATE_WINDOWS)
+        Setting.SAMPLE_CPU_BUDGET = setting.get("sample_cpu_budget", Setting.SAMPLE_CPU_BUDGET)
+        Setting.PROC_FD_CACHE_SIZE = setting.get("proc_fd_cache_size", Setting.PROC_FD_CACHE_SIZE)
+        Setting.PROC_ROOT = setting.get("proc_root", Setting.PROC_ROOT).encode("utf-8")  # 容器中监测宿主机时为挂载位置
+        Setting.SYS_ROOT = setting.get("sys_root", Setting.SYS_ROOT).encode("utf-8")
+        Setting.HTTP_WORKERS = setting.get("http_workers", Setting.HTTP_WORKERS)  # 为0时不启动HTTP工作进程
+        Setting.WORKER_PORT = setting.get("worker_port", Setting.WORKER_PORT)
+        Setting.SHARED_SNAPSHOT_PATH = setting.get("shared_snapshot_path", Setting.SHARED_SNAPSHOT_PATH).encode("utf-8")
+        Setting.SHARED_SNAPSHOT_SIZE = setting.get("shared_snapshot_size", Setting.SHARED_SNAPSHOT_SIZE)
+        Setting.SNAPSHOT_EXPORT_PATH = setting.get("snapshot_export_path",
+                                                   Setting.SNAPSHOT_EXPORT_PATH).encode("utf-8")  # 不填则不导出
+        Setting.SNAPSHOT_EXPORT_CAPACITY = setting.get("snapshot_export_capacity", Setting.SNAPSHOT_EXPORT_CAPACITY)
+        Setting.UNIX_SOCKET_PATH = setting.get("unix_socket_path", Setting.UNIX_SOCKET_PATH).encode("utf-8")  # 不填则不监听
+        Setting.UNIX_SOCKET_MODE = int(setting.get("unix_socket_mode", "%o" % Setting.UNIX_SOCKET_MODE), 8)  # 八进制字符串
+        Setting.COLLECTORS = dict((name.encode("utf-8"), options)
+                                  for name, options in setting.get("collectors", Setting.COLLECTORS).items())
         if not Setting.ALLOWED_REQUEST_ADDR_LIST:  # 若不填则默认允许所有地址发出请求
             Setting.ALLOWED_REQUEST_ADDR_LIST = ["0.0.0.0"]
         return setting
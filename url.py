@@ -14,3 +14,30 @@ HANDLERS = [
     (r'/v', TestHandler),  # version
     (r'.*', NotFoundHandler)  # 404
 ]
+
+# 多进程模式下HTTP工作进程的路由
+# 基于采样快照的接口直接读取共享内存中的快照 (与主进程中的同名接口返回内容一致), 其余接口转发给采样进程
+WORKER_HANDLERS = [
+    (r'/v', TestHandler),  # version
+    (r'/metrics', MetricsHandler),
+    (r'/sys/cpu/percent', SnapshotHandler, {"path": ("snapshot", "sys", "cpu_percent"), "text": True}),
+    (r'/sys/cpu/percents', SnapshotHandler, {"path": ("snapshot", "sys", "cpu_percents"), "default": []}),
+    (r'/sys/mem/percent', SnapshotHandler, {"path": ("snapshot", "sys", "mem", "percent"), "text": True}),
+    (r'/sys/net', SnapshotHandler, {"path": ("snapshot", "sys", "net"), "fields": ("upload_kbps", "download_kbps")}),
+    (r'/sys/io', SnapshotHandler, {"path": ("snapshot", "sys", "io"), "fields": ("read_MBs", "write_MBs")}),
+    (r'/sys/pressure', SnapshotHandler, {"path": ("snapshot", "sys", "pressure"), "default": {}}),
+    (r'/sys/vmstat', SnapshotHandler, {"path": ("snapshot", "sys", "vmstat"), "default": {}}),
+    (r'/sys/collectors', SnapshotHandler, {"path": ("collectors",), "default": []}),
+    (r'/sys/sampling', SnapshotHandler, {"path": ("sampling",), "default": {}}),
+    (r'/sys/net/devices/speed', SnapshotHandler, {"path": ("snapshot", "sys", "net_devices"), "default": {}}),
+    (r'/sys/net/sockets', SnapshotHandler, {"path": ("snapshot", "sys", "sockets"), "default": {}}),
+    (r'/sys/io/devices', SnapshotHandler, {"path": ("snapshot", "sys", "io_devices"), "default": {}}),
+    (r'/cgroup/stat', SnapshotHandler, {"path": ("snapshot", "cgroups"), "default": {}}),
+    (r'/proc/group/all', SnapshotHandler, {"path": ("snapshot", "process_groups"), "default": {}}),
+    (r'/proc/(\d+)/sockets', ProcSocketsHandler),
+    (r'/proc/(\d+)/cpu', ProcCpuHandler),
+    (r'/proc/(\d+)/io', ProcIoHandler),
+    (r'/proc/(\d+)/threads', ProcThreadsHandler),
+    (r'/snapshot', SnapshotHandler, {"path": ("snapshot",)}),  # 完整的最近一次采样快照
+    (r'.*', ProxyHandler)  # 其余接口 (包括404) 由采样进程处理
+]